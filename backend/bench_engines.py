@@ -0,0 +1,53 @@
+# bench_engines.py
+# Bandingkan engine clustering (engines.py) di data sintetis: waktu fit+predict,
+# inertia (SSE atas semua baris) dan kesepakatan label dengan model saat ini
+# (KMeans penuh, n_init=10).
+# Jalankan: python bench_engines.py [jumlah_keluarga] [jumlah_desa]
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import adjusted_rand_score
+from sklearn.preprocessing import MinMaxScaler
+
+from engines import ENGINES, fit_clusters, inertia
+from features import FEATURE_QUERY, load_features
+from kmeans import FITUR_KERENTANAN, filter_valid, map_cluster_labels, typecast_features
+from synthetic import generate_tables, load_sqlite
+
+def _kategori(df, labels):
+    cluster_means = pd.Series(df["rata_rata_desil"].to_numpy()).groupby(labels).mean()
+    return pd.Series(labels).map(map_cluster_labels(cluster_means)).to_numpy()
+
+def main():
+    n_keluarga = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_desa = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    conn = load_sqlite(generate_tables(n_keluarga, n_desa))
+    _, df = filter_valid(typecast_features(load_features(conn, FEATURE_QUERY)))
+    df = df.reset_index(drop=True)
+    X = MinMaxScaler().fit_transform(df[FITUR_KERENTANAN])
+    print(f"{len(df)} keluarga valid dari {n_keluarga}")
+
+    hasil = {}
+    for engine in ENGINES:
+        start = time.perf_counter()
+        model = fit_clusters(X, engine, n_clusters=3, random_state=42, n_init=10)
+        labels = model.predict(X)
+        detik = time.perf_counter() - start
+        hasil[engine] = {"detik": detik, "inertia": inertia(model, X), "labels": labels,
+                         "kategori": _kategori(df, labels)}
+
+    acuan = hasil["full"]
+    print(f"{'engine':<10} {'detik':>8} {'speedup':>8} {'inertia':>12} {'Δinertia':>9} {'sama_label':>10} {'ARI':>6}")
+    for engine, h in hasil.items():
+        print(
+            f"{engine:<10} {h['detik']:>8.3f} {acuan['detik'] / h['detik']:>7.1f}x "
+            f"{h['inertia']:>12.2f} {100 * (h['inertia'] / acuan['inertia'] - 1):>8.2f}% "
+            f"{np.mean(h['kategori'] == acuan['kategori']):>10.4f} "
+            f"{adjusted_rand_score(acuan['labels'], h['labels']):>6.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
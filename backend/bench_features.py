@@ -0,0 +1,41 @@
+# bench_features.py
+# Bandingkan query fitur lama (subquery korelasi) dengan query set-based.
+# Jalankan: python bench_features.py [jumlah_keluarga ...]
+import sys
+import time
+
+import pandas as pd
+
+from features import FEATURE_QUERY, LEGACY_FEATURE_QUERY, load_features
+from synthetic import generate_tables, load_sqlite
+
+def _timed(conn, query, repeat=3):
+    best, df = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = load_features(conn, query)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, df
+
+def _sorted(df):
+    return df.sort_values("id_keluarga").reset_index(drop=True)
+
+def run(n_keluarga):
+    conn = load_sqlite(generate_tables(n_keluarga))
+    try:
+        t_lama, df_lama = _timed(conn, LEGACY_FEATURE_QUERY)
+        t_baru, df_baru = _timed(conn, FEATURE_QUERY)
+    finally:
+        conn.close()
+
+    # Hasil harus identik (urutan baris tidak dijamin oleh kedua query)
+    pd.testing.assert_frame_equal(_sorted(df_lama), _sorted(df_baru))
+
+    print(f"{n_keluarga:>9} keluarga | lama {t_lama:8.3f}s | "
+          f"baru {t_baru:8.3f}s | {t_lama / t_baru:5.1f}x")
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1_000, 10_000, 50_000]
+    for n in sizes:
+        run(n)
@@ -0,0 +1,74 @@
+# bench_json.py
+# Bandingkan serialisasi bawaan FastAPI (dict cursor -> jsonable_encoder ->
+# JSONResponse) dengan jalur cepat fast_json (tuple -> konversi per kolom ->
+# orjson) untuk bentuk payload tiap endpoint. Hasil JSON harus identik.
+# Jalankan: python bench_json.py [repeat]
+import datetime
+import json
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from fast_json import FastJSONResponse, records
+from writer import KOLOM_KERENTANAN
+
+KOLOM = ["id"] + KOLOM_KERENTANAN + ["created_at", "no_kk", "nama_kepala_keluarga", "alamat"]
+
+def _rows(n, seed=42):
+    """Baris tuple seperti hasil cursor MySQL untuk SELECT kk.*, k.no_kk, ..."""
+    rng = np.random.default_rng(seed)
+    kategori = ["Sangat Rentan", "Rentan", "Tidak Rentan"]
+    waktu = datetime.datetime(2024, 5, 1, 8, 30)
+    rows = []
+    for i in range(n):
+        skor = int(rng.choice([30, 60, 90]))
+        rows.append((
+            i + 1, f"{i:016x}", int(rng.integers(0, 3)), kategori[int(rng.integers(0, 3))], skor,
+            skor - int(rng.integers(0, 40)), f"DESA {i % 40}",
+            Decimal(f"{rng.uniform(1, 10):.2f}"), int(rng.integers(1, 10**7)), int(rng.integers(0, 8)),
+            Decimal(int(rng.integers(0, 5))), Decimal(int(rng.integers(0, 5))), None,
+            "Januari 2024", None, int(rng.integers(0, 80)),
+            waktu + datetime.timedelta(seconds=i), f"32050{i:011d}", f"KEPALA KELUARGA {i}", f"KAMPUNG {i % 97} RT 01",
+        ))
+    return rows
+
+def _default_path(rows):
+    data = [dict(zip(KOLOM, row)) for row in rows]
+    return JSONResponse(jsonable_encoder({"data": data, "pagination": {"page": 1, "limit": len(rows)}})).body
+
+def _fast_path(rows):
+    return FastJSONResponse({"data": records(KOLOM, rows), "pagination": {"page": 1, "limit": len(rows)}}).body
+
+# (endpoint, jumlah baris per response)
+PAYLOADS = [
+    ("/kerentanan limit=10", 10),
+    ("/kerentanan/search limit=20", 20),
+    ("/kerentanan limit=100", 100),
+    ("ekspor 10k baris", 10_000),
+]
+
+def _timed(fn, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'payload':<28} {'bawaan':>10} {'cepat':>10} {'speedup':>8}")
+    for nama, n in PAYLOADS:
+        rows = _rows(n)
+        t_lama, body_lama = _timed(_default_path, rows, repeat)
+        t_baru, body_baru = _timed(_fast_path, rows, repeat)
+        assert json.loads(body_lama) == json.loads(body_baru), nama
+        print(f"{nama:<28} {t_lama * 1000:>8.3f}ms {t_baru * 1000:>8.3f}ms {t_lama / t_baru:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_scoring.py
+# Cek kesetaraan scoring vektor (scoring.py) dengan fungsi per-baris
+# (utils.py) pada input acak, lalu bandingkan waktunya.
+# Jalankan: python bench_scoring.py [jumlah_baris] [jumlah_percobaan]
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from periode import parse_period_raw
+from scoring import apply_scoring
+from synthetic import PERIODE_BANSOS
+from utils import months_since, penalty_from_months
+
+SAMPAH = [None, np.nan, "", "TAHAP 1", "2024", "JANUARI 2023", "tahap 2 apr-mei 2021",
+          "TAHAP 3 JUL-AGS-SEP 1999", "DES 2030 JAN", "AGU/AGT 2022", 12345]
+
+def _random_periode(rng):
+    if rng.random() < 0.2:
+        return rng.choice(SAMPAH)
+    if rng.random() < 0.1:
+        # Gabungan token acak dari label yang valid
+        a, b = rng.choice(PERIODE_BANSOS).split(), rng.choice(PERIODE_BANSOS).split()
+        return " ".join(rng.sample(a + b, k=rng.randint(1, len(a + b))))
+    return rng.choice(PERIODE_BANSOS)
+
+def _random_frame(rng, n):
+    return pd.DataFrame({
+        "periode_terakhir_bpnt": [_random_periode(rng) for _ in range(n)],
+        "periode_terakhir_pkh": [_random_periode(rng) for _ in range(n)],
+        "kategori_kerentanan": [rng.choice(["Sangat Rentan", "Rentan", "Tidak Rentan"]) for _ in range(n)],
+    })
+
+def parse_period_ref(text):
+    """parse_period asli tanpa cache."""
+    try:
+        if pd.isna(text): return (0, 0)
+        return parse_period_raw(text)
+    except:
+        return (0, 0)
+
+def scoring_per_baris(df, now_year, now_month):
+    """Implementasi lama (df.apply) sebagai acuan."""
+    df = df.copy()
+    parsed_bpnt = df["periode_terakhir_bpnt"].apply(parse_period_ref).tolist()
+    parsed_pkh  = df["periode_terakhir_pkh"].apply(parse_period_ref).tolist()
+    df["bpnt_year"], df["bpnt_month"] = zip(*parsed_bpnt)
+    df["pkh_year"],  df["pkh_month"]  = zip(*parsed_pkh)
+    df["bpnt_months_ago"] = df.apply(lambda r: months_since(r["bpnt_year"], r["bpnt_month"], now_year, now_month), axis=1)
+    df["pkh_months_ago"]  = df.apply(lambda r: months_since(r["pkh_year"], r["pkh_month"], now_year, now_month), axis=1)
+    df["penalti_bpnt"] = df["bpnt_months_ago"].apply(penalty_from_months)
+    df["penalti_pkh"]  = df["pkh_months_ago"].apply(penalty_from_months)
+    df["penalti_total"] = df["penalti_bpnt"] + df["penalti_pkh"]
+    skor_map = {"Sangat Rentan": 90, "Rentan": 60, "Tidak Rentan": 30}
+    df["skor_kerentanan"] = df["kategori_kerentanan"].map(skor_map).fillna(30)
+    df["skor_akhir"] = df["skor_kerentanan"] - df["penalti_total"]
+    return df
+
+KOLOM_CEK = ["bpnt_year", "bpnt_month", "pkh_year", "pkh_month", "bpnt_months_ago",
+             "pkh_months_ago", "penalti_bpnt", "penalti_pkh", "penalti_total", "skor_akhir"]
+
+def cek_kesetaraan(percobaan=200, seed=0):
+    rng = random.Random(seed)
+    for _ in range(percobaan):
+        df = _random_frame(rng, rng.randint(1, 200))
+        now_year, now_month = rng.randint(2018, 2035), rng.randint(1, 12)
+        lama = scoring_per_baris(df, now_year, now_month)
+        baru = apply_scoring(df.copy(), now_year, now_month)
+        for col in KOLOM_CEK:
+            np.testing.assert_array_equal(lama[col].to_numpy(), baru[col].to_numpy(), err_msg=col)
+    print(f"OK: {percobaan} percobaan acak identik")
+
+def bench(n):
+    df = _random_frame(random.Random(1), n)
+    start = time.perf_counter()
+    scoring_per_baris(df, 2025, 6)
+    t_lama = time.perf_counter() - start
+    start = time.perf_counter()
+    apply_scoring(df.copy(), 2025, 6)
+    t_baru = time.perf_counter() - start
+    print(f"{n:>9} baris | per-baris {t_lama:7.3f}s | vektor {t_baru:7.3f}s | {t_lama / t_baru:6.1f}x")
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    percobaan = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    cek_kesetaraan(percobaan)
+    bench(n)
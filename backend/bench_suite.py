@@ -0,0 +1,423 @@
+# bench_suite.py
+# Benchmark seluruh pipeline di atas data sintetis (synthetic.py) ukuran
+# 10k / 100k / 1M keluarga:
+#   - waktu tiap fase kmeans.train_kmeans dan services.execute_clustering_pipeline
+#   - latensi endpoint baca (p50/p95/p99, req/detik) dengan N klien bersamaan,
+#     sekali dengan cache aktif dan sekali tanpa cache
+# Hasil disimpan sebagai JSON di bench_results/<waktu>_<commit>.json (atau
+# direktori --out; bench_results/ ada di .gitignore) supaya regresi antar
+# commit terlihat (--compare file_lama.json).
+#
+# Database:
+#   --db sqlite (default): file SQLite sementara menggantikan get_db, tulis
+#                          hasil training langsung ke tabel (tanpa staging/RENAME)
+#   --db mysql           : database MySQL/MariaDB dari DB_* env; isinya DIHAPUS,
+#                          jadi DB_NAME wajib mengandung "bench"
+#
+# Jalankan:
+#   python bench_suite.py
+#   python bench_suite.py --sizes 10k 100k 1m --concurrency 16 --requests 500
+#   DB_NAME=psd_bench python bench_suite.py --db mysql
+#   python bench_suite.py --compare bench_results/lama.json
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+
+from synthetic import SCHEMA_HASIL, SIZES, SqliteConnection, generate_tables, load_mysql, load_sqlite
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", os.path.join(BACKEND_DIR, "bench_results"))
+# Rasio waktu baru/lama di atas ini ditandai sebagai regresi
+REGRESSION_RATIO = 1.2
+
+# (nama, method, path, params); {desa}/{cursor}/{id}/{nama} diisi setelah training
+ENDPOINTS = [
+    ("kerentanan_10", "GET", "/kerentanan", {"limit": 10}),
+    ("kerentanan_100", "GET", "/kerentanan", {"limit": 100}),
+    ("kerentanan_desa", "GET", "/kerentanan", {"limit": 10, "desa": "{desa}"}),
+    ("kerentanan_cursor", "GET", "/kerentanan", {"limit": 10, "cursor": "{cursor}"}),
+    ("kerentanan_cari", "GET", "/kerentanan", {"limit": 10, "search": "{nama}"}),
+    ("search", "GET", "/kerentanan/search", {"q": "{nama}"}),
+    ("daftar_desa", "GET", "/kerentanan/desa", {}),
+    ("dashboard", "GET", "/dashboard-stats", {}),
+    ("dashboard_desa", "GET", "/dashboard-stats", {"desa": "{desa}"}),
+    ("rekap_semua_desa", "GET", "/dashboard-stats-semua-desa", {}),
+    ("peta_desa", "GET", "/map/desa", {"zoom": 12}),
+    ("score_id", "POST", "/score", {"id_keluarga": "{id}"}),
+]
+
+# Fungsi yang diukur di dalam tiap pipeline (atribut modul, jadi ikut terukur
+# saat dipanggil dari fungsi pipeline)
+DETAIL_KMEANS = ["load_features", "fit_clusters", "cluster_quality", "apply_scoring",
+                 "publish_results", "build_index"]
+DETAIL_SERVICES = ["fetch_training_data", "fit_clusters", "cluster_quality", "apply_scoring",
+                   "publish_results"]
+
+# =========================
+# PENGUKUR FASE
+# =========================
+class PhaseTimer:
+    """Durasi fase dari callback progress(fase, ...) + durasi fungsi yang dibungkus."""
+
+    def __init__(self):
+        self.phases = {}
+        self.detail = {}
+        self._fase = None
+        self._mulai = None
+
+    def progress(self, phase, **counts):
+        if phase != self._fase:
+            self.stop()
+            self._fase, self._mulai = phase, time.perf_counter()
+
+    def stop(self):
+        if self._fase is not None:
+            durasi = time.perf_counter() - self._mulai
+            self.phases[self._fase] = round(self.phases.get(self._fase, 0.0) + durasi, 4)
+        self._fase = None
+
+    @contextlib.contextmanager
+    def phase(self, nama):
+        self.progress(nama)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def wrap(self, stack, module, names):
+        """Bungkus module.<nama> dengan pengukur waktu selama stack aktif."""
+        for nama in names:
+            asli = getattr(module, nama)
+
+            def timed(*args, _asli=asli, _nama=nama, **kwargs):
+                mulai = time.perf_counter()
+                try:
+                    return _asli(*args, **kwargs)
+                finally:
+                    self.detail[_nama] = round(self.detail.get(_nama, 0.0) + time.perf_counter() - mulai, 4)
+
+            stack.enter_context(mock.patch.object(module, nama, timed))
+
+# =========================
+# DATABASE BENCHMARK
+# =========================
+def _patch_get_db(stack, get_db):
+    """Arahkan semua get_db (database.get_db dan salinan hasil from-import) ke get_db."""
+    import database
+    import main  # noqa: F401  (memuat modul-modul endpoint)
+    import getdata, kmeans, search_index, services  # noqa: F401
+    asli = database.get_db
+    for module in list(sys.modules.values()):
+        if getattr(module, "get_db", None) is asli:
+            stack.enter_context(mock.patch.object(module, "get_db", get_db))
+
+def _write_sqlite(get_db, df, rekap_rows, generation):
+    """Pengganti writer.write_results untuk SQLite: tulis langsung ke tabel hasil."""
+    from rekap import write_rekap
+    from writer import KOLOM_KERENTANAN, build_rows
+
+    mulai = time.perf_counter()
+    rows = build_rows(df)
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM keluarga_kerentanan")
+        cursor.executemany(
+            f"INSERT INTO keluarga_kerentanan ({', '.join(KOLOM_KERENTANAN)}) "
+            f"VALUES ({', '.join(['%s'] * len(KOLOM_KERENTANAN))})",
+            rows,
+        )
+        write_rekap(cursor, rekap_rows, generation)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    detik = time.perf_counter() - mulai
+    return {"rows": len(rows), "mode": "sqlite", "rows_per_s": round(len(rows) / detik) if detik else None}
+
+def _sqlite_overrides(stack, get_db):
+    """Ganti langkah tulis khusus MySQL (staging + RENAME, hash inkremental) untuk SQLite."""
+    import kmeans
+    import services
+    from cache import make_generation_id, new_generation
+    from registry import save_model, set_current
+    from rekap import rekap_rows_from_frame
+
+    def publish_sqlite(conn, df, df_semua, artifacts, progress=kmeans.no_progress, metadata=None):
+        generation = make_generation_id()
+        save_model(artifacts, generation, {"rows": len(df), **(metadata or {})})
+        progress("writing", total_valid=len(df), rows_written=0)
+        rekap_rows = rekap_rows_from_frame(df)
+        tulis = _write_sqlite(get_db, df, rekap_rows, generation)
+        set_current(generation)
+        new_generation(generation)
+        kmeans.precompute_dashboard(rekap_rows, generation)
+        kmeans.build_index(conn, generation)
+        return tulis
+
+    stack.enter_context(mock.patch.object(kmeans, "publish_results", publish_sqlite))
+    stack.enter_context(mock.patch.object(services, "publish_results", publish_sqlite))
+
+def setup_sqlite(stack, tables, workdir, timer):
+    import feature_store
+
+    path = os.path.join(workdir, "bench.sqlite")
+    with timer.phase("load_db"):
+        conn = load_sqlite(tables, path)
+        conn.executescript(SCHEMA_HASIL)
+        conn.commit()
+        conn.close()
+    # Tanpa trigger: fitur selalu dihitung dari tabel sumber
+    stack.enter_context(mock.patch.object(feature_store, "FEATURE_SOURCE", "query"))
+    get_db = lambda: SqliteConnection(path)
+    _patch_get_db(stack, get_db)
+    _sqlite_overrides(stack, get_db)
+
+def setup_mysql(stack, tables, workdir, timer):
+    from database import DB_CONFIG, get_direct_db
+    from migrations import check_feature_store, check_hash_tables, check_indexes
+
+    if "bench" not in DB_CONFIG["database"]:
+        raise SystemExit(f"DB_NAME={DB_CONFIG['database']} bukan database benchmark (harus mengandung 'bench').")
+    conn = get_direct_db()
+    try:
+        with timer.phase("load_db"):
+            load_mysql(tables, conn)
+        with timer.phase("indexing_db"):
+            check_feature_store(conn, apply=True)
+            check_hash_tables(conn, apply=True)
+            check_indexes(conn, apply=True)
+    finally:
+        conn.close()
+
+# =========================
+# TRAINING
+# =========================
+def run_training():
+    """Jalankan services lalu kmeans (kmeans terakhir: generation, rekap & indeks ikut terisi)."""
+    import kmeans
+    import services
+
+    hasil = {}
+    timer = PhaseTimer()
+    with contextlib.ExitStack() as inner:
+        timer.wrap(inner, services, DETAIL_SERVICES)
+        with timer.phase("total"):
+            status = services.execute_clustering_pipeline()
+    hasil["services"] = {"status": status.get("status"), "message": status.get("message"),
+                         "phases": timer.phases, "detail": timer.detail}
+
+    timer = PhaseTimer()
+    with contextlib.ExitStack() as inner:
+        timer.wrap(inner, kmeans, DETAIL_KMEANS)
+        mulai = time.perf_counter()
+        status = kmeans.train_kmeans(progress=timer.progress)
+        timer.stop()
+        timer.phases["total"] = round(time.perf_counter() - mulai, 4)
+    hasil["train_kmeans"] = {
+        "status": status.get("status"),
+        "message": status.get("message"),
+        "rows": status.get("rows_processed"),
+        "phases": timer.phases,
+        "detail": timer.detail,
+    }
+    for nama, run in hasil.items():
+        if run["status"] != "success":
+            raise RuntimeError(f"{nama} gagal: {run['message']}")
+    return hasil
+
+# =========================
+# ENDPOINT
+# =========================
+def _placeholders(client):
+    pertama = client.get("/kerentanan", params={"limit": 10}).json()
+    baris = pertama["data"][0]
+    return {
+        "desa": baris["desa"],
+        "cursor": pertama["pagination"]["next_cursor"],
+        "id": baris["id_keluarga"],
+        "nama": baris["nama_kepala_keluarga"],
+    }
+
+def _fill(params, nilai):
+    return {k: v.format(**nilai) if isinstance(v, str) else v for k, v in params.items()}
+
+def _request(client, method, path, params):
+    mulai = time.perf_counter()
+    if method == "POST":
+        r = client.post(path, json=params)
+    else:
+        r = client.get(path, params=params)
+    return time.perf_counter() - mulai, r.status_code
+
+def load_endpoint(client, method, path, params, concurrency, n_requests):
+    _request(client, method, path, params)  # pemanasan (cache/indeks/peta)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        mulai = time.perf_counter()
+        hasil = list(pool.map(lambda _: _request(client, method, path, params), range(n_requests)))
+        wall = time.perf_counter() - mulai
+    latensi = np.array([t for t, _ in hasil]) * 1000
+    return {
+        "n": n_requests,
+        "errors": sum(1 for _, status in hasil if status >= 400),
+        "p50_ms": round(float(np.percentile(latensi, 50)), 3),
+        "p95_ms": round(float(np.percentile(latensi, 95)), 3),
+        "p99_ms": round(float(np.percentile(latensi, 99)), 3),
+        "mean_ms": round(float(latensi.mean()), 3),
+        "rps": round(n_requests / wall, 1),
+    }
+
+def run_endpoints(concurrency, n_requests):
+    from fastapi.testclient import TestClient
+
+    from cache import AGGREGATE_CACHE, COUNT_CACHE, RESPONSE_CACHE
+    from main import app
+
+    hasil = {}
+    with TestClient(app) as client:
+        nilai = _placeholders(client)
+        for mode in ("cached", "uncached"):
+            with contextlib.ExitStack() as stack:
+                if mode == "uncached":
+                    # maxsize 0: setiap set langsung dibuang, semua request ke database
+                    for cache in (AGGREGATE_CACHE, RESPONSE_CACHE, COUNT_CACHE):
+                        stack.enter_context(mock.patch.object(cache, "maxsize", 0))
+                        cache.clear()
+                hasil[mode] = {}
+                for nama, method, path, params in ENDPOINTS:
+                    hasil[mode][nama] = load_endpoint(client, method, path, _fill(params, nilai),
+                                                      concurrency, n_requests)
+                    print(f"   {mode:<8} {nama:<18} p50 {hasil[mode][nama]['p50_ms']:>8.2f}ms "
+                          f"p95 {hasil[mode][nama]['p95_ms']:>8.2f}ms "
+                          f"p99 {hasil[mode][nama]['p99_ms']:>8.2f}ms "
+                          f"{hasil[mode][nama]['rps']:>8.1f} req/s")
+    return hasil
+
+# =========================
+# SATU UKURAN
+# =========================
+def run_size(size, db, concurrency, n_requests, seed):
+    n_keluarga = SIZES[size] if size in SIZES else int(size)
+    print(f"== {size} ({n_keluarga} keluarga, {db})")
+    timer = PhaseTimer()
+    asal = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir, contextlib.ExitStack() as stack:
+        # Registry model, file generation & cache periode relatif terhadap cwd
+        os.chdir(workdir)
+        stack.callback(os.chdir, asal)
+        with timer.phase("generate"):
+            tables = generate_tables(n_keluarga, seed=seed)
+        (setup_sqlite if db == "sqlite" else setup_mysql)(stack, tables, workdir, timer)
+        training = run_training()
+        print(f"   setup {timer.phases}")
+        for nama, run in training.items():
+            print(f"   {nama} {run['phases']}")
+        endpoints = run_endpoints(concurrency, n_requests)
+    return {
+        "n_keluarga": n_keluarga,
+        "rows": {nama: len(df) for nama, df in tables.items()},
+        "setup": {"phases": timer.phases},
+        **training,
+        "endpoints": endpoints,
+    }
+
+# =========================
+# HASIL & PERBANDINGAN
+# =========================
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def metadata(args):
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "db": args.db,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "seed": args.seed,
+    }
+
+def save_results(hasil, out_dir=RESULTS_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    nama = f"{time.strftime('%Y%m%d-%H%M%S')}_{hasil['meta']['commit'] or 'nogit'}.json"
+    path = os.path.join(out_dir, nama)
+    with open(path, "w") as f:
+        json.dump(hasil, f, indent=2)
+    return path
+
+def _timings(node, prefix=""):
+    """{jalur: nilai} untuk semua durasi (fase dalam detik, latensi *_ms)."""
+    hasil = {}
+    for key, value in node.items():
+        jalur = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            hasil.update(_timings(value, jalur))
+        elif isinstance(value, (int, float)) and ("/phases/" in jalur or "/detail/" in jalur
+                                                  or key in ("p50_ms", "p95_ms", "p99_ms")):
+            hasil[jalur] = value
+    return hasil
+
+def compare(lama, baru):
+    """Cetak rasio baru/lama; kembalikan daftar jalur yang melambat > REGRESSION_RATIO."""
+    t_lama, t_baru = _timings(lama["runs"]), _timings(baru["runs"])
+    print(f"\nBandingkan dengan commit {lama['meta'].get('commit')} ({lama['meta'].get('db')}):")
+    regresi = []
+    for jalur in sorted(set(t_lama) & set(t_baru)):
+        if not t_lama[jalur]:
+            continue
+        rasio = t_baru[jalur] / t_lama[jalur]
+        tanda = "  REGRESI" if rasio > REGRESSION_RATIO else ""
+        if tanda:
+            regresi.append(jalur)
+        print(f"  {jalur:<60} {t_lama[jalur]:>10.3f} -> {t_baru[jalur]:>10.3f}  {rasio:5.2f}x{tanda}")
+    if lama["meta"].get("db") != baru["meta"].get("db"):
+        print("  (peringatan: mode database berbeda)")
+    print(f"{len(regresi)} regresi (> {REGRESSION_RATIO:.0%} waktu lama).")
+    return regresi
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pipeline & endpoint di data sintetis.")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"],
+                        help="10k, 100k, 1m atau jumlah keluarga (default: 10k 100k)")
+    parser.add_argument("--db", choices=["sqlite", "mysql"], default="sqlite")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="request per endpoint per mode")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--compare", help="file JSON hasil sebelumnya")
+    parser.add_argument("--out", default=RESULTS_DIR, help="direktori hasil JSON (default: bench_results/)")
+    args = parser.parse_args(argv)
+    # pd.read_sql di atas adapter SQLite memicu peringatan "DBAPI2 lain" tiap request
+    warnings.filterwarnings("ignore", message="pandas only supports SQLAlchemy")
+
+    hasil = {"meta": metadata(args), "runs": {}}
+    for size in args.sizes:
+        hasil["runs"][size] = run_size(size, args.db, args.concurrency, args.requests, args.seed)
+    print(f"Hasil disimpan di {save_results(hasil, args.out)}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(json.load(f), hasil):
+                return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# cache.py
+# Cache agregat dashboard di memori, dengan kunci ber-versi "generation".
+# Generation adalah id unik tiap run training yang menulis keluarga_kerentanan.
+# Id-nya disimpan di file agar semua worker API melihat generation yang sama
+# (cukup os.stat untuk mendeteksi perubahan).
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+GENERATION_PATH = "model_kerentanan_generation.txt"
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+# Body JSON endpoint baca yang disimpan oleh http_cache.py
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+# Total COUNT per kata pencarian; dipisah dari AGGREGATE_CACHE karena kuncinya
+# tidak terbatas dan tidak boleh menggusur agregat dashboard
+COUNT_CACHE_MAX_ENTRIES = int(os.getenv("COUNT_CACHE_MAX_ENTRIES", "256"))
+
+_gen_lock = threading.Lock()
+_gen_state = {"mtime": None, "id": "0"}
+
+def current_generation():
+    """Id generation training saat ini ("0" jika belum pernah training)."""
+    try:
+        mtime = os.stat(GENERATION_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+    with _gen_lock:
+        if _gen_state["mtime"] != mtime:
+            with open(GENERATION_PATH) as f:
+                _gen_state["id"] = f.read().strip() or "0"
+            _gen_state["mtime"] = mtime
+        return _gen_state["id"]
+
+def generation_time():
+    """Waktu (epoch detik) generation saat ini ditulis, None jika belum pernah."""
+    try:
+        return os.stat(GENERATION_PATH).st_mtime
+    except FileNotFoundError:
+        return None
+
+def make_generation_id():
+    return f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+
+def new_generation(gen_id=None):
+    """Catat run training baru, kosongkan cache, kembalikan id generation."""
+    gen_id = gen_id or make_generation_id()
+    tmp = GENERATION_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(gen_id)
+    os.replace(tmp, GENERATION_PATH)
+    AGGREGATE_CACHE.clear()
+    RESPONSE_CACHE.clear()
+    COUNT_CACHE.clear()
+    return gen_id
+
+class TTLCache:
+    """LRU terbatas dengan TTL. Kunci otomatis diberi prefix generation."""
+
+    def __init__(self, maxsize=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation=None):
+        full_key = (generation or current_generation(), key)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(full_key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[full_key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(full_key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, generation=None):
+        full_key = (generation or current_generation(), key)
+        with self._lock:
+            self._data[full_key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(full_key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def get_or_compute(self, key, compute):
+        generation = current_generation()
+        value = self.get(key, generation)
+        if value is None:
+            value = self.set(key, compute(), generation)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "generation": current_generation(),
+                "entries": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+AGGREGATE_CACHE = TTLCache()
+RESPONSE_CACHE = TTLCache(maxsize=RESPONSE_CACHE_MAX_ENTRIES)
+COUNT_CACHE = TTLCache(maxsize=COUNT_CACHE_MAX_ENTRIES)
+
+def invalidate():
+    """Hook invalidasi eksplisit (mis. setelah import data manual)."""
+    new_generation()
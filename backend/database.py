@@ -1,13 +1,268 @@
+import os
+import threading
+import time
+import traceback
+
 import mysql.connector
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+
+from metrics import observe_query
+
+# =========================
+# KONFIGURASI (bisa di-override lewat environment)
+# =========================
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", ""),
+    "database": os.getenv("DB_NAME", "psd"),
+    "port": int(os.getenv("DB_PORT", "3306")),
+    "autocommit": False,
+    "connection_timeout": 60,
+    "buffered": True,
+}
+
+# mysql.connector membatasi ukuran pool maksimal 32
+DB_POOL_SIZE = min(int(os.getenv("DB_POOL_SIZE", "10")), pooling.CNX_POOL_MAXSIZE)
+# Lama menunggu koneksi kosong sebelum menyerah (detik)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Ping koneksi saat checkout (reconnect jika MySQL sudah memutusnya)
+DB_POOL_PING = os.getenv("DB_POOL_PING", "1") == "1"
+# Koneksi yang dipinjam lebih lama dari ini dianggap bocor (detik)
+DB_LEAK_THRESHOLD = float(os.getenv("DB_LEAK_THRESHOLD", "300"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "checkouts": 0,
+    "timeouts": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+    "in_use_peak": 0,
+    "leaked_cursors": 0,
+    "long_held": 0,
+}
+_checked_out = {}
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name="bansos",
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG,
+                )
+    return _pool
+
+def _replace_pool_connection():
+    try:
+        _get_pool().add_connection()
+    except Exception as e:
+        print(f"[db-pool] gagal menambah koneksi pengganti: {e}")
+
+# =========================
+# KONEKSI TERPANTAU
+# =========================
+class TrackedConnection:
+    """Koneksi pool yang mencatat cursor terbuka dan lama peminjaman.
+
+    close() mengembalikan koneksi ke pool; bisa juga dipakai sebagai
+    `with get_db() as conn:` agar slot kembali meski terjadi exception.
+    Cursor yang lupa ditutup akan ditutup otomatis dan dihitung sebagai kebocoran.
+    """
+
+    def __init__(self, cnx, wait_ms):
+        self._cnx = cnx
+        self._cursors = []
+        self._checkout_at = time.monotonic()
+        self._origin = "".join(traceback.format_stack(limit=4)[:-2]).strip()
+        self.wait_ms = wait_ms
+
+    def cursor(self, *args, **kwargs):
+        cur = self._cnx.cursor(*args, **kwargs)
+        self._cursors.append(cur)
+        if _recorder["aktif"]:
+            return MeteredCursor(RecordingCursor(cur))
+        return MeteredCursor(cur)
+
+    def is_connected(self):
+        return self._cnx is not None and self._cnx.is_connected()
+
+    def close(self):
+        if self._cnx is None:
+            return
+        bocor = 0
+        for cur in self._cursors:
+            try:
+                # close() mengembalikan True hanya jika cursor masih terbuka
+                if cur.close():
+                    bocor += 1
+            except Exception:
+                pass
+        self._cursors = []
+
+        held = time.monotonic() - self._checkout_at
+        with _stats_lock:
+            _stats["leaked_cursors"] += bocor
+            if held > DB_LEAK_THRESHOLD:
+                _stats["long_held"] += 1
+            _checked_out.pop(id(self), None)
+        if bocor:
+            print(f"[db-pool] {bocor} cursor tidak ditutup, dipinjam dari:\n{self._origin}")
+
+        try:
+            self._cnx.close()
+        except Exception as e:
+            # Sesi mati (mis. server restart di tengah training): koneksi tidak
+            # kembali ke antrian pool, jadi ganti dengan koneksi baru
+            print(f"[db-pool] koneksi gagal dikembalikan ({e}), diganti koneksi baru")
+            _replace_pool_connection()
+        finally:
+            self._cnx = None
+            _slots.release()
+
+    def __getattr__(self, name):
+        if self._cnx is None:
+            raise mysql.connector.errors.OperationalError("Koneksi sudah dikembalikan ke pool.")
+        return getattr(self._cnx, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# =========================
+# PEREKAM QUERY (dipakai migrations.py untuk EXPLAIN)
+# =========================
+_recorder = {"aktif": False, "queries": {}}
+_recorder_lock = threading.Lock()
+
+def _normalize_sql(sql):
+    return " ".join(sql.split())
+
+class RecordingCursor:
+    """Bungkus cursor: catat setiap statement (sekali per teks SQL) beserta parameternya."""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def _catat(self, operation, params):
+        with _recorder_lock:
+            _recorder["queries"].setdefault(_normalize_sql(operation), params)
+
+    def execute(self, operation, *args, **kwargs):
+        self._catat(operation, args[0] if args else kwargs.get("params"))
+        return self._cur.execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        self._catat(operation, seq_params[0] if seq_params else None)
+        return self._cur.executemany(operation, seq_params, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+# =========================
+# METRIK QUERY (durasi & jumlah baris, lihat metrics.py)
+# =========================
+class MeteredCursor:
+    """Bungkus cursor: catat durasi execute dan rowcount ke metrics.
+
+    Cursor pool selalu buffered, jadi rowcount setelah execute sudah berisi
+    jumlah baris hasil SELECT (atau baris yang diubah untuk statement tulis).
+    """
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def _ukur(self, fn, operation, params, *args, **kwargs):
+        mulai = time.perf_counter()
+        try:
+            hasil = fn(operation, *args, **kwargs)
+        except Exception:
+            observe_query(operation, params, time.perf_counter() - mulai, error=True)
+            raise
+        observe_query(operation, params, time.perf_counter() - mulai, max(self._cur.rowcount or 0, 0))
+        return hasil
+
+    def execute(self, operation, *args, **kwargs):
+        params = args[0] if args else kwargs.get("params")
+        return self._ukur(self._cur.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        return self._ukur(self._cur.executemany, operation, seq_params[:1], seq_params, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+def start_recording():
+    with _recorder_lock:
+        _recorder["queries"] = {}
+        _recorder["aktif"] = True
+
+def stop_recording():
+    """Hentikan perekaman; kembalikan {sql: params} yang tercatat."""
+    with _recorder_lock:
+        _recorder["aktif"] = False
+        return dict(_recorder["queries"])
 
 def get_db():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="psd",
-        port=3306,
-        autocommit=False,
-        connection_timeout=60,
-        buffered=True
-    )
+    """Pinjam koneksi dari pool. Kembalikan lewat `with` atau close() di finally."""
+    pool = _get_pool()
+
+    start = time.monotonic()
+    if not _slots.acquire(timeout=DB_POOL_TIMEOUT):
+        with _stats_lock:
+            _stats["timeouts"] += 1
+        raise PoolError(f"Pool koneksi penuh ({DB_POOL_SIZE}) setelah menunggu {DB_POOL_TIMEOUT}s.")
+    wait_ms = (time.monotonic() - start) * 1000
+
+    try:
+        cnx = pool.get_connection()
+        if DB_POOL_PING:
+            cnx.ping(reconnect=True, attempts=2, delay=0)
+    except Exception:
+        _slots.release()
+        raise
+
+    conn = TrackedConnection(cnx, wait_ms)
+    with _stats_lock:
+        _stats["checkouts"] += 1
+        _stats["wait_ms_total"] += wait_ms
+        _stats["wait_ms_max"] = max(_stats["wait_ms_max"], wait_ms)
+        _checked_out[id(conn)] = conn
+        _stats["in_use_peak"] = max(_stats["in_use_peak"], len(_checked_out))
+    return conn
+
+def get_direct_db(**overrides):
+    """Koneksi di luar pool, untuk proses panjang (mis. lock training, bulk load)."""
+    return mysql.connector.connect(**{**DB_CONFIG, **overrides})
+
+def pool_stats():
+    now = time.monotonic()
+    with _stats_lock:
+        stats = dict(_stats)
+        aktif = list(_checked_out.values())
+    stats["pool_size"] = DB_POOL_SIZE
+    stats["in_use"] = len(aktif)
+    stats["wait_ms_avg"] = round(stats["wait_ms_total"] / stats["checkouts"], 3) if stats["checkouts"] else 0.0
+    stats["suspected_leaks"] = [
+        {"held_s": round(now - c._checkout_at, 1), "origin": c._origin}
+        for c in aktif if now - c._checkout_at > DB_LEAK_THRESHOLD
+    ]
+    return stats
@@ -0,0 +1,166 @@
+# engines.py
+# Engine clustering yang bisa dipilih per run training:
+#   full      : KMeans penuh (Lloyd, n_init restart) atas semua baris
+#   minibatch : MiniBatchKMeans.partial_fit per potongan data (out-of-core)
+#   sampled   : KMeans penuh atas sampel acak, lalu predict semua baris
+# Semua engine mengembalikan model yang punya predict(), jadi mapping label
+# (rata-rata rata_rata_desil per cluster) dan format artifacts tidak berubah.
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_score
+from sklearn.preprocessing import MinMaxScaler, RobustScaler, StandardScaler
+from threadpoolctl import threadpool_limits
+
+ENGINES = ("full", "minibatch", "sampled")
+DEFAULT_ENGINE = os.getenv("KMEANS_ENGINE", "full")
+
+# Ukuran minibatch & jumlah epoch untuk MiniBatchKMeans.partial_fit
+MINIBATCH_SIZE = int(os.getenv("STREAM_MINIBATCH_SIZE", "4096"))
+MINIBATCH_EPOCHS = int(os.getenv("STREAM_EPOCHS", "3"))
+# Sampel untuk pusat awal minibatch dan untuk engine "sampled"
+INIT_SAMPLE_SIZE = int(os.getenv("STREAM_INIT_SAMPLE_SIZE", "8192"))
+SAMPLE_SIZE = int(os.getenv("KMEANS_SAMPLE_SIZE", "50000"))
+# Silhouette O(n^2): di atas ukuran ini dihitung dari sampel
+SILHOUETTE_SAMPLE = int(os.getenv("SILHOUETTE_SAMPLE", "20000"))
+
+# Opsi scaling fitur yang dibandingkan mode evaluasi (lihat evaluation.py)
+SCALERS = {"minmax": MinMaxScaler, "standard": StandardScaler, "robust": RobustScaler}
+
+def map_cluster_labels(cluster_means):
+    """Cluster dengan rata-rata desil terendah = Sangat Rentan, dst."""
+    order = cluster_means.sort_values().index.tolist()
+
+    labels_sorted = ["Sangat Rentan", "Rentan", "Tidak Rentan"]
+    cluster_to_label = {}
+    for i, cluster_id in enumerate(order):
+        if i < len(labels_sorted):
+            cluster_to_label[cluster_id] = labels_sorted[i]
+        else:
+            cluster_to_label[cluster_id] = "Tidak Rentan"
+    return cluster_to_label
+
+def check_engine(engine):
+    """Nama engine yang valid (default bila None); ValueError jika tidak dikenal."""
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Engine tidak dikenal: {engine}. Pilihan: {', '.join(ENGINES)}.")
+    return engine
+
+def _slices(X, size):
+    for i in range(0, len(X), size):
+        yield X[i : i + size]
+
+def fit_minibatch(batches, sample, n_clusters, random_state=42, epochs=MINIBATCH_EPOCHS):
+    """MiniBatchKMeans dari iterator minibatch.
+
+    batches() dipanggil sekali per epoch dan harus menghasilkan array baru.
+    partial_fit hanya inisialisasi sekali dari batch pertama, jadi pusat awal
+    diambil dari KMeans penuh (n_init=10) atas sample.
+    """
+    init = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10).fit(sample).cluster_centers_
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state,
+                            batch_size=MINIBATCH_SIZE, init=init, n_init=1)
+    for _ in range(epochs):
+        for X in batches():
+            model.partial_fit(X)
+    return model
+
+def fit_sampled(sample, n_clusters, random_state=42, n_init=10):
+    return KMeans(n_clusters=n_clusters, random_state=random_state, n_init=n_init).fit(sample)
+
+def random_sample(X, size, random_state=42):
+    if len(X) <= size:
+        return X
+    rng = np.random.default_rng(random_state)
+    return X[np.sort(rng.choice(len(X), size=size, replace=False))]
+
+def fit_clusters(X, engine=None, n_clusters=3, random_state=42, n_init=10):
+    """Latih model clustering di atas X (sudah di-scale) dengan engine terpilih."""
+    engine = check_engine(engine)
+    if engine == "minibatch":
+        sample = random_sample(X, INIT_SAMPLE_SIZE, random_state)
+        return fit_minibatch(lambda: _slices(X, MINIBATCH_SIZE), sample, n_clusters, random_state)
+    if engine == "sampled":
+        return fit_sampled(random_sample(X, SAMPLE_SIZE, random_state), n_clusters, random_state, n_init)
+    return KMeans(n_clusters=n_clusters, random_state=random_state, n_init=n_init).fit(X)
+
+def inertia(model, X):
+    """SSE atas seluruh X (inertia_ engine sampled/minibatch hanya dari sebagian data)."""
+    return float(-model.score(X))
+
+def sampled_silhouette(X, labels, sample_size=SILHOUETTE_SAMPLE, random_state=42):
+    """Silhouette; disampel bila n besar. None jika kurang dari 2 cluster."""
+    if len(np.unique(labels)) < 2 or len(X) < 3:
+        return None
+    sample_size = sample_size if len(X) > sample_size else None
+    return float(silhouette_score(X, labels, sample_size=sample_size, random_state=random_state))
+
+def cluster_quality(X, labels, sample_size=SILHOUETTE_SAMPLE, random_state=42):
+    """Silhouette (disampel), Davies-Bouldin & Calinski-Harabasz; None jika < 2 cluster.
+
+    Davies-Bouldin (makin kecil makin baik) dan Calinski-Harabasz (makin besar
+    makin baik) hanya O(n*k), jadi tetap dihitung atas seluruh X.
+    """
+    if len(np.unique(labels)) < 2 or len(X) < 3:
+        return {"silhouette": None, "davies_bouldin": None, "calinski_harabasz": None}
+    return {
+        "silhouette": sampled_silhouette(X, labels, sample_size, random_state),
+        "davies_bouldin": float(davies_bouldin_score(X, labels)),
+        "calinski_harabasz": float(calinski_harabasz_score(X, labels)),
+    }
+
+# =========================
+# FUNGSI WORKER PROCESS POOL (lihat parallel.py)
+# =========================
+# Dibatasi 1 thread BLAS/OpenMP per proses supaya worker tidak berebut core.
+def fit_restart(X, n_clusters, seed):
+    """Satu restart KMeans (n_init=1) dengan seed tertentu."""
+    with threadpool_limits(1):
+        return KMeans(n_clusters=n_clusters, random_state=seed, n_init=1).fit(X)
+
+def silhouette_worker(X, labels, sample_size=SILHOUETTE_SAMPLE):
+    with threadpool_limits(1):
+        return sampled_silhouette(X, labels, sample_size)
+
+def fit_group(key, X_raw, desil, n_init=10, random_state=42):
+    """Model mandiri satu grup (desa/kecamatan): scaler + KMeans + mapping label."""
+    with threadpool_limits(1):
+        scaler = MinMaxScaler()
+        X = scaler.fit_transform(X_raw)
+        n_clusters = 3 if len(X) >= 3 else 1
+        model = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=n_init).fit(X)
+    cluster_means = pd.Series(desil).groupby(model.labels_).mean()
+    return {
+        "key": key,
+        "scaler_kerentanan": scaler,
+        "kmeans_kerentanan": model,
+        "cluster_to_label": map_cluster_labels(cluster_means),
+        "labels": model.labels_,
+    }
+
+def evaluate_candidate(X_raw, n_clusters, scaling, n_init=4, random_state=42):
+    """Satu kandidat sweep: scaler + KMeans k cluster, dinilai dengan cluster_quality.
+
+    Clustering memakai scaling kandidat, tetapi SSE dan metrik kualitas selalu
+    dihitung di ruang MinMax (ruang model produksi). Metrik berbasis jarak dari
+    ruang fitur yang berbeda tidak bisa diperingkat bersama.
+    """
+    with threadpool_limits(1):
+        start = time.perf_counter()
+        X_nilai = MinMaxScaler().fit_transform(X_raw)
+        X = X_nilai if scaling == "minmax" else SCALERS[scaling]().fit_transform(X_raw)
+        labels = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=n_init).fit(X).labels_
+        sse = sum(float(((X_nilai[labels == c] - X_nilai[labels == c].mean(axis=0)) ** 2).sum())
+                  for c in np.unique(labels))
+        return {
+            "k": n_clusters,
+            "scaling": scaling,
+            "sse": sse,
+            **cluster_quality(X_nilai, labels, random_state=random_state),
+            "cluster_terkecil": int(np.bincount(labels, minlength=n_clusters).min()),
+            "detik": round(time.perf_counter() - start, 3),
+        }
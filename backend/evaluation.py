@@ -0,0 +1,158 @@
+# evaluation.py
+# Mode evaluasi (mode=evaluate): sapu jumlah cluster k dan opsi scaling fitur
+# secara paralel di process pool. Tiap kandidat dinilai dengan silhouette
+# (disampel), Davies-Bouldin dan Calinski-Harabasz, yang tetap murah untuk n
+# besar. Metrik semua kandidat diukur di ruang MinMax yang sama, jadi peringkat
+# lintas scaling membandingkan partisi, bukan skala fitur. Setelah itu model akhir dilatih seperti train_kmeans, dan laporan
+# kualitasnya disimpan di metadata registry bersama artifacts.
+#
+# Model akhir tetap MinMaxScaler dengan 3 cluster. Alasannya, kategori
+# Sangat Rentan / Rentan / Tidak Rentan (urut rata-rata rata_rata_desil),
+# skorer online (scale_/min_) dan deteksi drift inkremental (rentang 0..1)
+# bergantung pada keduanya. Kandidat lain hanya dilaporkan sebagai rekomendasi.
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from database import get_db
+from engines import SCALERS, cluster_quality, evaluate_candidate, map_cluster_labels, random_sample
+from kmeans import FITUR_KERENTANAN, no_progress, prepare_training_data, publish_results
+from parallel import check_workers, fit_restarts, make_pool
+from periode import PERIOD_PARSER
+from registry import current_version
+from scoring import apply_scoring
+from utils import peak_rss_mb
+
+EVAL_K_MIN = int(os.getenv("EVAL_K_MIN", "2"))
+EVAL_K_MAX = int(os.getenv("EVAL_K_MAX", "8"))
+# Batas atas k yang boleh diminta lewat API
+EVAL_K_LIMIT = 20
+# Sweep dijalankan atas sampel acak baris valid (pusat cluster stabil jauh
+# sebelum jutaan baris); model akhir tetap dilatih atas semua baris
+EVAL_SAMPLE_SIZE = int(os.getenv("EVAL_SAMPLE_SIZE", "100000"))
+EVAL_N_INIT = int(os.getenv("EVAL_N_INIT", "4"))
+
+# Arah tiap metrik: True = makin besar makin baik
+QUALITY_METRICS = {"silhouette": True, "davies_bouldin": False, "calinski_harabasz": True}
+
+def check_k_max(k_max):
+    k_max = int(k_max or EVAL_K_MAX)
+    if not 3 <= k_max <= EVAL_K_LIMIT:
+        raise ValueError(f"k_max harus antara 3 dan {EVAL_K_LIMIT}.")
+    return k_max
+
+def rank_candidates(candidates):
+    """Urutkan kandidat berdasarkan rata-rata peringkat di ketiga metrik kualitas."""
+    if not candidates:
+        return []
+    df = pd.DataFrame(candidates)
+    ranks = pd.concat(
+        [df[m].rank(ascending=not besar_lebih_baik) for m, besar_lebih_baik in QUALITY_METRICS.items()],
+        axis=1,
+    )
+    df["peringkat_rata_rata"] = ranks.mean(axis=1).round(3)
+    df = df.sort_values(["peringkat_rata_rata", "k"]).reset_index(drop=True)
+    df["peringkat"] = np.arange(1, len(df) + 1)
+    return [
+        {k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in row.items()}
+        for row in df.astype(object).to_dict(orient="records")
+    ]
+
+def sweep_quality(pool, X_raw, ks, scalings=tuple(SCALERS), n_init=EVAL_N_INIT,
+                  sample_size=EVAL_SAMPLE_SIZE, random_state=42):
+    """Nilai semua kombinasi (k, scaling) secara paralel; kembalikan laporan kualitas."""
+    start = time.perf_counter()
+    sample = random_sample(np.asarray(X_raw, dtype=np.float64), sample_size, random_state)
+    futures = [
+        pool.submit(evaluate_candidate, sample, k, scaling, n_init, random_state)
+        for k in ks for scaling in scalings if k < len(sample)
+    ]
+    kandidat = rank_candidates([f.result() for f in futures])
+    pilihan_k3 = [c for c in kandidat if c["k"] == 3]
+    return {
+        "k": list(ks),
+        "scaling": list(scalings),
+        "sample_size": len(sample),
+        "n_init": n_init,
+        "kandidat": kandidat,
+        "terbaik": kandidat[0] if kandidat else None,
+        "terbaik_k3": pilihan_k3[0] if pilihan_k3 else None,
+        "detik": round(time.perf_counter() - start, 3),
+    }
+
+def train_kmeans_evaluated(progress=None, workers=None, k_max=None):
+    progress = progress or no_progress
+    workers = check_workers(workers)
+    k_max = check_k_max(k_max)
+    conn = get_db()
+    try:
+        # 1-2. LOAD, TYPECAST & FILTER (aturan sama dengan train_kmeans)
+        df_semua, df, error = prepare_training_data(conn, progress)
+        if error:
+            return error
+        total_awal = len(df_semua)
+
+        with make_pool(workers) as pool:
+            # 3. SWEEP k x SCALING
+            ks = list(range(EVAL_K_MIN, k_max + 1))
+            progress("evaluating", total_valid=len(df), kandidat=len(ks) * len(SCALERS), workers=workers)
+            laporan = sweep_quality(pool, df[FITUR_KERENTANAN], ks)
+
+            # 4. MODEL AKHIR: MinMax + 3 cluster, restart paralel di pool yang sama
+            progress("clustering", total_valid=len(df))
+            scaler_A = MinMaxScaler()
+            X = scaler_A.fit_transform(df[FITUR_KERENTANAN])
+            n_clusters = 3 if len(df) >= 3 else 1
+            kmeans_A = fit_restarts(pool, X, n_clusters)
+
+        progress("scoring", total_valid=len(df))
+        cluster_means = df.groupby(kmeans_A.labels_)["rata_rata_desil"].mean()
+        cluster_to_label = map_cluster_labels(cluster_means)
+        df["cluster_kerentanan"] = kmeans_A.labels_
+        df["kategori_kerentanan"] = df["cluster_kerentanan"].map(cluster_to_label)
+        df = apply_scoring(df)
+
+        kualitas = cluster_quality(X, kmeans_A.labels_)
+        laporan["model_akhir"] = {"k": n_clusters, "scaling": "minmax", "sse": float(kmeans_A.inertia_), **kualitas}
+        artifacts = {
+            "scaler_kerentanan": scaler_A,
+            "kmeans_kerentanan": kmeans_A,
+            "cluster_to_label": cluster_to_label,
+            "fitur_kerentanan": FITUR_KERENTANAN,
+        }
+        metadata = {"mode": "evaluate", "workers": workers, "sse": float(kmeans_A.inertia_),
+                    **kualitas, "kualitas": laporan}
+        tulis = publish_results(conn, df, df_semua, artifacts, progress, metadata)
+
+        total_inserted = tulis["rows"]
+        return {
+            "status": "success",
+            "mode": "evaluate",
+            "model_version": current_version(),
+            "rows_processed": total_inserted,
+            "info": f"Sukses. {total_inserted} data disimpan (Data Desil/Peringkat 0 dibuang).",
+            "kualitas": {
+                "terbaik": laporan["terbaik"],
+                "terbaik_k3": laporan["terbaik_k3"],
+                "model_akhir": laporan["model_akhir"],
+                "jumlah_kandidat": len(laporan["kandidat"]),
+                "detik_sweep": laporan["detik"],
+            },
+            "diagnostik": {
+                "total_awal": total_awal,
+                "total_valid_disimpan": total_inserted,
+                "penulisan": tulis,
+                "periode": PERIOD_PARSER.stats(),
+                "memori": {"peak_rss_mb": peak_rss_mb()},
+            }
+        }
+
+    except Exception as e:
+        print("ERROR:", str(e))
+        if conn and conn.is_connected(): conn.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        if conn: conn.close()
@@ -0,0 +1,205 @@
+# export.py
+# Ekspor daftar keluarga_kerentanan berperingkat (CSV / Parquet) langsung
+# dari cursor server-side. Baris dibaca per EXPORT_CHUNK_SIZE dan langsung
+# dikirim sebagai potongan response, jadi memori tetap konstan berapa pun
+# jumlah barisnya, dan header CSV terkirim sebelum query selesai dieksekusi.
+import csv
+import io
+import os
+import threading
+from contextlib import closing
+from datetime import date
+
+from mysql.connector import FieldType
+
+from getdata import ORDER_KERENTANAN, SELECT_KERENTANAN, kerentanan_filters
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet butuh pyarrow, CSV tetap jalan
+    pa = pq = None
+
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+# Ekspor memakai koneksi di luar pool; batasi yang berjalan bersamaan
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+
+_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+class EksporPenuh(Exception):
+    pass
+
+def check_format(fmt):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format tidak dikenal: {fmt}. Pilihan: {', '.join(EXPORT_FORMATS)}.")
+    if fmt == "parquet" and pa is None:
+        raise ValueError("Ekspor Parquet membutuhkan paket pyarrow.")
+    return fmt
+
+def export_filename(fmt, desa=None):
+    bagian = ["kerentanan"]
+    if desa and desa != "SEMUA":
+        bagian.append("".join(c if c.isalnum() else "_" for c in desa))
+    bagian.append(date.today().isoformat())
+    return "_".join(bagian) + "." + fmt
+
+def _rows(desa, search, chunksize):
+    """Yield (kolom, list baris) per chunk; kolom pertama = peringkat."""
+    from database import get_direct_db
+
+    base_query, where_clause, params = kerentanan_filters(desa, search)
+    sql = f"{SELECT_KERENTANAN} {base_query} {where_clause} {ORDER_KERENTANAN}"
+    conn = get_direct_db(buffered=False)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        columns = ["peringkat"] + [d[0] for d in cursor.description]
+        types = [FieldType.LONGLONG] + [d[1] for d in cursor.description]
+        peringkat = 0
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            yield columns, types, [(peringkat + i + 1,) + tuple(row) for i, row in enumerate(rows)]
+            peringkat += len(rows)
+    finally:
+        # Klien memutus di tengah: sisa baris dibuang dengan menutup koneksi
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        conn.close()
+
+class _SlotIterator:
+    """Pegang satu slot ekspor sampai iterator habis, ditutup, atau dibuang."""
+
+    def __init__(self, gen):
+        self._aktif = False
+        if not _slots.acquire(blocking=False):
+            raise EksporPenuh(f"Maksimal {EXPORT_MAX_CONCURRENT} ekspor berjalan bersamaan.")
+        self._gen = gen
+        self._aktif = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._gen)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._aktif:
+            self._aktif = False
+            try:
+                self._gen.close()
+            finally:
+                _slots.release()
+
+    def __del__(self):
+        self.close()
+
+# =========================
+# CSV
+# =========================
+def _csv_chunk(rows=None, header=None):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header is not None:
+        writer.writerow(header)
+    if rows:
+        writer.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+def iter_csv(desa=None, search=None, chunksize=EXPORT_CHUNK_SIZE):
+    # BOM supaya Excel membaca UTF-8 (nama dengan karakter non-ASCII)
+    yield b"\xef\xbb\xbf"
+    header_terkirim = False
+    with closing(_rows(desa, search, chunksize)) as chunks:
+        for columns, _, rows in chunks:
+            yield _csv_chunk(rows, None if header_terkirim else columns)
+            header_terkirim = True
+    if not header_terkirim:
+        yield _csv_chunk(header=["peringkat"])
+
+# =========================
+# PARQUET
+# =========================
+_FLOAT = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+_INT = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.LONGLONG, FieldType.INT24, FieldType.YEAR}
+_WAKTU = {FieldType.DATETIME, FieldType.TIMESTAMP}
+
+def _arrow_type(type_code):
+    if type_code in _FLOAT:
+        return pa.float64()
+    if type_code in _INT:
+        return pa.int64()
+    if type_code in _WAKTU:
+        return pa.timestamp("us")
+    if type_code == FieldType.DATE:
+        return pa.date32()
+    return pa.string()
+
+def _arrow_value(value, tipe):
+    if value is None:
+        return None
+    if pa.types.is_floating(tipe):
+        return float(value)
+    if pa.types.is_string(tipe) and not isinstance(value, str):
+        return value.decode("utf-8", "replace") if isinstance(value, (bytes, bytearray)) else str(value)
+    return value
+
+class _Sink(io.RawIOBase):
+    """Sink tulis-saja: byte yang ditulis ParquetWriter diambil per row group."""
+
+    def __init__(self):
+        self.parts = []
+        self.posisi = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        self.posisi += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.posisi
+
+    def take(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+def iter_parquet(desa=None, search=None, chunksize=EXPORT_CHUNK_SIZE):
+    """Satu row group per chunk; byte dikirim segera setelah row group ditulis."""
+    sink = _Sink()
+    writer = None
+    try:
+        with closing(_rows(desa, search, chunksize)) as chunks:
+            for columns, types, rows in chunks:
+                if writer is None:
+                    schema = pa.schema([(c, _arrow_type(t)) for c, t in zip(columns, types)])
+                    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+                kolom_data = list(zip(*rows))
+                arrays = [
+                    pa.array([_arrow_value(v, field.type) for v in values], type=field.type)
+                    for values, field in zip(kolom_data, schema)
+                ]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                yield sink.take()
+        if writer is None:
+            schema = pa.schema([("peringkat", pa.int64())])
+            writer = pq.ParquetWriter(sink, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.take()
+
+def export_stream(fmt="csv", desa=None, search=None):
+    """Generator byte untuk StreamingResponse (EksporPenuh jika slot habis)."""
+    gen = iter_csv(desa, search) if fmt == "csv" else iter_parquet(desa, search)
+    return _SlotIterator(gen)
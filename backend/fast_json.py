@@ -0,0 +1,70 @@
+# fast_json.py
+# Jalur serialisasi cepat untuk halaman hasil besar. Baris diambil sebagai
+# tuple, kolom Decimal dikonversi sekaligus per kolom (bukan per field lewat
+# jsonable_encoder), lalu di-encode dengan orjson. Endpoint mengembalikan
+# FastJSONResponse sehingga FastAPI tidak lagi menelusuri isi response.
+# Hasil JSON sama dengan encoder bawaan FastAPI (Decimal tanpa pecahan -> int,
+# selain itu float; datetime/date -> ISO 8601).
+import datetime
+import json
+from decimal import Decimal
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # fallback json standar (lebih lambat, hasil sama)
+    orjson = None
+
+def _decimal(value):
+    return int(value) if value.as_tuple().exponent >= 0 else float(value)
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return _decimal(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    raise TypeError(f"Tipe tidak bisa di-serialisasi ke JSON: {type(value).__name__}")
+
+def _column_converter(values):
+    """Konverter untuk satu kolom berdasarkan nilai non-NULL pertama (None = apa adanya)."""
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, Decimal):
+            return _decimal
+        if isinstance(value, (bytes, bytearray)):
+            return lambda v: v.decode("utf-8", "replace")
+        if orjson is None and isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+            return lambda v: v.isoformat()
+        return None
+    return None
+
+def records(columns, rows):
+    """List dict dari baris tuple, dengan konversi numerik per kolom."""
+    if not rows:
+        return []
+    kolom_data = list(zip(*rows))
+    for i, values in enumerate(kolom_data):
+        convert = _column_converter(values)
+        if convert is not None:
+            kolom_data[i] = [None if v is None else convert(v) for v in values]
+    return [dict(zip(columns, row)) for row in zip(*kolom_data)]
+
+def fetch_records(cursor):
+    """fetchall() cursor tuple -> list dict siap di-serialisasi."""
+    columns = [d[0] for d in cursor.description]
+    return records(columns, cursor.fetchall())
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,214 @@
+# feature_store.py
+# Feature store fitur_keluarga: satu baris fitur per id_keluarga (kolom
+# KOLOM_FITUR + updated_at), diperbarui inkremental. Trigger di tabel sumber
+# memasukkan id_keluarga yang berubah ke fitur_keluarga_antrian; refresh
+# menghitung ulang fitur hanya untuk id di antrian (FEATURE_QUERY dengan
+# filter id di setiap subquery) lalu upsert. Training cukup memindai
+# fitur_keluarga secara sekuensial, scoring membaca per primary key.
+#
+# Tabel & trigger dipasang oleh migrations.py. Bila trigger tidak ada (hak
+# akses TRIGGER/SUPER), refresh selalu membangun ulang tabel dengan satu
+# INSERT ... SELECT (tetap benar, hanya tidak inkremental). Bila tabelnya
+# belum ada, training menghitung fitur langsung dari tabel sumber.
+import os
+import threading
+import time
+
+from features import FEATURE_ID_GROUPS, FEATURE_QUERY, KOLOM_FITUR, feature_query_for_ids
+from migrations import STORE_TABLES, TRIGGERS, existing_triggers
+
+# "store" = training/scoring membaca fitur_keluarga, "query" = hitung langsung
+FEATURE_SOURCE = os.getenv("FEATURE_SOURCE", "store")
+# id per batch saat memproses antrian
+REFRESH_BATCH = int(os.getenv("FEATURE_REFRESH_BATCH", "1000"))
+
+_KOLOM = ", ".join(KOLOM_FITUR)
+_UPDATE = ", ".join(f"{c} = VALUES({c})" for c in KOLOM_FITUR[1:])
+
+# Baca fitur untuk training: satu scan sekuensial (urut primary key)
+STORE_QUERY = f"SELECT {_KOLOM} FROM fitur_keluarga"
+
+UPSERT_STORE_SQL = f"""
+    INSERT INTO fitur_keluarga ({_KOLOM})
+    VALUES ({", ".join(["%s"] * len(KOLOM_FITUR))})
+    ON DUPLICATE KEY UPDATE {_UPDATE}
+"""
+
+# updated_at hanya berubah bila nilai fitur benar-benar berubah
+REBUILD_STORE_SQL = f"""
+    INSERT INTO fitur_keluarga ({_KOLOM})
+    SELECT {_KOLOM} FROM ({FEATURE_QUERY}) f
+    ON DUPLICATE KEY UPDATE {_UPDATE}
+"""
+
+DELETE_ORPHANS_SQL = """
+    DELETE fs FROM fitur_keluarga fs
+    LEFT JOIN keluarga k ON k.id_keluarga = fs.id_keluarga
+    WHERE k.id_keluarga IS NULL
+"""
+
+# =========================
+# STATUS TABEL & TRIGGER
+# =========================
+# Tabel & trigger dibuat oleh migrations.py (python migrations.py apply);
+# di sini hanya diperiksa. Hasil lengkap disimpan per proses, hasil kurang
+# dicek ulang setelah FEATURE_STORE_RECHECK detik supaya migrasi yang baru
+# dijalankan langsung terpakai tanpa restart.
+FEATURE_STORE_RECHECK = float(os.getenv("FEATURE_STORE_RECHECK", "60"))
+
+_lock = threading.Lock()
+_state = {"status": None, "checked": 0.0}
+
+def feature_store_status(conn):
+    """{"tables": tabel store ada, "triggers": semua trigger terpasang}."""
+    with _lock:
+        status = _state["status"]
+        basi = time.monotonic() - _state["checked"] >= FEATURE_STORE_RECHECK
+        if status is None or (not all(status.values()) and basi):
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT TABLE_NAME FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN (%s, %s)",
+                    tuple(STORE_TABLES),
+                )
+                tabel = {row[0] for row in cursor.fetchall()}
+                trigger = set(existing_triggers(cursor))
+            finally:
+                cursor.close()
+            status = {"tables": tabel >= set(STORE_TABLES), "triggers": trigger >= set(TRIGGERS)}
+            _state.update(status=status, checked=time.monotonic())
+            if not status["tables"]:
+                print("Tabel feature store belum ada, fitur dihitung dari tabel sumber. Jalankan: python migrations.py apply")
+            elif not status["triggers"]:
+                print("Trigger feature store belum lengkap, refresh memakai rebuild penuh. Jalankan: python migrations.py apply")
+        return status
+
+def incremental_enabled(conn):
+    status = feature_store_status(conn)
+    return status["tables"] and status["triggers"]
+
+# =========================
+# REFRESH
+# =========================
+def _recompute(cursor, ids):
+    """Hitung ulang fitur id tertentu lalu upsert; id yang sudah hilang dihapus."""
+    cursor.execute(feature_query_for_ids(len(ids)), list(ids) * FEATURE_ID_GROUPS)
+    columns = [d[0] for d in cursor.description]
+    rows = [tuple(dict(zip(columns, row))[c] for c in KOLOM_FITUR) for row in cursor.fetchall()]
+    if rows:
+        cursor.executemany(UPSERT_STORE_SQL, rows)
+    hilang = list(set(ids) - {str(row[0]) for row in rows})
+    if hilang:
+        placeholders = ",".join(["%s"] * len(hilang))
+        cursor.execute(f"DELETE FROM fitur_keluarga WHERE id_keluarga IN ({placeholders})", hilang)
+    return len(rows), len(hilang)
+
+def _dequeue(cursor, antrian):
+    # Hanya entri dengan queued_at yang sama: perubahan baru selama refresh tetap di antrian
+    cursor.executemany(
+        "DELETE FROM fitur_keluarga_antrian WHERE id_keluarga = %s AND queued_at = %s", antrian
+    )
+
+def rebuild_feature_store(conn):
+    """Bangun ulang seluruh fitur_keluarga dengan satu INSERT ... SELECT."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT CURRENT_TIMESTAMP(6)")
+        mulai = cursor.fetchone()[0]
+        cursor.execute(REBUILD_STORE_SQL)
+        cursor.execute(DELETE_ORPHANS_SQL)
+        # Antrian sebelum rebuild sudah tercakup
+        cursor.execute("DELETE FROM fitur_keluarga_antrian WHERE queued_at < %s", (mulai,))
+        conn.commit()
+        cursor.execute("SELECT COUNT(*) FROM fitur_keluarga")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+def refresh_feature_store(conn, full=False, batch_size=REFRESH_BATCH):
+    """Perbarui fitur_keluarga: proses antrian, atau rebuild bila perlu."""
+    start = time.perf_counter()
+    status = feature_store_status(conn)
+    if not status["tables"]:
+        raise RuntimeError("Tabel feature store belum ada. Jalankan: python migrations.py apply")
+    inkremental = status["triggers"]
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM fitur_keluarga LIMIT 1")
+        kosong = cursor.fetchone() is None
+    finally:
+        cursor.close()
+
+    if full or kosong or not inkremental:
+        rows = rebuild_feature_store(conn)
+        stats = {"mode": "rebuild", "rows": rows}
+    else:
+        diperbarui = dihapus = 0
+        cursor = conn.cursor()
+        try:
+            while True:
+                cursor.execute(
+                    "SELECT id_keluarga, queued_at FROM fitur_keluarga_antrian ORDER BY queued_at LIMIT %s",
+                    (batch_size,),
+                )
+                antrian = cursor.fetchall()
+                if not antrian:
+                    break
+                n_upsert, n_hapus = _recompute(cursor, [str(row[0]) for row in antrian])
+                _dequeue(cursor, antrian)
+                conn.commit()
+                diperbarui += n_upsert
+                dihapus += n_hapus
+        finally:
+            cursor.close()
+        stats = {"mode": "incremental", "rows": diperbarui, "deleted": dihapus}
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    print("Feature store:", stats)
+    return stats
+
+def training_query(conn):
+    """Query fitur untuk training sesuai FEATURE_SOURCE (store di-refresh dulu)."""
+    if FEATURE_SOURCE != "store" or not feature_store_status(conn)["tables"]:
+        return FEATURE_QUERY
+    refresh_feature_store(conn)
+    return STORE_QUERY
+
+def fetch_features(conn, ids):
+    """Baris fitur (tuple urut KOLOM_FITUR) untuk id tertentu.
+
+    Dari fitur_keluarga; id yang masih di antrian atau belum ada di store
+    dihitung ulang dulu. Tanpa trigger, fitur dihitung langsung dari sumber.
+    """
+    ids = [str(i) for i in ids]
+    if FEATURE_SOURCE != "store" or not incremental_enabled(conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(feature_query_for_ids(len(ids)), list(ids) * FEATURE_ID_GROUPS)
+            columns = [d[0] for d in cursor.description]
+            return [tuple(dict(zip(columns, row))[c] for c in KOLOM_FITUR) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    placeholders = ",".join(["%s"] * len(ids))
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT id_keluarga, queued_at FROM fitur_keluarga_antrian WHERE id_keluarga IN ({placeholders})",
+            ids,
+        )
+        antrian = cursor.fetchall()
+        cursor.execute(f"{STORE_QUERY} WHERE id_keluarga IN ({placeholders})", ids)
+        rows = {str(row[0]): row for row in cursor.fetchall()}
+
+        basi = {str(row[0]) for row in antrian} | (set(ids) - set(rows))
+        if basi:
+            _recompute(cursor, list(basi))
+            if antrian:
+                _dequeue(cursor, antrian)
+            conn.commit()
+            cursor.execute(f"{STORE_QUERY} WHERE id_keluarga IN ({placeholders})", ids)
+            rows = {str(row[0]): row for row in cursor.fetchall()}
+        return list(rows.values())
+    finally:
+        cursor.close()
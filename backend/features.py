@@ -0,0 +1,197 @@
+# features.py
+import os
+
+import numpy as np
+import pandas as pd
+
+# =========================
+# KELOMPOK JENIS ASET
+# =========================
+ASET_TINGGI = (3, 7, 9, 11, 13)
+ASET_MENENGAH = (2, 4, 8, 14)
+ASET_BAWAH = (1, 5, 6, 12, 10)
+
+# Urutan kolom hasil ekstraksi fitur (sama dengan query lama)
+KOLOM_FITUR = [
+    "id_keluarga", "desa", "rata_rata_desil", "peringkat_nasional",
+    "jumlah_tanggungan", "aset_tinggi", "aset_menengah", "aset_bawah",
+    "periode_terakhir_bpnt", "periode_terakhir_pkh", "status_nonaktif",
+]
+
+def _in_list(values):
+    return "(" + ",".join(str(v) for v in values) + ")"
+
+# =========================
+# QUERY LAMA (SUBQUERY KORELASI)
+# =========================
+# Disimpan hanya sebagai pembanding di bench_features.py.
+# Setiap baris keluarga memicu 7 subquery.
+LEGACY_FEATURE_QUERY = f"""
+    SELECT
+        k.id_keluarga,
+        kel.nama_kelurahan AS desa,
+        COALESCE((SELECT AVG(CAST(rd.desil AS DECIMAL(10,2)))
+                  FROM riwayat_desil rd WHERE rd.id_keluarga = k.id_keluarga), 0) AS rata_rata_desil,
+        CAST(k.peringkat_nasional AS UNSIGNED) AS peringkat_nasional,
+        (SELECT COUNT(*) FROM anggota_keluarga a WHERE a.id_keluarga = k.id_keluarga) AS jumlah_tanggungan,
+        (SELECT SUM(jumlah) FROM aset_keluarga WHERE id_keluarga = k.id_keluarga AND id_jenis_aset IN {_in_list(ASET_TINGGI)}) AS aset_tinggi,
+        (SELECT SUM(jumlah) FROM aset_keluarga WHERE id_keluarga = k.id_keluarga AND id_jenis_aset IN {_in_list(ASET_MENENGAH)}) AS aset_menengah,
+        (SELECT SUM(jumlah) FROM aset_keluarga WHERE id_keluarga = k.id_keluarga AND id_jenis_aset IN {_in_list(ASET_BAWAH)}) AS aset_bawah,
+        (SELECT nama_periode FROM riwayat_bpnt bp WHERE bp.id_keluarga = k.id_keluarga ORDER BY id DESC LIMIT 1) AS periode_terakhir_bpnt,
+        (SELECT nama_periode FROM riwayat_pkh pkh WHERE pkh.id_keluarga = k.id_keluarga ORDER BY id DESC LIMIT 1) AS periode_terakhir_pkh,
+        k.status_nonaktif
+    FROM keluarga k
+    LEFT JOIN kelurahan kel
+        ON kel.no_kel = k.no_kel
+        AND kel.no_kec = k.no_kec
+        AND kel.no_kab = k.no_kab
+        AND kel.no_prop = k.no_prop
+"""
+
+# =========================
+# QUERY BARU (SET-BASED / GROUP BY)
+# =========================
+# Setiap agregat dihitung SEKALI per tabel sumber (GROUP BY id_keluarga),
+# lalu semuanya di-JOIN ke keluarga. Nilai NULL/0 dibuat identik dengan
+# query lama: AVG desil di-COALESCE ke 0, COUNT anggota jadi 0 bila tidak
+# ada anggota, SUM aset tetap NULL bila tidak ada aset di kelompok tsb.
+def _feature_query(filter_sub="", filter_k=""):
+    return f"""
+    SELECT
+        k.id_keluarga,
+        kel.nama_kelurahan AS desa,
+        COALESCE(rd.rata_rata_desil, 0) AS rata_rata_desil,
+        CAST(k.peringkat_nasional AS UNSIGNED) AS peringkat_nasional,
+        COALESCE(ak.jumlah_tanggungan, 0) AS jumlah_tanggungan,
+        ast.aset_tinggi,
+        ast.aset_menengah,
+        ast.aset_bawah,
+        bp.nama_periode AS periode_terakhir_bpnt,
+        pkh.nama_periode AS periode_terakhir_pkh,
+        k.status_nonaktif
+    FROM keluarga k
+    LEFT JOIN kelurahan kel
+        ON kel.no_kel = k.no_kel
+        AND kel.no_kec = k.no_kec
+        AND kel.no_kab = k.no_kab
+        AND kel.no_prop = k.no_prop
+    LEFT JOIN (
+        SELECT id_keluarga, AVG(CAST(desil AS DECIMAL(10,2))) AS rata_rata_desil
+        FROM riwayat_desil {filter_sub}
+        GROUP BY id_keluarga
+    ) rd ON rd.id_keluarga = k.id_keluarga
+    LEFT JOIN (
+        SELECT id_keluarga, COUNT(*) AS jumlah_tanggungan
+        FROM anggota_keluarga {filter_sub}
+        GROUP BY id_keluarga
+    ) ak ON ak.id_keluarga = k.id_keluarga
+    LEFT JOIN (
+        SELECT
+            id_keluarga,
+            SUM(CASE WHEN id_jenis_aset IN {_in_list(ASET_TINGGI)} THEN jumlah END) AS aset_tinggi,
+            SUM(CASE WHEN id_jenis_aset IN {_in_list(ASET_MENENGAH)} THEN jumlah END) AS aset_menengah,
+            SUM(CASE WHEN id_jenis_aset IN {_in_list(ASET_BAWAH)} THEN jumlah END) AS aset_bawah
+        FROM aset_keluarga {filter_sub}
+        GROUP BY id_keluarga
+    ) ast ON ast.id_keluarga = k.id_keluarga
+    LEFT JOIN (
+        SELECT id_keluarga, MAX(id) AS id_terakhir
+        FROM riwayat_bpnt {filter_sub}
+        GROUP BY id_keluarga
+    ) bp_last ON bp_last.id_keluarga = k.id_keluarga
+    LEFT JOIN riwayat_bpnt bp ON bp.id = bp_last.id_terakhir
+    LEFT JOIN (
+        SELECT id_keluarga, MAX(id) AS id_terakhir
+        FROM riwayat_pkh {filter_sub}
+        GROUP BY id_keluarga
+    ) pkh_last ON pkh_last.id_keluarga = k.id_keluarga
+    LEFT JOIN riwayat_pkh pkh ON pkh.id = pkh_last.id_terakhir
+    {filter_k}
+"""
+
+FEATURE_QUERY = _feature_query()
+
+# Jumlah grup placeholder di feature_query_for_ids (5 subquery + keluarga)
+FEATURE_ID_GROUPS = 6
+
+def feature_query_for_ids(n):
+    """FEATURE_QUERY untuk n id_keluarga tertentu.
+
+    Filter id dipasang di dalam setiap subquery GROUP BY sehingga hanya baris
+    milik keluarga tsb yang diagregasi (tidak memindai seluruh tabel sumber).
+    Parameter: list(ids) * FEATURE_ID_GROUPS.
+    """
+    placeholders = ",".join(["%s"] * n)
+    return _feature_query(
+        f"WHERE id_keluarga IN ({placeholders})",
+        f"WHERE k.id_keluarga IN ({placeholders})",
+    )
+
+def load_features(conn, query=None):
+    """Ambil fitur per keluarga (satu baris per id_keluarga).
+
+    Default: dari feature store fitur_keluarga (lihat feature_store.py).
+    """
+    if query is None:
+        from feature_store import training_query
+        query = training_query(conn)
+    df = pd.read_sql(query, conn)
+    return df[KOLOM_FITUR]
+
+# =========================
+# LOADER STREAMING (PER CHUNK)
+# =========================
+# Baris per chunk saat membaca fitur lewat cursor server-side
+CHUNK_SIZE = int(os.getenv("TRAINING_CHUNK_SIZE", "50000"))
+
+# Tipe ringkas per kolom. Peringkat & tanggungan tetap integer (int32)
+# karena peringkat nasional bisa melewati presisi float32.
+KOLOM_FLOAT32 = ["rata_rata_desil", "aset_tinggi", "aset_menengah", "aset_bawah"]
+KOLOM_INT32 = ["peringkat_nasional", "jumlah_tanggungan"]
+KOLOM_KATEGORI = ["desa", "periode_terakhir_bpnt", "periode_terakhir_pkh"]
+
+def compact_dtypes(df):
+    """Typecast + downcast: desa/periode categorical, fitur float32/int32, status int8."""
+    df = df.copy()
+    df["id_keluarga"] = df["id_keluarga"].astype(str)
+    for col in KOLOM_FLOAT32:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(np.float32)
+    for col in KOLOM_INT32:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(np.int32)
+    df["status_nonaktif"] = pd.to_numeric(df["status_nonaktif"], errors="coerce").fillna(0).astype(np.int8)
+    for col in KOLOM_KATEGORI:
+        df[col] = df[col].astype("category")
+    return df
+
+def iter_features(chunksize=CHUNK_SIZE, query=None):
+    """Yield DataFrame fitur per chunk (tipe ringkas) dari cursor server-side.
+
+    Memakai koneksi langsung tanpa buffer, jadi hasil query tidak pernah
+    dimuat utuh ke memori klien.
+    """
+    from database import get_db, get_direct_db
+    if query is None:
+        from feature_store import training_query
+        refresh_conn = get_db()
+        try:
+            query = training_query(refresh_conn)
+        finally:
+            refresh_conn.close()
+    conn = get_direct_db(buffered=False)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query)
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            yield compact_dtypes(pd.DataFrame(rows, columns=columns)[KOLOM_FITUR])
+    finally:
+        # Jika generator dihentikan lebih awal masih ada baris belum dibaca;
+        # menutup koneksi cukup untuk membuangnya
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        conn.close()
@@ -0,0 +1,350 @@
+# geo.py
+# Peta choropleth desa dari sisi server. Geometri GeoJSON frontend dimuat
+# sekali, disederhanakan per zoom (Douglas-Peucker, toleransi ~1 piksel),
+# dipotong ke batas tile (plus buffer) bila diminta per tile, dikuantisasi
+# ala TopoJSON (transform + koordinat integer delta) lalu digabung dengan
+# rekap per desa (indeks_desa & jumlah per kategori).
+# Body hasil (identity/gzip/br) dicache per generation training, jadi peta
+# cukup satu request kecil dan hanya dibangun ulang setelah training.
+import functools
+import gzip
+import math
+import os
+
+import numpy as np
+from fastapi.responses import Response
+
+from cache import TTLCache, current_generation
+from fast_json import dumps
+
+try:
+    import brotli
+except ImportError:  # tanpa brotli: gzip saja
+    brotli = None
+
+_GEO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend", "public", "geo")
+# Sumber geometri: file desa/kelurahan jika ada, selain itu batas kabupaten
+GEOJSON_PATHS = [
+    p for p in [os.getenv("MAP_GEOJSON_PATH")] if p
+] + [os.path.join(_GEO_DIR, "32.05_kelurahan.geojson"), os.path.join(_GEO_DIR, "32.05_Garut.geojson")]
+
+MIN_ZOOM = 6
+MAX_ZOOM = 18
+# Di atas zoom ini geometri asli dipakai tanpa penyederhanaan
+SIMPLIFY_MAX_ZOOM = 15
+FORMATS = ("topojson", "geojson")
+# Buffer potongan tile (piksel dari 256): garis tepi polygon yang terpotong
+# jatuh di luar area tile yang terlihat
+TILE_BUFFER_PX = int(os.getenv("MAP_TILE_BUFFER_PX", "8"))
+# Properti nama desa di GeoJSON (untuk join dengan rekap_desa)
+KOLOM_NAMA = ("nm_kelurahan", "NAMOBJ", "nm_desa", "desa")
+
+MAP_CACHE = TTLCache(maxsize=int(os.getenv("MAP_CACHE_MAX_ENTRIES", "128")))
+
+# =========================
+# SUMBER GEOMETRI
+# =========================
+def _polygons(geometry):
+    """List polygon; polygon = list ring (array Nx2, koordinat z dibuang)."""
+    coords = geometry["coordinates"]
+    if geometry["type"] == "Polygon":
+        coords = [coords]
+    elif geometry["type"] != "MultiPolygon":
+        return []
+    return [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in poly] for poly in coords]
+
+@functools.lru_cache(maxsize=1)
+def load_source():
+    """(path, list fitur {properties, polygons, bbox}) dari file pertama yang ada."""
+    for path in GEOJSON_PATHS:
+        if os.path.exists(path):
+            break
+    else:
+        raise FileNotFoundError("File GeoJSON peta tidak ditemukan: " + ", ".join(GEOJSON_PATHS))
+    import json
+    with open(path) as f:
+        data = json.load(f)
+
+    fitur = []
+    for feature in data.get("features", []):
+        polygons = _polygons(feature.get("geometry") or {})
+        if not polygons:
+            continue
+        semua = np.concatenate([ring for poly in polygons for ring in poly])
+        fitur.append({
+            "properties": feature.get("properties") or {},
+            "polygons": polygons,
+            "bbox": (*semua.min(axis=0), *semua.max(axis=0)),
+        })
+    return path, fitur
+
+# =========================
+# PENYEDERHANAAN & KUANTISASI
+# =========================
+def tolerance(zoom):
+    """Ukuran 1 piksel (derajat) pada zoom tertentu (tile 256 px)."""
+    return 360.0 / (256 * 2 ** zoom)
+
+def simplify_ring(points, tol):
+    """Douglas-Peucker iteratif untuk satu ring/garis."""
+    n = len(points)
+    if n <= 4 or tol <= 0:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b <= a + 1:
+            continue
+        p = points[a + 1 : b]
+        seg = points[b] - points[a]
+        panjang = math.hypot(seg[0], seg[1])
+        if panjang == 0:
+            jarak = np.hypot(p[:, 0] - points[a, 0], p[:, 1] - points[a, 1])
+        else:
+            jarak = np.abs(seg[0] * (p[:, 1] - points[a, 1]) - seg[1] * (p[:, 0] - points[a, 0])) / panjang
+        i = int(jarak.argmax())
+        if jarak[i] > tol:
+            keep[a + 1 + i] = True
+            stack.append((a, a + 1 + i))
+            stack.append((a + 1 + i, b))
+    return points[keep]
+
+@functools.lru_cache(maxsize=MAX_ZOOM + 1)
+def simplified(zoom):
+    """Polygon tiap fitur setelah disederhanakan untuk zoom (ring < 4 titik dibuang)."""
+    _, fitur = load_source()
+    tol = tolerance(zoom) if zoom <= SIMPLIFY_MAX_ZOOM else 0
+    hasil = []
+    for f in fitur:
+        polygons = []
+        for poly in f["polygons"]:
+            rings = [simplify_ring(ring, tol) for ring in poly]
+            if len(rings[0]) < 4:
+                continue
+            polygons.append([rings[0]] + [r for r in rings[1:] if len(r) >= 4])
+        hasil.append(polygons)
+    return hasil
+
+def _clip_axis(pts, axis, batas, ke_bawah):
+    """Satu langkah Sutherland-Hodgman: sisakan bagian ring di satu sisi garis axis = batas."""
+    ins = pts[:, axis] <= batas if ke_bawah else pts[:, axis] >= batas
+    if ins.all():
+        return pts
+    if not ins.any():
+        return pts[:0]
+    prev = np.roll(pts, 1, axis=0)
+    cross = ins != np.roll(ins, 1)
+    # Titik potong segmen prev -> pts dengan garis (hanya dipakai di cross)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (batas - prev[:, axis]) / (pts[:, axis] - prev[:, axis])
+        potong = prev + t[:, None] * (pts - prev)
+    potong[:, axis] = batas
+    # Per titik: titik potong (jika menyeberang) lalu titiknya sendiri (jika di dalam)
+    jumlah = cross.astype(np.int64) + ins
+    awal = np.cumsum(jumlah) - jumlah
+    out = np.empty((int(jumlah.sum()), 2))
+    out[awal[cross]] = potong[cross]
+    out[(awal + cross)[ins]] = pts[ins]
+    return out
+
+def clip_ring(ring, box):
+    """Potong ring tertutup ke persegi box (x0, y0, x1, y1); None jika habis."""
+    pts = ring[:-1] if len(ring) > 1 and (ring[0] == ring[-1]).all() else ring
+    x0, y0, x1, y1 = box
+    for axis, batas, ke_bawah in ((0, x0, False), (0, x1, True), (1, y0, False), (1, y1, True)):
+        pts = _clip_axis(pts, axis, batas, ke_bawah)
+        if len(pts) < 3:
+            return None
+    return np.vstack([pts, pts[:1]])
+
+def clip_polygons(polygons, box):
+    """Polygon fitur yang dipotong ke box; polygon yang ring luarnya habis dibuang."""
+    hasil = []
+    for poly in polygons:
+        luar = clip_ring(poly[0], box)
+        if luar is None:
+            continue
+        lubang = [clip_ring(r, box) for r in poly[1:]]
+        hasil.append([luar] + [r for r in lubang if r is not None])
+    return hasil
+
+def _geometri(zoom, indices, box):
+    """[(index fitur, polygon)] untuk layer; dengan box, dipotong dan fitur kosong dibuang."""
+    hasil = []
+    for i in indices:
+        polygons = simplified(zoom)[i]
+        if box is not None:
+            polygons = clip_polygons(polygons, box)
+            if not polygons:
+                continue
+        hasil.append((i, polygons))
+    return hasil
+
+def _quantize_ring(ring, translate, scale):
+    """Ring -> arc TopoJSON: titik pertama absolut, selanjutnya delta integer."""
+    q = np.round((ring - translate) / scale).astype(np.int64)
+    # Buang titik berurutan yang jatuh ke sel kuantisasi yang sama
+    beda = np.ones(len(q), dtype=bool)
+    beda[1:] = (np.diff(q, axis=0) != 0).any(axis=1)
+    q = q[beda]
+    if len(q) < 4:
+        return None
+    delta = np.vstack([q[:1], np.diff(q, axis=0)])
+    return delta.tolist()
+
+def to_topojson(zoom, indices, properties, box=None):
+    """Topology dengan satu objek "desa" (GeometryCollection MultiPolygon)."""
+    _, fitur = load_source()
+    geometri = _geometri(zoom, indices, box)
+    bbox = np.array([fitur[i]["bbox"] for i, _ in geometri]) if geometri else np.zeros((1, 4))
+    x0, y0 = bbox[:, 0].min(), bbox[:, 1].min()
+    x1, y1 = bbox[:, 2].max(), bbox[:, 3].max()
+    if box is not None and geometri:
+        # Grid kuantisasi cukup menutup area potongan
+        x0, y0, x1, y1 = max(x0, box[0]), max(y0, box[1]), min(x1, box[2]), min(y1, box[3])
+    # Langkah kuantisasi <= setengah piksel pada zoom ini
+    step = tolerance(zoom) / 2
+    n = int(min(max(math.ceil(max(x1 - x0, y1 - y0) / step) + 1, 1e3), 1e6))
+    scale = np.array([max(x1 - x0, 1e-12) / (n - 1), max(y1 - y0, 1e-12) / (n - 1)])
+    translate = np.array([x0, y0])
+
+    arcs, geometries = [], []
+    for i, polygons in geometri:
+        polys = []
+        for poly in polygons:
+            rings = []
+            for ring in poly:
+                arc = _quantize_ring(ring, translate, scale)
+                if arc is not None:
+                    rings.append([len(arcs)])
+                    arcs.append(arc)
+            if rings:
+                polys.append(rings)
+        geometries.append({"type": "MultiPolygon", "arcs": polys, "properties": properties[i]})
+    return {
+        "type": "Topology",
+        "bbox": [float(x0), float(y0), float(x1), float(y1)],
+        "transform": {"scale": scale.tolist(), "translate": translate.tolist()},
+        "objects": {"desa": {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": arcs,
+    }
+
+def to_geojson(zoom, indices, properties, box=None):
+    # Presisi desimal cukup untuk 1 piksel pada zoom ini
+    desimal = max(0, math.ceil(-math.log10(tolerance(zoom)))) + 1
+    features = []
+    for i, polygons in _geometri(zoom, indices, box):
+        coords = [[np.round(ring, desimal).tolist() for ring in poly] for poly in polygons]
+        features.append({
+            "type": "Feature",
+            "properties": properties[i],
+            "geometry": {"type": "MultiPolygon", "coordinates": coords},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+# =========================
+# PROPERTI (REKAP PER DESA)
+# =========================
+def _nama(props):
+    for kolom in KOLOM_NAMA:
+        if props.get(kolom):
+            return str(props[kolom])
+    return None
+
+def merged_properties(rekap):
+    """Properti asli + statistik desa (sama dengan yang dihitung PangatikanMap.jsx)."""
+    _, fitur = load_source()
+    lookup = {str(k).upper().strip(): v for k, v in rekap.items() if k}
+    hasil = []
+    for f in fitur:
+        props = dict(f["properties"])
+        nama = _nama(props)
+        if nama is not None:
+            stats = lookup.get(nama.upper().strip(), {})
+            sangat = stats.get("sangat_rentan", 0)
+            rentan = stats.get("rentan", 0)
+            tidak = stats.get("tidak_rentan", 0)
+            total = stats.get("total_kk", 0)
+            pembagi = total or 1
+            props.update({
+                "nama": nama,
+                "jumlah_sangat_rentan": sangat,
+                "jumlah_rentan": rentan,
+                "jumlah_tidak_rentan": tidak,
+                "total_kk": total,
+                "pct_sangat_rentan": round(100 * sangat / pembagi, 2),
+                "pct_rentan": round(100 * rentan / pembagi, 2),
+                "pct_tidak_rentan": round(100 * tidak / pembagi, 2),
+                "indeks_desa": stats.get("indeks_desa", 0),
+            })
+        hasil.append(props)
+    return hasil
+
+# =========================
+# TILE & RESPONSE
+# =========================
+def tile_bbox(z, x, y):
+    """(lon_min, lat_min, lon_max, lat_max) tile slippy map z/x/y."""
+    n = 2 ** z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"Tile di luar jangkauan: {z}/{x}/{y}")
+    def lat(t):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * t / n))))
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+def clip_box(tile):
+    """bbox tile diperlebar TILE_BUFFER_PX piksel di tiap sisi (None = tanpa potong)."""
+    if tile is None:
+        return None
+    x0, y0, x1, y1 = tile_bbox(*tile)
+    bx, by = (x1 - x0) * TILE_BUFFER_PX / 256, (y1 - y0) * TILE_BUFFER_PX / 256
+    return x0 - bx, y0 - by, x1 + bx, y1 + by
+
+def _indices(box):
+    _, fitur = load_source()
+    if box is None:
+        return list(range(len(fitur)))
+    bx0, by0, bx1, by1 = box
+    return [
+        i for i, f in enumerate(fitur)
+        if f["bbox"][0] <= bx1 and f["bbox"][2] >= bx0 and f["bbox"][1] <= by1 and f["bbox"][3] >= by0
+    ]
+
+def build_bodies(zoom, fmt="topojson", tile=None):
+    """{encoding: body} untuk satu layer/tile; dicache per generation."""
+    generation = current_generation()
+    key = ("map", zoom, fmt, tile)
+    bodies = MAP_CACHE.get(key, generation)
+    if bodies is None:
+        from getdata import get_rekap_per_desa
+        properties = merged_properties(get_rekap_per_desa())
+        builder = to_topojson if fmt == "topojson" else to_geojson
+        box = clip_box(tile)
+        raw = dumps(builder(zoom, _indices(box), properties, box))
+        bodies = {"identity": raw, "gzip": gzip.compress(raw, compresslevel=6)}
+        if brotli is not None:
+            bodies["br"] = brotli.compress(raw, quality=5)
+        MAP_CACHE.set(key, bodies, generation)
+    return generation, bodies
+
+def _encoding(accept_encoding, bodies):
+    diterima = {e.split(";")[0].strip() for e in (accept_encoding or "").split(",")}
+    for encoding in ("br", "gzip"):
+        if encoding in diterima and encoding in bodies:
+            return encoding
+    return "identity"
+
+def map_response(headers, zoom, fmt="topojson", tile=None):
+    """Response peta dengan ETag per generation dan body terkompresi."""
+    generation, bodies = build_bodies(zoom, fmt, tile)
+    encoding = _encoding(headers.get("accept-encoding"), bodies)
+    etag = f'W/"{generation}-{fmt}-{zoom}-{"_".join(map(str, tile)) if tile else "all"}"'
+    base = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=base)
+    if encoding != "identity":
+        base["Content-Encoding"] = encoding
+    media_type = "application/geo+json" if fmt == "geojson" else "application/json"
+    return Response(content=bodies[encoding], media_type=media_type, headers=base)
@@ -1,15 +1,27 @@
+from cache import AGGREGATE_CACHE, COUNT_CACHE
 from database import get_db
+from fast_json import fetch_records
+from pagination import decode_cursor, encode_cursor
+from rekap import hitung_indeks_desa, read_rekap
+from search_index import MAX_IN_IDS, get_index
 import pandas as pd
 
 import math
 
-def list_kerentanan(desa: str = None, page: int = 1, limit: int = 10, search: str = None):
-    conn = get_db()
-    # Pastikan cursor menggunakan dictionary=True agar hasil query berupa JSON object
-    cursor = conn.cursor(dictionary=True) 
-    
-    offset = (page - 1) * limit
-    
+# Kolom data per baris kerentanan (dipakai list_kerentanan & ekspor)
+SELECT_KERENTANAN = """
+        SELECT 
+            kk.*, 
+            IFNULL(k.no_kk, '-') as no_kk, 
+            IFNULL(k.nama_kepala_keluarga, 'Data Tidak Lengkap') as nama_kepala_keluarga, 
+            IFNULL(k.alamat, '-') as alamat
+"""
+
+# Urutan peringkat: skor_akhir terbesar dulu, id_keluarga sebagai pemutus seri
+ORDER_KERENTANAN = "ORDER BY kk.skor_akhir DESC, kk.id_keluarga DESC"
+
+def kerentanan_filters(desa=None, search=None):
+    """(base_query, where_clause, params) untuk filter desa/search keluarga_kerentanan."""
     # PERBAIKAN 1: Gunakan LEFT JOIN agar data tetap muncul meski tidak ada match di tabel keluarga
     base_query = """
         FROM keluarga_kerentanan kk
@@ -25,7 +37,16 @@ def list_kerentanan(desa: str = None, page: int = 1, limit: int = 10, search: st
         params.append(desa)
         
     # 2. Filter Search
-    if search:
+    # Pakai indeks pencarian di memori bila kandidatnya tidak terlalu banyak,
+    # selain itu fallback ke LIKE (full scan)
+    search_ids = _search_candidates(search) if search else None
+    if search_ids is not None:
+        if search_ids:
+            conditions.append("kk.id_keluarga IN (" + ",".join(["%s"] * len(search_ids)) + ")")
+            params.extend(search_ids)
+        else:
+            conditions.append("1 = 0")
+    elif search:
         search_term = f"%{search}%"
         # Perbaiki logika pencarian agar lebih aman
         conditions.append("(kk.id_keluarga LIKE %s OR k.nama_kepala_keluarga LIKE %s OR kk.desa LIKE %s)")
@@ -34,43 +55,83 @@ def list_kerentanan(desa: str = None, page: int = 1, limit: int = 10, search: st
     where_clause = ""
     if conditions:
         where_clause = " WHERE " + " AND ".join(conditions)
+    return base_query, where_clause, params
+
+def list_kerentanan(desa: str = None, page: int = 1, limit: int = 10, search: str = None,
+                    cursor_token: str = None, total: str = "cached"):
+    """Daftar kerentanan urut skor_akhir DESC, id_keluarga DESC.
+
+    Tanpa cursor_token: pagination page/limit (OFFSET) seperti sebelumnya.
+    Dengan cursor_token: keyset pagination mulai setelah baris terakhir halaman
+    sebelumnya (token dari pagination.next_cursor), tanpa OFFSET.
+    total: "exact" (COUNT tiap request), "cached" (COUNT disimpan per generation
+    training), atau "none" (tidak menghitung total).
+    """
+    offset = (page - 1) * limit
+    filters = {"desa": desa if desa != "SEMUA" else None, "search": search or None}
+    # Token cursor divalidasi sebelum meminjam koneksi (ValueError -> 400)
+    seek_values = decode_cursor(cursor_token, filters) if cursor_token else None
+
+    base_query, where_clause, params = kerentanan_filters(desa, search)
 
     # --- QUERY 1: Hitung Total (Pagination) ---
     count_sql = f"SELECT COUNT(*) as total {base_query} {where_clause}"
-    
-    # Debugging: Print jika perlu
-    # print(f"Count SQL: {count_sql}, Params: {params}")
-    
-    cursor.execute(count_sql, params)
-    total_row = cursor.fetchone()
-    total_items = total_row['total'] if total_row else 0
-    
-    total_pages = math.ceil(total_items / limit) if total_items > 0 else 1
 
     # --- QUERY 2: Ambil Data ---
     # PERBAIKAN 2: Pisahkan parameter query data agar tidak merusak list params asli
-    data_params = params + [limit, offset]
+    if seek_values:
+        # Keyset: lanjut dari (skor_akhir, id_keluarga) baris terakhir
+        skor_terakhir, id_terakhir = seek_values
+        seek = "(kk.skor_akhir < %s OR (kk.skor_akhir = %s AND kk.id_keluarga < %s))"
+        seek_where = (where_clause + " AND " if where_clause else " WHERE ") + seek
+        data_params = params + [skor_terakhir, skor_terakhir, id_terakhir, limit]
+        page_clause = "LIMIT %s"
+    else:
+        seek_where = where_clause
+        data_params = params + [limit, offset]
+        page_clause = "LIMIT %s OFFSET %s"
 
     data_sql = f"""
-        SELECT 
-            kk.*, 
-            IFNULL(k.no_kk, '-') as no_kk, 
-            IFNULL(k.nama_kepala_keluarga, 'Data Tidak Lengkap') as nama_kepala_keluarga, 
-            IFNULL(k.alamat, '-') as alamat
+        {SELECT_KERENTANAN}
         {base_query} 
-        {where_clause}
-        ORDER BY kk.skor_akhir DESC
-        LIMIT %s OFFSET %s
+        {seek_where}
+        {ORDER_KERENTANAN}
+        {page_clause}
     """
-    
-    # Debugging: Cek query final di console server
-    print(f"Data SQL: {data_sql}")
-    print(f"Data Params: {data_params}")
 
-    cursor.execute(data_sql, data_params)
-    result = cursor.fetchall()
-    
-    conn.close()
+    conn = get_db()
+    try:
+        # Pastikan cursor menggunakan dictionary=True agar hasil query berupa JSON object
+        cursor = conn.cursor(dictionary=True)
+
+        def hitung_total():
+            cursor.execute(count_sql, params)
+            total_row = cursor.fetchone()
+            return total_row['total'] if total_row else 0
+
+        if total == "none":
+            total_items = None
+        elif total == "exact":
+            total_items = hitung_total()
+        else:
+            cache = COUNT_CACHE if filters["search"] else AGGREGATE_CACHE
+            total_items = cache.get_or_compute(("kerentanan_count", filters["desa"], filters["search"]), hitung_total)
+        cursor.close()
+
+        # Baris diambil sebagai tuple; Decimal dikonversi per kolom (fast_json)
+        data_cursor = conn.cursor()
+        data_cursor.execute(data_sql, data_params)
+        result = fetch_records(data_cursor)
+        data_cursor.close()
+    finally:
+        conn.close()
+
+    total_pages = (math.ceil(total_items / limit) if total_items > 0 else 1) if total_items is not None else None
+
+    next_cursor = None
+    if len(result) == limit:
+        last = result[-1]
+        next_cursor = encode_cursor([last["skor_akhir"], last["id_keluarga"]], filters)
     
     return {
         "data": result,
@@ -78,17 +139,75 @@ def list_kerentanan(desa: str = None, page: int = 1, limit: int = 10, search: st
             "page": page,
             "limit": limit,
             "total_items": total_items,
-            "total_pages": total_pages
+            "total_pages": total_pages,
+            "next_cursor": next_cursor
         }
     }
+def _search_candidates(search):
+    """id_keluarga yang cocok dari indeks pencarian, atau None untuk fallback LIKE."""
+    try:
+        index = get_index()
+        if index is None:
+            return None  # indeks pertama masih dibangun
+        ids = index.substring_ids(search)
+    except Exception as e:
+        print("Indeks pencarian tidak tersedia:", e)
+        return None
+    return ids if len(ids) <= MAX_IN_IDS else None
+
+def search_kerentanan(q: str, desa: str = None, limit: int = 20):
+    """Pencarian berperingkat (toleran typo) atas nama, no KK, id dan desa."""
+    index = get_index(wait=True)
+    if index is None:
+        # Indeks belum siap: daftar biasa dengan filter LIKE (tanpa peringkat typo)
+        return {"data": list_kerentanan(desa, 1, limit, q, total="none")["data"], "query": q}
+    matches = index.search(q, limit, desa)
+    if not matches:
+        return {"data": [], "query": q}
+
+    ids = [m["id_keluarga"] for m in matches]
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT 
+                kk.*, 
+                IFNULL(k.no_kk, '-') as no_kk, 
+                IFNULL(k.nama_kepala_keluarga, 'Data Tidak Lengkap') as nama_kepala_keluarga, 
+                IFNULL(k.alamat, '-') as alamat
+            FROM keluarga_kerentanan kk
+            LEFT JOIN keluarga k ON kk.id_keluarga = k.id_keluarga
+            WHERE kk.id_keluarga IN ({",".join(["%s"] * len(ids))})
+        """, ids)
+        rows = {str(r["id_keluarga"]): r for r in fetch_records(cursor)}
+        cursor.close()
+
+    data = []
+    for m in matches:
+        row = rows.get(m["id_keluarga"])
+        if row is not None:
+            row["skor_pencarian"] = m["skor_pencarian"]
+            data.append(row)
+    return {"data": data, "query": q}
+
 def list_desa():
-    conn = get_db()
-    df = pd.read_sql("SELECT DISTINCT desa FROM keluarga_kerentanan WHERE desa IS NOT NULL", conn)
-    conn.close()
+    with get_db() as conn:
+        df = pd.read_sql("SELECT DISTINCT desa FROM keluarga_kerentanan WHERE desa IS NOT NULL", conn)
     return df["desa"].tolist()
 
 def get_dashboard_stats(desa: str = "SEMUA"):
-    conn = get_db()
+    # Disajikan dari cache agregat (berlaku sampai training berikutnya)
+    return AGGREGATE_CACHE.get_or_compute(("dashboard_stats", desa), lambda: _dashboard_stats_db(desa))
+
+def _dashboard_stats_db(desa):
+    with get_db() as conn:
+        return _dashboard_stats_conn(conn, desa)
+
+def _dashboard_stats_conn(conn, desa):
+    rows = read_rekap(conn)
+    if rows is not None:
+        return stats_from_rekap(rows, desa)
+
+    # Fallback (rekap_desa belum ada): agregasi langsung dari keluarga_kerentanan
     cursor = conn.cursor(dictionary=True) # dictionary=True agar hasil return berupa dict, bukan tuple
 
     sql = """
@@ -111,6 +230,11 @@ def get_dashboard_stats(desa: str = "SEMUA"):
     cursor.execute(sql, params)
     result = cursor.fetchone()
 
+    cursor.close()
+
+    return build_stats(result, desa)
+
+def build_stats(result, desa):
     # Jika tabel kosong, SUM akan mengembalikan None, jadi kita konversi ke 0
     # Decimal dari MySQL juga perlu dikonversi ke int agar valid JSON
     stats = {
@@ -125,7 +249,18 @@ def get_dashboard_stats(desa: str = "SEMUA"):
 
 
 def get_rekap_per_desa():
-    conn = get_db()
+    return AGGREGATE_CACHE.get_or_compute("rekap_per_desa", _rekap_per_desa_db)
+
+def _rekap_per_desa_db():
+    with get_db() as conn:
+        return _rekap_per_desa_conn(conn)
+
+def _rekap_per_desa_conn(conn):
+    rows = read_rekap(conn)
+    if rows is not None:
+        return build_rekap(rows)
+
+    # Fallback (rekap_desa belum ada): agregasi langsung dari keluarga_kerentanan
     cursor = conn.cursor(dictionary=True)
 
     sql = """
@@ -143,6 +278,11 @@ def get_rekap_per_desa():
     cursor.execute(sql)
     results = cursor.fetchall()
 
+    cursor.close()
+
+    return build_rekap(results)
+
+def build_rekap(results):
     data_per_desa = {}
 
     for row in results:
@@ -156,14 +296,7 @@ def get_rekap_per_desa():
         # =========================
         # HITUNG INDEKS DESA
         # =========================
-        if total > 0:
-            indeks_desa = (
-                (sangat * 1) +
-                (rentan * 2) +
-                (tidak * 3)
-            ) / (total * 3)
-        else:
-            indeks_desa = 0
+        indeks_desa = hitung_indeks_desa(sangat, rentan, tidak, total)
 
         data_per_desa[nama_desa] = {
             "sangat_rentan": sangat,
@@ -172,13 +305,30 @@ def get_rekap_per_desa():
             "total_kk": total,
 
             # ➕ NILAI INDEKS DESA
-            "indeks_desa": round(indeks_desa, 4)
+            "indeks_desa": indeks_desa
         }
 
-    cursor.close()
-    conn.close()
-
     return data_per_desa
 
-    
-    
\ No newline at end of file
+def stats_from_rekap(rows, desa):
+    """Statistik dashboard dari baris rekap_desa (SEMUA = jumlah semua desa)."""
+    if desa != "SEMUA":
+        rows = [r for r in rows if r["desa"] == desa]
+    total = {
+        "total": sum(int(r["total_kk"]) for r in rows),
+        "sangat_rentan": sum(int(r["sangat_rentan"]) for r in rows),
+        "rentan": sum(int(r["rentan"]) for r in rows),
+        "tidak_rentan": sum(int(r["tidak_rentan"]) for r in rows),
+    }
+    return build_stats(total, desa)
+
+# =========================
+# PRECOMPUTE SETELAH TRAINING
+# =========================
+def precompute_dashboard(rows, generation):
+    """Isi cache dashboard dari baris rekap_desa yang baru saja ditulis."""
+    AGGREGATE_CACHE.set(("dashboard_stats", "SEMUA"), stats_from_rekap(rows, "SEMUA"), generation)
+    for row in rows:
+        if row["desa"] is not None:
+            AGGREGATE_CACHE.set(("dashboard_stats", row["desa"]), stats_from_rekap([row], row["desa"]), generation)
+    AGGREGATE_CACHE.set("rekap_per_desa", build_rekap(rows), generation)
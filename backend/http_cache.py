@@ -0,0 +1,113 @@
+# http_cache.py
+# Cache HTTP untuk endpoint baca yang isinya hanya berubah setelah training
+# (atau rollback / invalidasi). ETag = id generation, Last-Modified = waktu
+# generation ditulis. Request dengan If-None-Match yang cocok dijawab 304
+# tanpa menyentuh MySQL; selain itu body JSON diambil dari RESPONSE_CACHE
+# (LRU ber-generation, lihat cache.py) dengan kunci path + parameter yang
+# dinormalisasi.
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import parse_qsl
+
+from cache import RESPONSE_CACHE, current_generation, generation_time
+
+# Parameter yang menentukan isi response per path, beserta nilai default-nya
+# (parameter bernilai default dibuang supaya ?page=1 dan tanpa page sama).
+CACHED_PATHS = {
+    "/kerentanan": {
+        "params": ("desa", "page", "limit", "search", "cursor", "total"),
+        "defaults": {"page": "1", "limit": "10", "total": "cached", "desa": "SEMUA"},
+    },
+    "/kerentanan/desa": {"params": (), "defaults": {}},
+    "/dashboard-stats": {"params": ("desa",), "defaults": {"desa": "SEMUA"}},
+    "/dashboard-stats-semua-desa": {"params": (), "defaults": {}},
+}
+
+def normalize_params(path, query_string):
+    """Tuple (nama, nilai) terurut, atau None jika request tidak boleh dicache."""
+    aturan = CACHED_PATHS[path]
+    params = {}
+    for nama, nilai in parse_qsl(query_string.decode("latin-1")):
+        nilai = nilai.strip()
+        if nama in aturan["params"] and nilai and nilai != aturan["defaults"].get(nama):
+            params[nama] = nilai
+    # total=exact meminta COUNT segar di setiap request
+    if params.get("total") == "exact":
+        return None
+    return tuple(sorted(params.items()))
+
+def _etag_cocok(if_none_match, etag):
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+def _not_modified(headers, etag, modified):
+    if_none_match = headers.get(b"if-none-match")
+    if if_none_match is not None:
+        return _etag_cocok(if_none_match.decode("latin-1"), etag)
+    since = headers.get(b"if-modified-since")
+    if since is not None and modified is not None:
+        try:
+            return int(modified) <= parsedate_to_datetime(since.decode("latin-1")).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+class ETagMiddleware:
+    """Middleware ASGI: ETag/Last-Modified + LRU body untuk CACHED_PATHS."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in CACHED_PATHS:
+            return await self.app(scope, receive, send)
+        params = normalize_params(scope["path"], scope["query_string"])
+        if params is None:
+            return await self.app(scope, receive, send)
+
+        generation = current_generation()
+        modified = generation_time()
+        etag = f'"{generation}"'
+        validators = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        if modified is not None:
+            validators.append((b"last-modified", formatdate(modified, usegmt=True).encode()))
+
+        headers = dict(scope["headers"])
+        if _not_modified(headers, etag, modified):
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        key = (scope["path"], params)
+        body = RESPONSE_CACHE.get(key, generation)
+        if body is not None:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-cache", b"HIT"),
+                ] + validators,
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        # Miss: teruskan ke endpoint, tambahkan validator, simpan body 200
+        status = {"code": None}
+        chunks = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if status["code"] == 200:
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"x-cache", b"MISS")] + validators}
+            elif message["type"] == "http.response.body" and status["code"] == 200:
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    RESPONSE_CACHE.set(key, b"".join(chunks), generation)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
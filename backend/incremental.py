@@ -0,0 +1,212 @@
+# incremental.py
+# Re-scoring inkremental: hanya keluarga yang fiturnya berubah sejak skor
+# terakhir yang di-predict ulang (pakai artifacts tersimpan) dan di-upsert.
+from datetime import date
+
+import pandas as pd
+
+from cache import make_generation_id, new_generation
+from database import get_db
+from features import load_features
+from getdata import precompute_dashboard
+from kmeans import (
+    FITUR_KERENTANAN, filter_valid, no_progress, train_kmeans, typecast_features,
+)
+from registry import load_model
+from rekap import ensure_rekap_table, refresh_rekap_from_table
+from scoring import apply_scoring
+from search_index import build_index
+from writer import INSERT_SQL, build_rows
+
+# Jika porsi keluarga yang berubah sejak refit terakhir (atau porsi fitur
+# di luar rentang scaler) melewati batas ini, lakukan training penuh.
+DRIFT_THRESHOLD = 0.2
+
+BATCH_SIZE = 1000
+
+# Kolom yang menentukan hasil skor seorang keluarga. Semua tabel sumber
+# (keluarga, riwayat_desil, aset_keluarga, anggota_keluarga, riwayat_bpnt,
+# riwayat_pkh) sudah teragregasi ke kolom-kolom ini oleh load_features.
+KOLOM_HASH = [
+    "desa", "rata_rata_desil", "peringkat_nasional", "jumlah_tanggungan",
+    "aset_tinggi", "aset_menengah", "aset_bawah",
+    "periode_terakhir_bpnt", "periode_terakhir_pkh", "status_nonaktif",
+]
+
+# Tabel keluarga_kerentanan_hash dibuat oleh migrations.py (python migrations.py apply)
+UPSERT_HASH_SQL = """
+    INSERT INTO keluarga_kerentanan_hash (id_keluarga, hash_latih, hash_skor, bulan_skor)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        hash_latih = COALESCE(VALUES(hash_latih), hash_latih),
+        hash_skor = VALUES(hash_skor),
+        bulan_skor = VALUES(bulan_skor)
+"""
+
+# =========================
+# HELPER: HASH KONTEN
+# =========================
+def bulan_sekarang():
+    today = date.today()
+    return f"{today.year:04d}-{today.month:02d}"
+
+def feature_hashes(df):
+    """Hash konten per keluarga (hex 16 char), stabil antar proses."""
+    norm = df[KOLOM_HASH].copy()
+    for col in ("periode_terakhir_bpnt", "periode_terakhir_pkh", "desa"):
+        norm[col] = norm[col].astype("string").fillna("")
+    # Dibulatkan supaya hash sama untuk fitur float64 maupun float32 (loader streaming)
+    for col in ("rata_rata_desil", "aset_tinggi", "aset_menengah", "aset_bawah"):
+        norm[col] = norm[col].astype("float64").round(4)
+    for col in ("peringkat_nasional", "jumlah_tanggungan", "status_nonaktif"):
+        norm[col] = norm[col].astype("int64")
+    hashes = pd.util.hash_pandas_object(norm, index=False)
+    return pd.Series([format(h, "016x") for h in hashes.to_numpy()],
+                     index=df["id_keluarga"].astype(str).to_numpy())
+
+def hash_table_exists(cursor):
+    cursor.execute("SHOW TABLES LIKE %s", ("keluarga_kerentanan_hash",))
+    return cursor.fetchone() is not None
+
+def load_hashes(conn):
+    cursor = conn.cursor()
+    try:
+        if not hash_table_exists(cursor):
+            raise RuntimeError("Tabel keluarga_kerentanan_hash belum ada. Jalankan: python migrations.py apply")
+        cursor.execute("SELECT id_keluarga, hash_latih, hash_skor, bulan_skor FROM keluarga_kerentanan_hash")
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return pd.DataFrame(rows, columns=["id_keluarga", "hash_latih", "hash_skor", "bulan_skor"]).set_index("id_keluarga")
+
+def _write_hashes(cursor, hashes, latih):
+    bulan = bulan_sekarang()
+    rows = [(id_kel, h if latih else None, h, bulan) for id_kel, h in hashes.items()]
+    for i in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(UPSERT_HASH_SQL, rows[i : i + BATCH_SIZE])
+
+def record_refit_hashes(conn, df, reset=True):
+    """Dipanggil setelah training penuh: semua keluarga jadi 'bersih'.
+
+    reset=False dipakai training streaming untuk menambah hash per chunk.
+    """
+    cursor = conn.cursor()
+    try:
+        if not hash_table_exists(cursor):
+            # Hasil training tetap berlaku; hanya mode inkremental yang belum bisa dipakai
+            print("Tabel hash belum ada, hash refit tidak dicatat. Jalankan: python migrations.py apply")
+            return
+        if reset:
+            cursor.execute("DELETE FROM keluarga_kerentanan_hash")
+        _write_hashes(cursor, feature_hashes(df), latih=True)
+        conn.commit()
+    finally:
+        cursor.close()
+
+def _delete_ids(cursor, table, ids):
+    for i in range(0, len(ids), BATCH_SIZE):
+        batch = ids[i : i + BATCH_SIZE]
+        placeholders = ",".join(["%s"] * len(batch))
+        cursor.execute(f"DELETE FROM {table} WHERE id_keluarga IN ({placeholders})", batch)
+
+# =========================
+# SCORING DENGAN ARTIFACTS
+# =========================
+def load_artifacts(version=None):
+    """Artifacts model current dari registry (FileNotFoundError jika belum ada)."""
+    return load_model(version)
+
+def predict_frame(df, artifacts, conn=None):
+    """Isi cluster, kategori, penalti dan skor memakai model tersimpan."""
+    if artifacts.get("per_grup"):
+        # Artifacts dari training paralel per desa/kecamatan
+        from parallel import predict_grouped
+        return predict_grouped(df, artifacts, conn)
+    fitur = artifacts.get("fitur_kerentanan", FITUR_KERENTANAN)
+    X_scaled = artifacts["scaler_kerentanan"].transform(df[fitur])
+    df["cluster_kerentanan"] = artifacts["kmeans_kerentanan"].predict(X_scaled)
+    df["kategori_kerentanan"] = df["cluster_kerentanan"].map(artifacts["cluster_to_label"])
+    return apply_scoring(df), X_scaled
+
+# =========================
+# RE-SCORING INKREMENTAL
+# =========================
+def rescore_incremental(drift_threshold=DRIFT_THRESHOLD, progress=None):
+    progress = progress or no_progress
+    conn = get_db()
+    cursor = None
+    try:
+        try:
+            artifacts = load_artifacts()
+        except FileNotFoundError:
+            return {"status": "refit", "hasil": train_kmeans(progress)}
+
+        # 1. LOAD & HASH (query set-based, murah)
+        progress("loading")
+        df = typecast_features(load_features(conn))
+        total_awal = len(df)
+        hashes = feature_hashes(df)
+        lama = load_hashes(conn)
+
+        # 2. CARI KELUARGA KOTOR (baru, berubah, atau skor bulan lalu)
+        progress("featurizing", total_awal=total_awal)
+        ids_hilang = sorted(set(lama.index) - set(hashes.index))
+        lama = lama.reindex(hashes.index)
+        kotor = (lama["hash_skor"] != hashes) | (lama["bulan_skor"] != bulan_sekarang())
+        berubah_sejak_latih = int((lama["hash_latih"] != hashes).sum())
+
+        ids_kotor = hashes.index[kotor.to_numpy()]
+        df_kotor = df[df["id_keluarga"].astype(str).isin(set(ids_kotor))].copy()
+        _, df_valid = filter_valid(df_kotor)
+        df_valid = df_valid.reset_index(drop=True)
+
+        # 3. CEK DRIFT
+        progress("clustering", total_valid=len(df_valid))
+        drift_data = berubah_sejak_latih / total_awal if total_awal else 0.0
+        drift_rentang = 0.0
+        if len(df_valid) > 0:
+            df_valid, X_scaled = predict_frame(df_valid, artifacts, conn)
+            drift_rentang = float(((X_scaled < 0) | (X_scaled > 1)).any(axis=1).mean())
+        drift = max(drift_data, drift_rentang)
+        if drift > drift_threshold:
+            return {"status": "refit", "drift": round(drift, 4), "hasil": train_kmeans(progress)}
+
+        # 4. UPSERT HANYA BARIS KOTOR (satu transaksi, termasuk rekap_desa)
+        progress("writing", total_valid=len(df_valid), rows_written=0)
+        ensure_rekap_table(conn)
+        generation = make_generation_id()
+        cursor = conn.cursor()
+        _delete_ids(cursor, "keluarga_kerentanan", [str(i) for i in ids_kotor] + ids_hilang)
+        _delete_ids(cursor, "keluarga_kerentanan_hash", ids_hilang)
+
+        data_to_insert = build_rows(df_valid)
+        for i in range(0, len(data_to_insert), BATCH_SIZE):
+            cursor.executemany(INSERT_SQL, data_to_insert[i : i + BATCH_SIZE])
+
+        _write_hashes(cursor, hashes[ids_kotor], latih=False)
+        rekap_rows = refresh_rekap_from_table(cursor, generation)
+        conn.commit()
+        progress("writing", rows_written=len(data_to_insert))
+        new_generation(generation)
+        precompute_dashboard(rekap_rows, generation)
+        build_index(conn, generation)
+
+        return {
+            "status": "success",
+            "mode": "incremental",
+            "rows_processed": len(data_to_insert),
+            "diagnostik": {
+                "total_awal": total_awal,
+                "keluarga_berubah": len(ids_kotor),
+                "keluarga_dihapus": len(ids_hilang),
+                "drift": round(drift, 4),
+            }
+        }
+
+    except Exception as e:
+        conn.rollback()
+        print("ERROR:", str(e))
+        return {"status": "error", "message": str(e)}
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
@@ -0,0 +1,164 @@
+# jobs.py
+# Antrian job training di background. Hanya satu job training yang boleh
+# berjalan sekaligus: trigger kedua selama job masih aktif akan menerima
+# job_id yang sama (tidak ada dua retrain yang balapan di keluarga_kerentanan).
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import TrainingTracker
+
+# Fase job, urut sesuai pipeline
+PHASES = ["queued", "loading", "featurizing", "evaluating", "clustering", "scoring", "writing", "done", "error"]
+
+# Mode training yang bisa diminta lewat POST /train-kmeans
+MODES = ("full", "incremental", "streaming", "parallel", "evaluate")
+
+# Nama lock MySQL agar dedup juga berlaku antar worker API (multi-proses)
+DB_LOCK_NAME = "bansos_train_kmeans"
+
+# Batas jumlah job selesai yang masih disimpan untuk polling
+MAX_JOBS_DISIMPAN = 50
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="train-kmeans")
+_lock = threading.Lock()
+_jobs = {}
+_active_job_id = None
+
+def _now():
+    return time.time()
+
+def _update(job_id, **fields):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        progress = fields.pop("progress", None)
+        if progress:
+            job["progress"].update(progress)
+        job.update(fields)
+        job["updated_at"] = _now()
+
+def _make_progress(job_id):
+    """Callback yang dipanggil pipeline: progress(fase, **hitungan)."""
+    def progress(phase, **counts):
+        _update(job_id, phase=phase, progress=counts)
+    return progress
+
+def acquire_db_lock():
+    """Koneksi pemegang lock training MySQL, atau None jika dipegang proses lain.
+
+    Dipakai juga oleh registry.rollback supaya rollback tidak balapan dengan swap training.
+    """
+    from database import get_direct_db
+    conn = get_direct_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (DB_LOCK_NAME,))
+    (ok,) = cursor.fetchone()
+    cursor.close()
+    if ok != 1:
+        conn.close()
+        return None
+    return conn
+
+def release_db_lock(conn):
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (DB_LOCK_NAME,))
+        cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+
+def _run(job_id, mode, engine=None, options=None):
+    global _active_job_id
+    # Durasi fase & hitungan baris juga dicatat ke /metrics
+    progress = TrainingTracker(mode, _make_progress(job_id))
+    status = "error"
+    lock_conn = None
+    try:
+        lock_conn = acquire_db_lock()
+        if lock_conn is None:
+            _update(job_id, phase="error", finished_at=_now(), result={
+                "status": "error",
+                "message": "Training lain sedang berjalan di worker lain.",
+            })
+            return
+
+        if mode == "incremental":
+            from incremental import rescore_incremental
+            hasil = rescore_incremental(progress=progress)
+        elif mode == "parallel":
+            from parallel import train_kmeans_parallel
+            hasil = train_kmeans_parallel(progress=progress, **(options or {}))
+        elif mode == "evaluate":
+            from evaluation import train_kmeans_evaluated
+            hasil = train_kmeans_evaluated(progress=progress, **(options or {}))
+        elif mode == "streaming":
+            from streaming import train_kmeans_streaming
+            hasil = train_kmeans_streaming(progress=progress, engine=engine)
+        else:
+            from kmeans import train_kmeans
+            hasil = train_kmeans(progress=progress, engine=engine)
+
+        status = "error" if hasil.get("status") == "error" else "success"
+        phase = "error" if status == "error" else "done"
+        _update(job_id, phase=phase, result=hasil, finished_at=_now())
+    except Exception as e:
+        _update(job_id, phase="error", result={"status": "error", "message": str(e)}, finished_at=_now())
+    finally:
+        progress.finish(status)
+        if lock_conn is not None:
+            release_db_lock(lock_conn)
+        with _lock:
+            if _active_job_id == job_id:
+                _active_job_id = None
+
+def check_mode(mode):
+    """Nama mode yang valid (default full bila None); ValueError jika tidak dikenal."""
+    mode = mode or "full"
+    if mode not in MODES:
+        raise ValueError(f"Mode tidak dikenal: {mode}. Pilihan: {', '.join(MODES)}.")
+    return mode
+
+def _prune():
+    selesai = [j for j in _jobs.values() if j["phase"] in ("done", "error")]
+    selesai.sort(key=lambda j: j["created_at"])
+    for job in selesai[: max(0, len(selesai) - MAX_JOBS_DISIMPAN)]:
+        del _jobs[job["job_id"]]
+
+def submit_training(mode="full", engine=None, options=None):
+    """Antrikan job training. Kembalikan (job, sudah_berjalan).
+
+    options diteruskan ke pipeline mode (mis. workers/per untuk mode=parallel).
+    """
+    global _active_job_id
+    with _lock:
+        if _active_job_id is not None:
+            return dict(_jobs[_active_job_id]), True
+
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "mode": mode,
+            "engine": engine,
+            "options": options or {},
+            "phase": "queued",
+            "progress": {},
+            "result": None,
+            "created_at": _now(),
+            "updated_at": _now(),
+            "finished_at": None,
+        }
+        _active_job_id = job_id
+        _prune()
+        job = dict(_jobs[job_id])
+
+    _executor.submit(_run, job_id, mode, engine, options)
+    return job, False
+
+def get_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job, progress=dict(job["progress"])) if job else None
@@ -7,6 +7,13 @@ import mysql.connector
 
 app = FastAPI()
 
+# =========================
+# CACHE HTTP (ETag per generation training)
+# =========================
+# Ditambahkan sebelum CORS supaya CORS tetap membungkus response 304/HIT
+from http_cache import ETagMiddleware
+app.add_middleware(ETagMiddleware)
+
 # =========================
 # CORS
 # =========================
@@ -17,39 +24,199 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# =========================
+# METRIK (latensi per route, lihat GET /metrics)
+# =========================
+# Ditambahkan terakhir = paling luar, jadi response 304/HIT dan CORS ikut terukur
+from metrics import MetricsMiddleware
+app.add_middleware(MetricsMiddleware)
+
+# =========================
+# STARTUP: HANGATKAN CACHE PERIODE
+# =========================
+@app.on_event("startup")
+def load_periode_cache():
+    from periode import PERIOD_PARSER, PERIODE_CACHE_PATH
+    PERIOD_PARSER.load(PERIODE_CACHE_PATH)
+
+# =========================
+# STARTUP: MUAT MODEL UNTUK SKORING ONLINE
+# =========================
+@app.on_event("startup")
+def load_scoring_model():
+    from scorer import SCORER, ModelTidakAda
+    try:
+        SCORER.load()
+    except ModelTidakAda as e:
+        print(f"[score] {e}")
+
 
 
 # =========================
 # ENDPOINT: TRAIN K-MEANS
 # =========================
 @app.post("/train-kmeans")
-def train_kmeans():
+def train_kmeans(mode: str = "full", engine: str = None, workers: int = None, per: str = None,
+                 k_max: int = None):
+    # Training dijalankan di background; respon langsung berisi job_id.
+    # mode=incremental: hanya keluarga yang berubah yang di-skor ulang
+    # memakai artifacts tersimpan (refit penuh otomatis bila drift besar)
+    # mode=streaming: training penuh per chunk (memori terbatas, MiniBatchKMeans)
+    # engine=full|minibatch|sampled: algoritma clustering (lihat engines.py)
+    # mode=parallel: restart KMeans & silhouette di process pool (workers=N),
+    # opsional per=desa|kecamatan untuk model mandiri per wilayah
+    # mode=evaluate: sweep k=2..k_max x scaling paralel (silhouette, Davies-Bouldin,
+    # Calinski-Harabasz) lalu latih model 3 kategori; laporan di metadata model
+    from engines import check_engine
+    from evaluation import check_k_max
+    from jobs import check_mode, submit_training
+    from parallel import check_grouping, check_workers
+    try:
+        mode = check_mode(mode)
+        engine = check_engine(engine)
+        options = None
+        if mode == "parallel":
+            options = {"workers": check_workers(workers), "per": check_grouping(per)}
+        elif mode == "evaluate":
+            options = {"workers": check_workers(workers), "k_max": check_k_max(k_max)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job, sudah_berjalan = submit_training(mode, engine, options)
+    if sudah_berjalan:
+        message = "Training K-Means sedang berjalan, memakai job yang sama."
+    else:
+        message = "Training K-Means dimasukkan ke antrian."
+    return {"message": message, "job_id": job["job_id"], "phase": job["phase"]}
+
+@app.get("/train-kmeans/{job_id}")
+def train_kmeans_status(job_id: str):
+    from jobs import get_job
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan.")
+    return job
+
+# =========================
+# SKORING ONLINE (TANPA RETRAIN)
+# =========================
+from typing import Optional
+from schemas import KeluargaInput, ScoreBatchInput
+
+def _score(fn):
+    from scorer import ModelTidakAda
+    try:
+        return fn()
+    except ModelTidakAda as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.post("/score")
+def score_keluarga(keluarga: KeluargaInput):
+    # Jika body hanya berisi id_keluarga, fitur diambil dari database
+    from scorer import SCORER
+    if keluarga.id_keluarga and keluarga.model_fields_set == {"id_keluarga"}:
+        from database import get_db
+        conn = get_db()
+        try:
+            hasil = _score(lambda: SCORER.score_ids([keluarga.id_keluarga], conn))
+        finally:
+            conn.close()
+        if not hasil:
+            raise HTTPException(status_code=404, detail="Keluarga tidak ditemukan.")
+        return hasil[0]
+    return _score(lambda: SCORER.score_inputs([keluarga]))[0]
+
+@app.post("/score/batch")
+def score_keluarga_batch(batch: ScoreBatchInput):
+    from scorer import SCORER, MAX_BATCH
+    if len(batch.keluarga) + len(batch.ids) > MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"Maksimal {MAX_BATCH} keluarga per request.")
+    hasil = _score(lambda: SCORER.score_inputs(batch.keluarga)) if batch.keluarga else []
+    if batch.ids:
+        from database import get_db
+        conn = get_db()
+        try:
+            hasil += _score(lambda: SCORER.score_ids(batch.ids, conn))
+        finally:
+            conn.close()
+    return {"jumlah": len(hasil), "hasil": hasil}
+
+# =========================
+# REGISTRY MODEL
+# =========================
+@app.get("/models")
+def list_models():
+    # Versi yang tabel arsipnya hilang tidak bisa di-rollback, jadi tidak ditampilkan
+    from database import get_db
+    from registry import list_versions
+    with get_db() as conn:
+        return list_versions(conn)
+
+@app.post("/models/rollback")
+def rollback_model(version: Optional[str] = None):
+    # Tanpa version: kembali ke versi sebelum current
+    from registry import TrainingBerjalan, rollback
     try:
-        # Proses training K-Means dilakukan di sini
-        # Misalnya, memanggil fungsi dari modul modelling.py
-        from kmeans import train_kmeans
-        train_kmeans()
-        return {"message": "Model K-Means berhasil dilatih dan disimpan."}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return rollback(version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TrainingBerjalan as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 # =========================
 # LIST DATA
 # =========================
 from fastapi import Query
-from typing import Optional
 
 @app.get("/kerentanan")
 def list_kerentanan_endpoint(
     desa: Optional[str] = None,
     page: int = Query(1, ge=1),      # Default halaman 1, minimal 1
     limit: int = Query(10, le=100),  # Default 10 data, maksimal 100 (opsional)
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,    # Token pagination.next_cursor (keyset, tanpa OFFSET)
+    total: str = Query("cached", pattern="^(exact|cached|none)$")
 ):
     # Import fungsi logika backend yang sudah diperbarui tadi
     from getdata import list_kerentanan 
     
+    from fast_json import FastJSONResponse
+
     # Panggil dengan semua parameter
-    return list_kerentanan(desa, page, limit, search)
+    try:
+        return FastJSONResponse(list_kerentanan(desa, page, limit, search, cursor, total))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/kerentanan/export")
+def export_kerentanan(
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    desa: Optional[str] = None,
+    search: Optional[str] = None
+):
+    # Daftar berperingkat lengkap, di-stream per chunk dari cursor server-side
+    from fastapi.responses import StreamingResponse
+    from export import EksporPenuh, check_format, export_filename, export_stream
+    try:
+        check_format(format)
+        stream = export_stream(format, desa, search)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except EksporPenuh as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/vnd.apache.parquet"
+    return StreamingResponse(stream, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{export_filename(format, desa)}"',
+    })
+
+@app.get("/kerentanan/search")
+def search_kerentanan_endpoint(
+    q: str = Query(..., min_length=1),
+    desa: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    from fast_json import FastJSONResponse
+    from getdata import search_kerentanan
+    return FastJSONResponse(search_kerentanan(q, desa, limit))
 
 @app.get("/kerentanan/desa")
 def list_desa():
@@ -64,4 +231,74 @@ def get_dashboard_stats(desa: str = "SEMUA"):
 @app.get("/dashboard-stats-semua-desa")
 def get_rekap_per_desa():
     from getdata import get_rekap_per_desa
-    return get_rekap_per_desa()
\ No newline at end of file
+    return get_rekap_per_desa()
+
+# =========================
+# PETA CHOROPLETH DESA
+# =========================
+from fastapi import Request
+
+@app.get("/map/desa")
+def map_desa(
+    request: Request,
+    zoom: int = Query(12, ge=6, le=18),
+    format: str = Query("topojson", pattern="^(topojson|geojson)$")
+):
+    # Geometri disederhanakan per zoom + rekap per desa dalam satu response
+    from geo import map_response
+    return map_response(request.headers, zoom, format)
+
+@app.get("/map/desa/{z}/{x}/{y}")
+def map_desa_tile(
+    request: Request, z: int, x: int, y: int,
+    format: str = Query("topojson", pattern="^(topojson|geojson)$")
+):
+    from geo import MAX_ZOOM, MIN_ZOOM, map_response
+    if not MIN_ZOOM <= z <= MAX_ZOOM:
+        raise HTTPException(status_code=400, detail=f"Zoom harus {MIN_ZOOM}..{MAX_ZOOM}.")
+    try:
+        return map_response(request.headers, z, format, (z, x, y))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/cache-stats")
+def cache_stats():
+    from cache import AGGREGATE_CACHE, COUNT_CACHE, RESPONSE_CACHE
+    from search_index import index_stats
+    stats = AGGREGATE_CACHE.stats()
+    stats["response_cache"] = RESPONSE_CACHE.stats()
+    stats["count_cache"] = COUNT_CACHE.stats()
+    stats["search_index"] = index_stats()
+    return stats
+
+@app.post("/cache/invalidate")
+def cache_invalidate():
+    from cache import invalidate, current_generation
+    invalidate()
+    return {"message": "Cache dashboard dikosongkan.", "generation": current_generation()}
+
+@app.post("/feature-store/refresh")
+def feature_store_refresh(full: bool = False):
+    # full=True: bangun ulang fitur_keluarga, selain itu proses antrian perubahan
+    from database import get_db
+    from feature_store import refresh_feature_store
+    conn = get_db()
+    try:
+        return refresh_feature_store(conn, full=full)
+    except RuntimeError as e:
+        # Tabel feature store belum dibuat lewat migrations.py
+        raise HTTPException(status_code=503, detail=str(e))
+    finally:
+        conn.close()
+
+@app.get("/metrics")
+def metrics():
+    # Format teks Prometheus: latensi endpoint, query DB, fase training, pool & cache
+    from fastapi.responses import Response
+    from metrics import CONTENT_TYPE, render
+    return Response(content=render(), media_type=CONTENT_TYPE)
+
+@app.get("/db-pool-stats")
+def db_pool_stats():
+    from database import pool_stats
+    return pool_stats()
@@ -0,0 +1,249 @@
+# metrics.py
+# Instrumentasi ringan tanpa dependensi tambahan: counter, gauge dan
+# histogram berlabel yang dirender dalam format teks Prometheus (GET /metrics).
+#   - latensi per endpoint (MetricsMiddleware, label = template route)
+#   - durasi & jumlah baris query database (dicatat cursor di database.py)
+#   - durasi tiap fase training & hitungan baris dari callback progress
+#     (TrainingTracker, dipasang oleh jobs.py)
+# Log SQL debug hanya aktif jika SQL_DEBUG_SAMPLE > 0 (proporsi query dicetak).
+import bisect
+import functools
+import os
+import random
+import re
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 0 = mati, 1 = semua query, 0.01 = sekitar 1 dari 100 query
+SQL_DEBUG_SAMPLE = float(os.getenv("SQL_DEBUG_SAMPLE", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+PHASE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+REGISTRY = []
+
+# =========================
+# JENIS METRIK
+# =========================
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names, values, extra=()):
+    pasangan = list(zip(names, values)) + list(extra)
+    if not pasangan:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pasangan) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self, key, state):
+        counts, total, n = state
+        kumulatif = 0
+        for batas, count in zip(self.buckets + (float("inf"),), counts):
+            kumulatif += count
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(batas))])} {kumulatif}"
+        yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}"
+        yield f"{self.name}_count{_format_labels(self.labels, key)} {n}"
+
+# =========================
+# DEFINISI METRIK
+# =========================
+HTTP_LATENCY = Histogram("bansos_http_request_duration_seconds", "Latensi request HTTP per route.",
+                         ("method", "route", "status"))
+DB_QUERY_SECONDS = Histogram("bansos_db_query_duration_seconds", "Durasi eksekusi query database.",
+                             ("operation", "table"), QUERY_BUCKETS)
+DB_QUERY_ROWS = Counter("bansos_db_query_rows_total", "Baris dibaca (SELECT) atau diubah (tulis) oleh query.",
+                        ("operation", "table"))
+DB_QUERY_ERRORS = Counter("bansos_db_query_errors_total", "Query database yang gagal.", ("operation", "table"))
+TRAINING_PHASE_SECONDS = Histogram("bansos_training_phase_duration_seconds", "Durasi tiap fase training.",
+                                   ("mode", "phase"), PHASE_BUCKETS)
+TRAINING_ROWS = Gauge("bansos_training_rows", "Hitungan baris terakhir yang dilaporkan pipeline training.",
+                      ("mode", "count"))
+TRAINING_RUNS = Counter("bansos_training_runs_total", "Run training per hasil.", ("mode", "status"))
+DB_POOL = Gauge("bansos_db_pool", "Statistik pool koneksi (lihat /db-pool-stats).", ("stat",))
+CACHE = Gauge("bansos_cache", "Statistik cache agregat & response.", ("cache", "stat"))
+
+def _collect_runtime():
+    """Salin statistik pool & cache ke gauge tepat sebelum render."""
+    from cache import AGGREGATE_CACHE, COUNT_CACHE, RESPONSE_CACHE
+    from database import pool_stats
+
+    for stat, value in pool_stats().items():
+        if isinstance(value, (int, float)):
+            DB_POOL.set(value, stat=stat)
+    for nama, cache in (("aggregate", AGGREGATE_CACHE), ("response", RESPONSE_CACHE), ("count", COUNT_CACHE)):
+        stats = cache.stats()
+        for stat in ("entries", "hits", "misses"):
+            CACHE.set(stats[stat], cache=nama, stat=stat)
+
+def render():
+    _collect_runtime()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# =========================
+# QUERY DATABASE
+# =========================
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?`?(\w+)", re.IGNORECASE)
+# Tabel arsip per versi & tabel swap dilabeli dengan nama tabel dasarnya,
+# supaya jumlah label tidak bertambah setiap training
+_SUFFIX_RE = re.compile(r"(?:_v_\w+|_staging|_old)$")
+
+@functools.lru_cache(maxsize=1024)
+def describe_query(sql):
+    """(operasi, tabel utama) untuk label metrik, mis. ("SELECT", "keluarga_kerentanan")."""
+    operasi = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+    tabel = _TABLE_RE.search(sql)
+    return operasi, _SUFFIX_RE.sub("", tabel.group(1)) if tabel else ""
+
+def observe_query(sql, params, seconds, rows=None, error=False):
+    operasi, tabel = describe_query(sql)
+    DB_QUERY_SECONDS.observe(seconds, operation=operasi, table=tabel)
+    if rows:
+        DB_QUERY_ROWS.inc(rows, operation=operasi, table=tabel)
+    if error:
+        DB_QUERY_ERRORS.inc(operation=operasi, table=tabel)
+    if SQL_DEBUG_SAMPLE > 0 and random.random() < SQL_DEBUG_SAMPLE:
+        params = repr(params)
+        if len(params) > 200:
+            params = params[:200] + "..."
+        print(f"[sql] {seconds * 1000:.2f}ms {' '.join(sql.split())} params={params}")
+
+# =========================
+# LATENSI ENDPOINT
+# =========================
+def _route_label(scope):
+    # Template (/map/desa/{z}/{x}/{y}), bukan path mentah, supaya label terbatas.
+    # Response dari ETagMiddleware (304/HIT) tidak sampai ke router.
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    from http_cache import CACHED_PATHS
+    return scope["path"] if scope["path"] in CACHED_PATHS else "unmatched"
+
+class MetricsMiddleware:
+    """Middleware ASGI: latensi sampai body terakhir terkirim, per template route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        mulai = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.observe(
+                time.perf_counter() - mulai,
+                method=scope["method"],
+                route=_route_label(scope),
+                status=status["code"],
+            )
+
+# =========================
+# FASE TRAINING
+# =========================
+class TrainingTracker:
+    """Callback progress(fase, **hitungan) yang mencatat durasi fase lalu
+    meneruskan ke callback asli (status job)."""
+
+    def __init__(self, mode, progress=None):
+        self.mode = mode
+        self.progress = progress
+        self._fase = None
+        self._mulai = None
+        self._awal = time.perf_counter()
+
+    def __call__(self, phase, **counts):
+        if phase != self._fase:
+            self._tutup_fase()
+            self._fase, self._mulai = phase, time.perf_counter()
+        for nama, nilai in counts.items():
+            if isinstance(nilai, (int, float)) and not isinstance(nilai, bool):
+                TRAINING_ROWS.set(nilai, mode=self.mode, count=nama)
+        if self.progress is not None:
+            self.progress(phase, **counts)
+
+    def _tutup_fase(self):
+        if self._fase is not None:
+            TRAINING_PHASE_SECONDS.observe(time.perf_counter() - self._mulai, mode=self.mode, phase=self._fase)
+        self._fase = None
+
+    def finish(self, status):
+        self._tutup_fase()
+        TRAINING_PHASE_SECONDS.observe(time.perf_counter() - self._awal, mode=self.mode, phase="total")
+        TRAINING_RUNS.inc(mode=self.mode, status=status)
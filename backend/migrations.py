@@ -0,0 +1,394 @@
+# migrations.py
+# Index komposit/covering untuk query panas, DDL feature store (tabel +
+# trigger penanda perubahan), tabel hash inkremental dan pemeriksa EXPLAIN.
+#   python migrations.py apply    -> buat index/tabel/trigger yang belum ada lalu verifikasi
+#   python migrations.py verify   -> hanya laporkan index/tabel/trigger yang kurang
+#   python migrations.py explain  -> EXPLAIN semua query backend, laporkan full scan
+# Keluar dengan kode 1 bila ada index kurang / full scan tak terduga, jadi
+# bisa dipasang di CI atau sebelum deploy untuk menangkap regresi.
+import json
+import sys
+
+import mysql.connector
+
+# =========================
+# DAFTAR INDEX
+# =========================
+# (tabel, nama index, kolom). Kolom ekstra di belakang membuat index covering
+# (query cukup membaca index, tidak perlu lookup ke baris tabel).
+INDEXES = [
+    # Agregat feature query: AVG(desil) GROUP BY id_keluarga
+    ("riwayat_desil", "ix_riwayat_desil_keluarga", ["id_keluarga", "desil"]),
+    ("anggota_keluarga", "ix_anggota_keluarga_keluarga", ["id_keluarga"]),
+    # SUM(jumlah) per kelompok jenis aset
+    ("aset_keluarga", "ix_aset_keluarga_jenis", ["id_keluarga", "id_jenis_aset", "jumlah"]),
+    # MAX(id) per keluarga -> periode terakhir
+    ("riwayat_bpnt", "ix_riwayat_bpnt_keluarga", ["id_keluarga", "id"]),
+    ("riwayat_pkh", "ix_riwayat_pkh_keluarga", ["id_keluarga", "id"]),
+    # Join 4 kolom kelurahan (nama ikut supaya join cukup dari index)
+    ("kelurahan", "ix_kelurahan_kode", ["no_prop", "no_kab", "no_kec", "no_kel", "nama_kelurahan"]),
+    ("kelurahan", "ix_kelurahan_nama", ["nama_kelurahan"]),
+    # Keluarga per kecamatan/kelurahan (trigger feature store, model per wilayah)
+    ("keluarga", "ix_keluarga_kode", ["no_prop", "no_kab", "no_kec", "no_kel"]),
+    # getdata.list_kerentanan: filter desa + ORDER BY skor_akhir DESC, id_keluarga DESC
+    ("keluarga_kerentanan", "ix_kk_desa_skor", ["desa", "skor_akhir", "id_keluarga"]),
+    ("keluarga_kerentanan", "ix_kk_skor", ["skor_akhir", "id_keluarga"]),
+]
+# Tabel staging dibuat dengan CREATE TABLE ... LIKE keluarga_kerentanan,
+# jadi index di atas ikut terbawa setiap swap hasil training.
+
+# =========================
+# FEATURE STORE (lihat feature_store.py)
+# =========================
+CREATE_STORE_TABLE = """
+    CREATE TABLE IF NOT EXISTS fitur_keluarga (
+        id_keluarga VARCHAR(64) NOT NULL PRIMARY KEY,
+        desa VARCHAR(255) NULL,
+        rata_rata_desil DECIMAL(14,6) NOT NULL DEFAULT 0,
+        peringkat_nasional BIGINT UNSIGNED NULL,
+        jumlah_tanggungan INT NOT NULL DEFAULT 0,
+        aset_tinggi DECIMAL(20,4) NULL,
+        aset_menengah DECIMAL(20,4) NULL,
+        aset_bawah DECIMAL(20,4) NULL,
+        periode_terakhir_bpnt VARCHAR(255) NULL,
+        periode_terakhir_pkh VARCHAR(255) NULL,
+        status_nonaktif INT NULL,
+        updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+        KEY idx_fitur_updated_at (updated_at)
+    )
+"""
+
+CREATE_QUEUE_TABLE = """
+    CREATE TABLE IF NOT EXISTS fitur_keluarga_antrian (
+        id_keluarga VARCHAR(64) NOT NULL PRIMARY KEY,
+        queued_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+    )
+"""
+
+STORE_TABLES = {"fitur_keluarga": CREATE_STORE_TABLE, "fitur_keluarga_antrian": CREATE_QUEUE_TABLE}
+
+# Tabel sumber yang punya kolom id_keluarga
+TABEL_SUMBER = [
+    "keluarga", "anggota_keluarga", "aset_keluarga",
+    "riwayat_desil", "riwayat_bpnt", "riwayat_pkh",
+]
+
+_ENQUEUE = "INSERT INTO fitur_keluarga_antrian (id_keluarga) {values} ON DUPLICATE KEY UPDATE queued_at = CURRENT_TIMESTAMP(6)"
+
+def _keluarga_di_kelurahan(ref):
+    return (
+        f"SELECT id_keluarga FROM keluarga WHERE no_prop = {ref}.no_prop AND no_kab = {ref}.no_kab "
+        f"AND no_kec = {ref}.no_kec AND no_kel = {ref}.no_kel"
+    )
+
+def _trigger_defs():
+    """{nama_trigger: (tabel, event, isi trigger)} untuk semua tabel sumber."""
+    triggers = {}
+    baris = {"INSERT": ["NEW"], "UPDATE": ["OLD", "NEW"], "DELETE": ["OLD"]}
+    for table in TABEL_SUMBER:
+        for event, refs in baris.items():
+            values = "VALUES " + ", ".join(f"({r}.id_keluarga)" for r in refs)
+            triggers[f"trg_fitur_{table}_{event.lower()}"] = (table, event, _ENQUEUE.format(values=values))
+    # Nama desa ikut join kelurahan: perubahan kelurahan menandai semua keluarganya.
+    # UPDATE bisa mengubah kode wilayah, jadi keluarga di kode lama dan baru ikut ditandai.
+    for event, refs in baris.items():
+        values = " UNION ".join(_keluarga_di_kelurahan(r) for r in refs)
+        if len(refs) > 1:
+            values = f"SELECT id_keluarga FROM ({values}) AS kel"
+        triggers[f"trg_fitur_kelurahan_{event.lower()}"] = ("kelurahan", event, _ENQUEUE.format(values=values))
+    return triggers
+
+TRIGGERS = _trigger_defs()
+
+def _normal(sql):
+    return " ".join(sql.split()).lower()
+
+def existing_triggers(cursor):
+    """{nama_trigger: isi} trigger feature store di database aktif."""
+    cursor.execute(
+        "SELECT TRIGGER_NAME, ACTION_STATEMENT FROM information_schema.TRIGGERS "
+        "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME LIKE 'trg\\_fitur\\_%'"
+    )
+    return {nama: isi for nama, isi in cursor.fetchall()}
+
+def check_feature_store(conn, apply=False):
+    """Laporan tabel & trigger feature store: ok / dibuat / diperbarui / kurang / beda.
+
+    Trigger butuh hak akses TRIGGER (atau SUPER bila binlog aktif). Tanpa
+    trigger, feature_store.py tetap benar dengan rebuild penuh setiap refresh.
+    """
+    cursor = conn.cursor()
+    laporan = []
+    try:
+        for table, ddl in STORE_TABLES.items():
+            status = "ok" if _table_exists(cursor, table) else "kurang"
+            if status == "kurang" and apply:
+                cursor.execute(ddl)
+                status = "dibuat" if _table_exists(cursor, table) else "kurang"
+            laporan.append({"table": table, "status": status})
+
+        terpasang = existing_triggers(cursor)
+        for nama, (table, event, isi) in TRIGGERS.items():
+            lama = terpasang.get(nama)
+            if lama is not None and _normal(lama) == _normal(isi):
+                laporan.append({"trigger": nama, "status": "ok"})
+                continue
+            if not apply:
+                laporan.append({"trigger": nama, "status": "kurang" if lama is None else "beda"})
+                continue
+            try:
+                if lama is not None:
+                    cursor.execute(f"DROP TRIGGER {nama}")
+                cursor.execute(f"CREATE TRIGGER {nama} AFTER {event} ON {table} FOR EACH ROW {isi}")
+                laporan.append({"trigger": nama, "status": "dibuat" if lama is None else "diperbarui"})
+            except mysql.connector.Error as e:
+                laporan.append({"trigger": nama, "status": "kurang", "error": str(e)})
+    finally:
+        cursor.close()
+    return laporan
+
+# =========================
+# TABEL HASH INKREMENTAL (lihat incremental.py)
+# =========================
+CREATE_HASH_TABLE = """
+    CREATE TABLE IF NOT EXISTS keluarga_kerentanan_hash (
+        id_keluarga VARCHAR(64) NOT NULL PRIMARY KEY,
+        hash_latih CHAR(16) NULL,
+        hash_skor CHAR(16) NULL,
+        bulan_skor CHAR(7) NULL
+    )
+"""
+
+HASH_TABLES = {"keluarga_kerentanan_hash": CREATE_HASH_TABLE}
+
+def check_hash_tables(conn, apply=False):
+    """Laporan tabel hash mode inkremental: ok / dibuat / kurang."""
+    cursor = conn.cursor()
+    laporan = []
+    try:
+        for table, ddl in HASH_TABLES.items():
+            status = "ok" if _table_exists(cursor, table) else "kurang"
+            if status == "kurang" and apply:
+                cursor.execute(ddl)
+                status = "dibuat" if _table_exists(cursor, table) else "kurang"
+            laporan.append({"table": table, "status": status})
+    finally:
+        cursor.close()
+    return laporan
+
+# =========================
+# INDEX
+# =========================
+def existing_indexes(cursor, table):
+    """{nama_index: [kolom urut]} untuk tabel di database aktif."""
+    cursor.execute(
+        """
+        SELECT INDEX_NAME, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """,
+        (table,),
+    )
+    hasil = {}
+    for nama, kolom in cursor.fetchall():
+        hasil.setdefault(nama, []).append(kolom)
+    return hasil
+
+def _table_exists(cursor, table):
+    cursor.execute("SHOW TABLES LIKE %s", (table,))
+    return cursor.fetchone() is not None
+
+def _covering(indexes, columns):
+    """Nama index yang kolom awalnya sama dengan `columns` (None jika tidak ada)."""
+    for nama, kolom in indexes.items():
+        if kolom[: len(columns)] == columns:
+            return nama
+    return None
+
+def check_indexes(conn, apply=False):
+    """Laporan per index: ok / dibuat / kurang / tabel_tidak_ada."""
+    cursor = conn.cursor()
+    laporan = []
+    try:
+        for table, nama, columns in INDEXES:
+            if not _table_exists(cursor, table):
+                laporan.append({"table": table, "index": nama, "status": "tabel_tidak_ada"})
+                continue
+            ada = _covering(existing_indexes(cursor, table), columns)
+            status = "ok"
+            if ada is None and apply:
+                # ALGORITHM=INPLACE, LOCK=NONE: tabel tetap bisa dibaca/ditulis selama build
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD INDEX {nama} ({', '.join(columns)}), "
+                    "ALGORITHM=INPLACE, LOCK=NONE"
+                )
+                ada = _covering(existing_indexes(cursor, table), columns)
+                status = "dibuat"
+            if ada is None:
+                status = "kurang"
+            laporan.append({"table": table, "index": ada or nama, "columns": columns, "status": status})
+    finally:
+        cursor.close()
+    return laporan
+
+# =========================
+# EXPLAIN QUERY BACKEND
+# =========================
+def static_queries():
+    """Query training/feature store yang tidak lewat endpoint GET.
+
+    {nama: (sql, params, tabel yang boleh full scan)}
+    """
+    from feature_store import STORE_QUERY
+    from features import FEATURE_ID_GROUPS, FEATURE_QUERY, feature_query_for_ids
+    from parallel import GROUP_KEY_SQL
+    from search_index import INDEX_SQL
+
+    return {
+        # Sengaja membaca semua keluarga; tabel sumber harus lewat index
+        "feature_query": (FEATURE_QUERY, None, {"k"}),
+        "feature_query_for_ids": (feature_query_for_ids(1), ["0"] * FEATURE_ID_GROUPS, set()),
+        "feature_store_scan": (STORE_QUERY, None, {"fitur_keluarga"}),
+        "feature_store_ids": (STORE_QUERY + " WHERE id_keluarga IN (%s)", ["0"], set()),
+        "search_index": (INDEX_SQL, None, {"kk"}),
+        "group_keys": (GROUP_KEY_SQL, None, {"keluarga"}),
+        "group_keys_ids": (GROUP_KEY_SQL + " WHERE id_keluarga IN (%s)", ["0"], set()),
+    }
+
+# Endpoint GET yang dijalankan untuk merekam query. {desa} dan {id} diisi
+# dari baris pertama /kerentanan. Hanya route yang terpasang di main.app
+# (routers/keluarga.py dan routers/desa.py tidak di-include).
+ENDPOINTS = [
+    "/kerentanan?limit=10&total=exact",
+    "/kerentanan?limit=10&total=exact&desa={desa}",
+    "/kerentanan?limit=10&total=exact&search={id}",
+    "/kerentanan/search?q={desa}",
+    "/kerentanan/desa",
+    "/dashboard-stats",
+    "/dashboard-stats?desa={desa}",
+    "/dashboard-stats-semua-desa",
+]
+
+# Tabel kecil yang wajar dibaca penuh
+SMALL_TABLES = {"rekap_desa"}
+
+def endpoint_queries():
+    """Jalankan ENDPOINTS lewat TestClient sambil merekam SQL yang dieksekusi.
+
+    Kembalikan (queries, gagal); gagal = [(path, status)] untuk respon non-2xx,
+    karena query endpoint itu tidak ikut terekam.
+    """
+    from urllib.parse import quote
+
+    from fastapi.testclient import TestClient
+
+    from cache import AGGREGATE_CACHE, COUNT_CACHE, RESPONSE_CACHE
+    from database import start_recording, stop_recording
+    from main import app
+
+    # Cache proses ini saja supaya query benar-benar sampai ke database;
+    # jangan new_generation(), itu mengosongkan cache & ETag semua worker
+    AGGREGATE_CACHE.clear()
+    RESPONSE_CACHE.clear()
+    COUNT_CACHE.clear()
+    gagal = []
+
+    def cek(path, response):
+        if not 200 <= response.status_code < 300:
+            gagal.append((path, response.status_code))
+        return response
+
+    with TestClient(app) as client:
+        start_recording()
+        try:
+            pertama = cek("/kerentanan?limit=2", client.get("/kerentanan?limit=2")).json()
+            baris = (pertama.get("data") or [{}])[0]
+            isi = {"desa": quote(str(baris.get("desa") or "")), "id": quote(str(baris.get("id_keluarga") or "0"))}
+            if pertama.get("pagination", {}).get("next_cursor"):
+                path = f"/kerentanan?limit=2&cursor={pertama['pagination']['next_cursor']}"
+                cek(path, client.get(path))
+            for path in ENDPOINTS:
+                cek(path, client.get(path.format(**isi)))
+            cek("/score", client.post("/score", json={"id_keluarga": baris.get("id_keluarga") or "0"}))
+        finally:
+            queries = stop_recording()
+    queries = {
+        f"endpoint_{i}": (sql, params, set())
+        for i, (sql, params) in enumerate(queries.items())
+        if sql.lstrip().upper().startswith("SELECT")
+    }
+    return queries, gagal
+
+def explain(conn, sql, params=None, allowed=frozenset()):
+    """EXPLAIN satu query. Kembalikan (baris plan, full scan tak terduga)."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("EXPLAIN " + sql, params)
+        plan = cursor.fetchall()
+    finally:
+        cursor.close()
+    full_scan = [
+        {"table": row["table"], "rows": row.get("rows"), "extra": row.get("Extra")}
+        for row in plan
+        # <derivedN>/<subqueryN> = hasil antara yang sudah dimaterialisasi
+        if row.get("type") == "ALL" and row.get("table")
+        and not row["table"].startswith("<")
+        and row["table"] not in allowed and row["table"] not in SMALL_TABLES
+    ]
+    return plan, full_scan
+
+def explain_all(conn, include_endpoints=True):
+    queries = static_queries()
+    laporan = []
+    if include_endpoints:
+        endpoint, gagal = endpoint_queries()
+        queries.update(endpoint)
+        laporan += [{"query": path, "error": f"HTTP {status}, query endpoint tidak terekam"} for path, status in gagal]
+    for nama, (sql, params, allowed) in queries.items():
+        try:
+            plan, full_scan = explain(conn, sql, params, allowed)
+        except mysql.connector.Error as e:
+            laporan.append({"query": nama, "sql": " ".join(sql.split())[:200], "error": str(e)})
+            continue
+        laporan.append({
+            "query": nama,
+            "sql": " ".join(sql.split())[:200],
+            "full_scan": full_scan,
+            "plan": [
+                {k: row.get(k) for k in ("table", "type", "key", "rows", "Extra")}
+                for row in plan
+            ],
+        })
+    return laporan
+
+def main(argv):
+    from database import get_direct_db
+
+    perintah = argv[1] if len(argv) > 1 else "verify"
+    if perintah not in ("apply", "verify", "explain"):
+        print("Pakai: python migrations.py [apply|verify|explain]")
+        return 2
+
+    conn = get_direct_db()
+    try:
+        if perintah == "explain":
+            laporan = explain_all(conn)
+            gagal = [q for q in laporan if q.get("full_scan") or q.get("error")]
+        else:
+            # Tabel feature store dulu: index di atas tidak menyentuhnya, trigger butuh tabelnya
+            laporan = check_feature_store(conn, apply=perintah == "apply")
+            laporan += check_hash_tables(conn, apply=perintah == "apply")
+            laporan += check_indexes(conn, apply=perintah == "apply")
+            gagal = [i for i in laporan if i["status"] in ("kurang", "beda")]
+    finally:
+        conn.close()
+
+    print(json.dumps(laporan, indent=2, default=str))
+    if gagal:
+        print(f"{len(gagal)} masalah ditemukan.", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
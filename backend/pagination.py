@@ -0,0 +1,28 @@
+# pagination.py
+# Token kursor (keyset / seek pagination). Token bersifat opaque bagi klien:
+# base64url dari JSON berisi nilai kunci urutan baris terakhir + sidik filter,
+# sehingga token tidak bisa dipakai ulang untuk kombinasi filter lain.
+import base64
+import hashlib
+import json
+
+def _fingerprint(filters):
+    raw = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+def encode_cursor(keys, filters):
+    payload = {"k": list(keys), "f": _fingerprint(filters)}
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token, filters):
+    """Kembalikan list nilai kunci; ValueError jika token rusak/tidak cocok."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        keys = payload["k"]
+    except Exception:
+        raise ValueError("Cursor tidak valid.")
+    if payload.get("f") != _fingerprint(filters):
+        raise ValueError("Cursor tidak cocok dengan filter yang dipakai.")
+    return keys
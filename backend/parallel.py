@@ -0,0 +1,200 @@
+# parallel.py
+# Training paralel (mode=parallel) memakai process pool:
+#   - restart KMeans (n_init) dijalankan bersamaan, satu restart per tugas
+#   - silhouette (disampel bila n besar) dihitung di pool selagi skor & tulis berjalan
+#   - opsional: model mandiri per desa / per kecamatan, dilatih paralel
+# Hasil digabung ke keluarga_kerentanan lewat publish_results, sama seperti train_kmeans.
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from database import get_db
+from engines import fit_group, fit_restart, map_cluster_labels, silhouette_worker
+from kmeans import FITUR_KERENTANAN, no_progress, prepare_training_data, publish_results
+from periode import PERIOD_PARSER
+from registry import current_version, update_metadata
+from scoring import apply_scoring
+from utils import peak_rss_mb
+
+# Default sekaligus batas atas workers per request (lihat check_workers)
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", str(os.cpu_count() or 1)))
+
+GROUPINGS = ("desa", "kecamatan")
+# Grup lebih kecil dari ini memakai model global (terlalu sedikit untuk 3 cluster)
+MIN_GROUP_SIZE = int(os.getenv("MIN_GROUP_SIZE", "30"))
+
+GROUP_KEY_SQL = "SELECT id_keluarga, no_prop, no_kab, no_kec FROM keluarga"
+# Sampai jumlah id ini kunci grup dibaca per primary key (scoring online),
+# di atasnya satu scan keluarga lebih murah (training, rescore)
+GROUP_KEY_ID_LIMIT = int(os.getenv("GROUP_KEY_ID_LIMIT", "5000"))
+
+LABELS = ["Sangat Rentan", "Rentan", "Tidak Rentan"]
+
+def check_workers(workers):
+    """Jumlah proses pool (default TRAINING_WORKERS); ValueError di luar 1..TRAINING_WORKERS."""
+    workers = int(workers or TRAINING_WORKERS)
+    if not 1 <= workers <= TRAINING_WORKERS:
+        raise ValueError(f"workers harus antara 1 dan {TRAINING_WORKERS}.")
+    return workers
+
+def check_grouping(per):
+    if per and per not in GROUPINGS:
+        raise ValueError(f"Pengelompokan tidak dikenal: {per}. Pilihan: {', '.join(GROUPINGS)}.")
+    return per or None
+
+def group_keys(df, per, conn=None):
+    """Kunci grup per baris df (None jika tidak diketahui)."""
+    if per == "desa":
+        desa = df["desa"].astype(object)
+        return desa.where(desa.notna() & (desa != ""), None)
+
+    ids = list(dict.fromkeys(df["id_keluarga"].astype(str)))
+    own_conn = conn is None
+    conn = conn or get_db()
+    cursor = conn.cursor()
+    try:
+        if len(ids) > GROUP_KEY_ID_LIMIT:
+            cursor.execute(GROUP_KEY_SQL)
+            rows = cursor.fetchall()
+        elif ids:
+            cursor.execute(f"{GROUP_KEY_SQL} WHERE id_keluarga IN ({','.join(['%s'] * len(ids))})", ids)
+            rows = cursor.fetchall()
+        else:
+            rows = []
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+    keys = {str(id_kel): f"{prop}.{kab}.{kec}" for id_kel, prop, kab, kec in rows}
+    return df["id_keluarga"].astype(str).map(keys)
+
+def make_pool(workers):
+    # spawn: aman dipanggil dari thread job (fork + thread bisa deadlock)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def fit_restarts(pool, X, n_clusters, n_init=10, random_state=42):
+    """n_init restart KMeans secara paralel; ambil inertia terkecil."""
+    seeds = np.random.RandomState(random_state).randint(np.iinfo(np.int32).max, size=n_init)
+    models = [f.result() for f in [pool.submit(fit_restart, X, n_clusters, int(s)) for s in seeds]]
+    return min(models, key=lambda m: m.inertia_)
+
+def predict_grouped(df, artifacts, conn=None):
+    """predict_frame untuk artifacts per grup; grup tanpa model memakai model global."""
+    fitur = artifacts.get("fitur_kerentanan", FITUR_KERENTANAN)
+    per_grup = artifacts["per_grup"]
+    X_scaled = artifacts["scaler_kerentanan"].transform(df[fitur])
+    cluster = artifacts["kmeans_kerentanan"].predict(X_scaled)
+    kategori = pd.Series(cluster).map(artifacts["cluster_to_label"]).to_numpy(dtype=object)
+
+    keys = group_keys(df, per_grup["by"], conn).to_numpy()
+    for key, model in per_grup["models"].items():
+        idx = np.flatnonzero(keys == key)
+        if len(idx) == 0:
+            continue
+        X_grup = model["scaler_kerentanan"].transform(df[fitur].iloc[idx])
+        X_scaled[idx] = X_grup
+        cluster[idx] = model["kmeans_kerentanan"].predict(X_grup)
+        kategori[idx] = pd.Series(cluster[idx]).map(model["cluster_to_label"]).to_numpy()
+
+    df["cluster_kerentanan"] = cluster
+    df["kategori_kerentanan"] = kategori
+    return apply_scoring(df), X_scaled
+
+def train_kmeans_parallel(progress=None, workers=None, per=None):
+    progress = progress or no_progress
+    workers = check_workers(workers)
+    per = check_grouping(per)
+    conn = get_db()
+    try:
+        # 1-2. LOAD, TYPECAST & FILTER (aturan sama dengan train_kmeans)
+        df_semua, df, error = prepare_training_data(conn, progress)
+        if error:
+            return error
+        total_awal = len(df_semua)
+
+        # 3. CLUSTERING PARALEL
+        progress("clustering", total_valid=len(df), workers=workers)
+        start = time.perf_counter()
+        scaler_A = MinMaxScaler()
+        X = scaler_A.fit_transform(df[FITUR_KERENTANAN])
+        n_clusters = 3 if len(df) >= 3 else 1
+
+        with make_pool(workers) as pool:
+            kmeans_A = fit_restarts(pool, X, n_clusters)
+            cluster_means = df.groupby(kmeans_A.labels_)["rata_rata_desil"].mean()
+            cluster_to_label = map_cluster_labels(cluster_means)
+            df["cluster_kerentanan"] = kmeans_A.labels_
+            df["kategori_kerentanan"] = df["cluster_kerentanan"].map(cluster_to_label)
+
+            # Model per grup menimpa hasil global untuk grup yang cukup besar
+            models = {}
+            if per:
+                keys = group_keys(df, per, conn)
+                groups = {k: idx for k, idx in df.groupby(keys).indices.items() if len(idx) >= MIN_GROUP_SIZE}
+                futures = [
+                    pool.submit(fit_group, key, df[FITUR_KERENTANAN].iloc[idx], df["rata_rata_desil"].to_numpy()[idx])
+                    for key, idx in groups.items()
+                ]
+                for future in futures:
+                    hasil = future.result()
+                    idx = groups[hasil["key"]]
+                    labels = hasil.pop("labels")
+                    df.loc[idx, "cluster_kerentanan"] = labels
+                    df.loc[idx, "kategori_kerentanan"] = pd.Series(labels).map(hasil["cluster_to_label"]).to_numpy()
+                    models[hasil.pop("key")] = hasil
+            detik_clustering = time.perf_counter() - start
+
+            # Silhouette (kategori akhir, ruang fitur global) berjalan di pool
+            # bersamaan dengan scoring & penulisan di proses utama
+            kode_kategori = pd.Categorical(df["kategori_kerentanan"], categories=LABELS).codes
+            silhouette_future = pool.submit(silhouette_worker, X, kode_kategori)
+
+            df = apply_scoring(df)
+            artifacts = {
+                "scaler_kerentanan": scaler_A,
+                "kmeans_kerentanan": kmeans_A,
+                "cluster_to_label": cluster_to_label,
+                "fitur_kerentanan": FITUR_KERENTANAN,
+            }
+            if per:
+                artifacts["per_grup"] = {"by": per, "models": models}
+            metadata = {"mode": "parallel", "per": per, "workers": workers, "sse": float(kmeans_A.inertia_)}
+            tulis = publish_results(conn, df, df_semua, artifacts, progress, metadata)
+            silhouette = silhouette_future.result()
+            update_metadata(current_version(), silhouette=silhouette)
+
+        total_inserted = tulis["rows"]
+        return {
+            "status": "success",
+            "mode": "parallel",
+            "model_version": current_version(),
+            "rows_processed": total_inserted,
+            "info": f"Sukses. {total_inserted} data disimpan (Data Desil/Peringkat 0 dibuang).",
+            "diagnostik": {
+                "total_awal": total_awal,
+                "total_valid_disimpan": total_inserted,
+                "penulisan": tulis,
+                "periode": PERIOD_PARSER.stats(),
+                "memori": {"peak_rss_mb": peak_rss_mb()},
+                "paralel": {
+                    "workers": workers,
+                    "per": per,
+                    "model_grup": len(models),
+                    "detik_clustering": round(detik_clustering, 3),
+                    "sse_global": float(kmeans_A.inertia_),
+                    "silhouette": silhouette,
+                },
+            }
+        }
+
+    except Exception as e:
+        print("ERROR:", str(e))
+        if conn and conn.is_connected(): conn.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        if conn: conn.close()
@@ -0,0 +1,118 @@
+# periode.py
+# Parser teks periode bansos (mis. "TAHAP 3 JUL-AGS-SEP 2024") dengan cache.
+# Label periode sangat berulang antar keluarga dan antar training, jadi hasil
+# (tahun, bulan) disimpan di LRU terbatas dan bisa dipersist di samping
+# artifacts model supaya sudah hangat saat API start.
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Konstanta Peta Bulan
+BULAN_MAP = {
+    "JAN":1, "FEB":2, "MAR":3, "APR":4, "MEI":5, "MAY":5, "JUN":6,
+    "JUL":7, "AGS":8, "AGT":8, "AGU":8, "AUG":8, "SEP":9, "OKT":10,
+    "OCT":10, "NOV":11, "DES":12, "DEC":12,
+}
+
+BULAN_RE = re.compile(r"(JAN|FEB|MAR|APR|MEI|MAY|JUN|JUL|AGS|AGT|AGU|AUG|SEP|OKT|OCT|NOV|DES|DEC)")
+TAHUN_RE = re.compile(r"(20\d{2})")
+
+PERIODE_CACHE_PATH = "model_kerentanan_periode.json"
+
+def parse_period_raw(text):
+    """Ambil bulan TERAKHIR dan tahun dari teks (tanpa cache)."""
+    t = str(text).upper()
+    bulan_tokens = BULAN_RE.findall(t)
+    tahun_match = TAHUN_RE.search(t)
+
+    if not tahun_match or not bulan_tokens: return (0, 0)
+
+    year = int(tahun_match.group(1))
+    month = BULAN_MAP.get(bulan_tokens[-1], 0)
+    return (year, month)
+
+class PeriodParser:
+    """parse_period dengan LRU terbatas, statistik hit, dan daftar gagal parse."""
+
+    def __init__(self, maxsize=4096, max_unparsed=500):
+        self.maxsize = maxsize
+        self.max_unparsed = max_unparsed
+        self._cache = OrderedDict()
+        self._unparsed = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, text):
+        try:
+            if pd.isna(text): return (0, 0)
+            key = sys.intern(str(text))
+        except Exception:
+            return (0, 0)
+
+        with self._lock:
+            hasil = self._cache.get(key)
+            if hasil is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return hasil
+            self.misses += 1
+
+        try:
+            hasil = parse_period_raw(key)
+        except Exception:
+            hasil = (0, 0)
+
+        with self._lock:
+            self._cache[key] = hasil
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+            if hasil == (0, 0) and key.strip():
+                self._unparsed[key] = None
+                if len(self._unparsed) > self.max_unparsed:
+                    self._unparsed.popitem(last=False)
+        return hasil
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "unparsed": list(self._unparsed),
+            }
+
+    def save(self, path=PERIODE_CACHE_PATH):
+        with self._lock:
+            data = {k: list(v) for k, v in self._cache.items()}
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def load(self, path=PERIODE_CACHE_PATH):
+        """Isi cache dari file; kembalikan jumlah entri yang dimuat."""
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            data = json.load(f)
+        with self._lock:
+            for key, (year, month) in data.items():
+                self._cache[sys.intern(key)] = (int(year), int(month))
+                if (year, month) == (0, 0) and key.strip():
+                    self._unparsed[key] = None
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+            while len(self._unparsed) > self.max_unparsed:
+                self._unparsed.popitem(last=False)
+        return len(data)
+
+PERIOD_PARSER = PeriodParser()
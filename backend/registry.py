@@ -0,0 +1,276 @@
+# registry.py
+# Registry artifacts model ber-versi. Setiap training menulis satu direktori:
+#   model_registry/<versi>/artifacts.joblib  (tanpa kompresi -> bisa di-mmap)
+#   model_registry/<versi>/metadata.json     (jumlah baris, SSE, silhouette, fitur, waktu)
+# dan file model_registry/CURRENT menunjuk versi aktif (diganti atomik dengan
+# os.replace). Versi = id generation training, jadi model dan isi
+# keluarga_kerentanan selalu berpasangan.
+#
+# Tabel skor versi sebelumnya tidak dibuang saat swap, melainkan diarsip
+# (keluarga_kerentanan_v_<versi>, rekap_desa_v_<versi>), sehingga rollback
+# cukup satu RENAME TABLE dan skor lama langsung dilayani lagi.
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import joblib
+
+REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "model_registry")
+CURRENT_PATH = os.path.join(REGISTRY_DIR, "CURRENT")
+# Jumlah versi (direktori + tabel arsip) yang disimpan
+MODEL_KEEP = int(os.getenv("MODEL_KEEP", "3"))
+
+# File lama sebelum ada registry; diimpor otomatis sebagai versi "legacy"
+LEGACY_PATHS = ["model_kerentanan_artifacts.pkl"]
+
+ARTIFACT_FILE = "artifacts.joblib"
+METADATA_FILE = "metadata.json"
+
+class TrainingBerjalan(Exception):
+    pass
+
+_lock = threading.Lock()
+_current = {"mtime": None, "version": None}
+
+# Kunci lama (services.py / model_kerentanan.pkl) -> kunci baku
+_KUNCI_LAMA = {
+    "scaler": "scaler_kerentanan",
+    "kmeans": "kmeans_kerentanan",
+    "labels": "cluster_to_label",
+    "label_map": "cluster_to_label",
+    "fitur": "fitur_kerentanan",
+}
+
+def normalize_artifacts(artifacts):
+    """Samakan kunci artifacts lama dengan format train_kmeans."""
+    hasil = {_KUNCI_LAMA.get(k, k): v for k, v in artifacts.items()}
+    if "fitur_kerentanan" not in hasil:
+        from kmeans import FITUR_KERENTANAN
+        hasil["fitur_kerentanan"] = FITUR_KERENTANAN
+    return hasil
+
+def _version_dir(version):
+    return os.path.join(REGISTRY_DIR, version)
+
+def archive_tables(version):
+    """Nama tabel arsip (keluarga_kerentanan, rekap_desa) untuk satu versi."""
+    slug = re.sub(r"[^0-9A-Za-z]", "_", version)[:40]
+    return f"keluarga_kerentanan_v_{slug}", f"rekap_desa_v_{slug}"
+
+# =========================
+# SIMPAN & POINTER CURRENT
+# =========================
+def save_model(artifacts, version, metadata=None):
+    """Tulis artifacts + metadata ke direktori versi (belum jadi current)."""
+    final = _version_dir(version)
+    tmp = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    joblib.dump(normalize_artifacts(artifacts), os.path.join(tmp, ARTIFACT_FILE))
+    now = time.time()
+    meta = {
+        "version": version,
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(now)),
+        "timestamp": now,
+        "fitur": list(artifacts.get("fitur_kerentanan", [])),
+        **(metadata or {}),
+    }
+    with open(os.path.join(tmp, METADATA_FILE), "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    return version
+
+def discard_version(version):
+    """Hapus direktori versi yang gagal dipublikasikan (tidak pernah jadi current)."""
+    if version != current_version():
+        shutil.rmtree(_version_dir(version), ignore_errors=True)
+
+def update_metadata(version, **fields):
+    """Tambah/ubah field metadata (mis. metrik yang selesai dihitung belakangan)."""
+    meta = read_metadata(version)
+    meta.update(fields)
+    path = os.path.join(_version_dir(version), METADATA_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+    os.replace(path + ".tmp", path)
+    return meta
+
+def set_current(version):
+    if not os.path.isdir(_version_dir(version)):
+        raise ValueError(f"Versi model tidak ditemukan: {version}")
+    tmp = CURRENT_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, CURRENT_PATH)
+    # Perbarui cache proses ini langsung (resolusi mtime filesystem bisa kasar)
+    with _lock:
+        _current["mtime"] = os.stat(CURRENT_PATH).st_mtime_ns
+        _current["version"] = version
+
+def current_version():
+    """Versi aktif (None jika registry kosong). Dicache berdasarkan mtime CURRENT."""
+    try:
+        mtime = os.stat(CURRENT_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return _import_legacy()
+    with _lock:
+        if _current["mtime"] != mtime:
+            with open(CURRENT_PATH) as f:
+                _current["version"] = f.read().strip() or None
+            _current["mtime"] = mtime
+        return _current["version"]
+
+def _import_legacy():
+    for path in LEGACY_PATHS:
+        if os.path.exists(path):
+            save_model(joblib.load(path), "legacy", {"sumber": path})
+            set_current("legacy")
+            return "legacy"
+    return None
+
+# =========================
+# MUAT
+# =========================
+def load_model(version=None, mmap=True):
+    """Muat artifacts versi tertentu (default: current).
+
+    mmap_mode="r": array NumPy (pusat cluster, skala) dipetakan dari file,
+    sehingga beberapa worker API berbagi page memori yang sama.
+    """
+    version = version or current_version()
+    if version is None:
+        raise FileNotFoundError("Belum ada model di registry. Jalankan training terlebih dahulu.")
+    path = os.path.join(_version_dir(version), ARTIFACT_FILE)
+    return joblib.load(path, mmap_mode="r" if mmap else None)
+
+def read_metadata(version):
+    with open(os.path.join(_version_dir(version), METADATA_FILE)) as f:
+        return json.load(f)
+
+def _archived(conn):
+    """Nama tabel arsip keluarga_kerentanan yang ada di database."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SHOW TABLES LIKE %s", ("keluarga\\_kerentanan\\_v\\_%",))
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def list_versions(conn=None):
+    """Metadata semua versi, terbaru dulu, dengan penanda current.
+
+    Dengan conn: versi non-current yang tabel arsipnya sudah tidak ada
+    (tidak bisa di-rollback) dilewati.
+    """
+    if not os.path.isdir(REGISTRY_DIR):
+        return []
+    aktif = current_version()
+    arsip = _archived(conn) if conn is not None else None
+    hasil = []
+    for nama in os.listdir(REGISTRY_DIR):
+        if nama.endswith(".tmp") or not os.path.isfile(os.path.join(REGISTRY_DIR, nama, METADATA_FILE)):
+            continue
+        if arsip is not None and nama != aktif and archive_tables(nama)[0] not in arsip:
+            continue
+        meta = read_metadata(nama)
+        meta["current"] = nama == aktif
+        hasil.append(meta)
+    hasil.sort(key=lambda m: m.get("timestamp", 0), reverse=True)
+    return hasil
+
+def prune(conn=None, keep=MODEL_KEEP):
+    """Hapus versi lama (direktori + tabel arsip) di luar `keep` terbaru."""
+    aktif = current_version()
+    lama = [m["version"] for m in list_versions() if m["version"] != aktif][max(keep - 1, 0):]
+    for version in lama:
+        shutil.rmtree(_version_dir(version), ignore_errors=True)
+        if conn is not None:
+            cursor = conn.cursor()
+            cursor.execute("DROP TABLE IF EXISTS " + ", ".join(archive_tables(version)))
+            cursor.close()
+    return lama
+
+# =========================
+# ROLLBACK
+# =========================
+def rollback(version=None):
+    """Aktifkan kembali versi sebelumnya beserta tabel skornya.
+
+    Tanpa argumen: versi terbaru sebelum current. Tabel skor current diarsip,
+    tabel arsip versi tujuan ditukar masuk dalam satu RENAME TABLE.
+    """
+    from database import get_direct_db
+    from jobs import acquire_db_lock, release_db_lock
+
+    aktif = current_version()
+    if version is None:
+        conn = get_direct_db()
+        try:
+            kandidat = [m["version"] for m in list_versions(conn) if m["version"] != aktif]
+        finally:
+            conn.close()
+        if not kandidat:
+            raise ValueError("Tidak ada versi sebelumnya untuk rollback.")
+        version = kandidat[0]
+    if version == aktif:
+        raise ValueError(f"Versi {version} sudah aktif.")
+    if not os.path.isdir(_version_dir(version)):
+        raise ValueError(f"Versi model tidak ditemukan: {version}")
+
+    # Lock yang sama dengan job training: tabel live dan CURRENT tidak boleh
+    # ditukar bersamaan dengan publish_results
+    lock_conn = acquire_db_lock()
+    if lock_conn is None:
+        raise TrainingBerjalan("Training sedang berjalan. Coba rollback setelah training selesai.")
+    try:
+        return _rollback_locked(aktif, version)
+    finally:
+        release_db_lock(lock_conn)
+
+def _rollback_locked(aktif, version):
+    from cache import new_generation
+    from database import get_direct_db
+    from incremental import hash_table_exists
+    from rekap import ensure_rekap_table, refresh_rekap_from_table
+
+    if current_version() != aktif:
+        # Training bisa saja publish di antara pengecekan di atas dan GET_LOCK
+        raise TrainingBerjalan("Versi current berubah (training baru selesai). Ulangi rollback.")
+    target_kk, target_rekap = archive_tables(version)
+    conn = get_direct_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SHOW TABLES LIKE %s", (target_kk,))
+        if cursor.fetchone() is None:
+            raise ValueError(f"Tabel skor versi {version} sudah tidak diarsip.")
+        cursor.execute("SHOW TABLES LIKE %s", (target_rekap,))
+        ada_rekap = cursor.fetchone() is not None
+
+        # DDL memicu implicit commit, jadi semua CREATE dijalankan sebelum swap
+        ensure_rekap_table(conn)
+        ada_hash = hash_table_exists(cursor)
+        arsip_kk, arsip_rekap = archive_tables(aktif or "tanpa_versi")
+        cursor.execute(f"DROP TABLE IF EXISTS {arsip_kk}, {arsip_rekap}")
+        renames = [f"keluarga_kerentanan TO {arsip_kk}", f"{target_kk} TO keluarga_kerentanan"]
+        if ada_rekap:
+            renames += [f"rekap_desa TO {arsip_rekap}", f"{target_rekap} TO rekap_desa"]
+        cursor.execute("RENAME TABLE " + ", ".join(renames))
+
+        if not ada_rekap:
+            refresh_rekap_from_table(cursor, version)
+        # Hash skor tidak lagi cocok dengan tabel yang dipulihkan:
+        # run inkremental berikutnya akan men-skor ulang semua keluarga
+        if ada_hash:
+            cursor.execute("UPDATE keluarga_kerentanan_hash SET hash_skor = NULL, bulan_skor = NULL")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    set_current(version)
+    new_generation()
+    return {"version": version, "sebelumnya": aktif}
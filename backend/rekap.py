@@ -0,0 +1,161 @@
+# rekap.py
+# Tabel ringkasan per desa (rekap_desa) yang ditulis oleh pipeline training
+# dalam transaksi yang sama dengan keluarga_kerentanan. Endpoint dashboard
+# membaca tabel kecil ini, bukan meng-agregasi seluruh keluarga_kerentanan.
+import json
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+from mysql.connector import errorcode
+
+# Batas bin histogram skor_akhir (skor 30/60/90 dikurangi penalti 0..80)
+HIST_EDGES = list(range(-50, 101, 10))
+
+CREATE_REKAP_TABLE = """
+    CREATE TABLE IF NOT EXISTS rekap_desa (
+        desa VARCHAR(255) NULL,
+        sangat_rentan INT NOT NULL DEFAULT 0,
+        rentan INT NOT NULL DEFAULT 0,
+        tidak_rentan INT NOT NULL DEFAULT 0,
+        total_kk INT NOT NULL DEFAULT 0,
+        indeks_desa DECIMAL(6,4) NOT NULL DEFAULT 0,
+        rata_rata_skor DECIMAL(8,4) NULL,
+        histogram_skor TEXT NULL,
+        generation VARCHAR(64) NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_rekap_desa (desa)
+    )
+"""
+
+INSERT_REKAP_SQL = """
+    INSERT INTO {table}
+    (desa, sangat_rentan, rentan, tidak_rentan, total_kk, indeks_desa, rata_rata_skor, histogram_skor, generation)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+SELECT_REKAP_SQL = """
+    SELECT desa, sangat_rentan, rentan, tidak_rentan, total_kk, indeks_desa, rata_rata_skor, histogram_skor
+    FROM rekap_desa
+    ORDER BY desa ASC
+"""
+
+def hitung_indeks_desa(sangat, rentan, tidak, total):
+    if total > 0:
+        return round(((sangat * 1) + (rentan * 2) + (tidak * 3)) / (total * 3), 4)
+    return 0
+
+def ensure_rekap_table(conn):
+    # DDL di MySQL memicu implicit commit, jadi panggil SEBELUM transaksi tulis
+    cursor = conn.cursor()
+    cursor.execute(CREATE_REKAP_TABLE)
+    cursor.close()
+
+def rekap_rows_from_frame(df):
+    """Bangun baris rekap_desa dari DataFrame (desa, kategori_kerentanan, skor_akhir)."""
+    desa = df["desa"].where(df["desa"].notna() & (df["desa"] != ""), None)
+    df = df.assign(desa=desa)
+
+    rows = []
+    for nama_desa, grup in df.groupby("desa", dropna=False, sort=False):
+        kategori = grup["kategori_kerentanan"]
+        sangat = int((kategori == "Sangat Rentan").sum())
+        rentan = int((kategori == "Rentan").sum())
+        tidak = int((kategori == "Tidak Rentan").sum())
+        total = len(grup)
+        skor = pd.to_numeric(grup["skor_akhir"], errors="coerce").dropna().to_numpy()
+        hist, _ = np.histogram(np.clip(skor, HIST_EDGES[0], HIST_EDGES[-1]), bins=HIST_EDGES)
+        rows.append({
+            "desa": None if pd.isna(nama_desa) else nama_desa,
+            "sangat_rentan": sangat,
+            "rentan": rentan,
+            "tidak_rentan": tidak,
+            "total_kk": total,
+            "indeks_desa": hitung_indeks_desa(sangat, rentan, tidak, total),
+            "rata_rata_skor": round(float(skor.mean()), 4) if len(skor) else None,
+            "histogram_skor": {"edges": HIST_EDGES, "counts": hist.tolist()},
+        })
+
+    # Urutan sama dengan ORDER BY desa ASC di MySQL (NULL lebih dulu)
+    rows.sort(key=lambda r: (r["desa"] is not None, r["desa"] or ""))
+    return rows
+
+class RekapAccumulator:
+    """Rekap per desa yang diisi bertahap per chunk (training streaming).
+
+    Hasil rows() sama dengan rekap_rows_from_frame atas gabungan semua chunk.
+    """
+
+    def __init__(self):
+        self._desa = {}
+
+    def add(self, df):
+        desa = df["desa"].astype(object)
+        desa = desa.where(desa.notna() & (desa != ""), None)
+        df = df.assign(desa=desa)
+        for nama_desa, grup in df.groupby("desa", dropna=False, sort=False):
+            key = None if pd.isna(nama_desa) else nama_desa
+            acc = self._desa.setdefault(key, {
+                "sangat_rentan": 0, "rentan": 0, "tidak_rentan": 0, "total_kk": 0,
+                "skor_sum": 0.0, "skor_n": 0, "hist": np.zeros(len(HIST_EDGES) - 1, dtype=np.int64),
+            })
+            kategori = grup["kategori_kerentanan"]
+            acc["sangat_rentan"] += int((kategori == "Sangat Rentan").sum())
+            acc["rentan"] += int((kategori == "Rentan").sum())
+            acc["tidak_rentan"] += int((kategori == "Tidak Rentan").sum())
+            acc["total_kk"] += len(grup)
+            skor = pd.to_numeric(grup["skor_akhir"], errors="coerce").dropna().to_numpy()
+            acc["skor_sum"] += float(skor.sum())
+            acc["skor_n"] += len(skor)
+            acc["hist"] += np.histogram(np.clip(skor, HIST_EDGES[0], HIST_EDGES[-1]), bins=HIST_EDGES)[0]
+
+    def rows(self):
+        rows = []
+        for nama_desa, acc in self._desa.items():
+            rows.append({
+                "desa": nama_desa,
+                "sangat_rentan": acc["sangat_rentan"],
+                "rentan": acc["rentan"],
+                "tidak_rentan": acc["tidak_rentan"],
+                "total_kk": acc["total_kk"],
+                "indeks_desa": hitung_indeks_desa(acc["sangat_rentan"], acc["rentan"], acc["tidak_rentan"], acc["total_kk"]),
+                "rata_rata_skor": round(acc["skor_sum"] / acc["skor_n"], 4) if acc["skor_n"] else None,
+                "histogram_skor": {"edges": HIST_EDGES, "counts": acc["hist"].tolist()},
+            })
+        rows.sort(key=lambda r: (r["desa"] is not None, r["desa"] or ""))
+        return rows
+
+def write_rekap(cursor, rows, generation=None, table="rekap_desa"):
+    """Ganti isi rekap_desa. Tidak commit: ikut transaksi pemanggil."""
+    cursor.execute(f"DELETE FROM {table}")
+    data = [
+        (r["desa"], r["sangat_rentan"], r["rentan"], r["tidak_rentan"], r["total_kk"],
+         r["indeks_desa"], r["rata_rata_skor"], json.dumps(r["histogram_skor"]), generation)
+        for r in rows
+    ]
+    if data:
+        cursor.executemany(INSERT_REKAP_SQL.format(table=table), data)
+
+def refresh_rekap_from_table(cursor, generation=None):
+    """Hitung ulang rekap_desa dari isi keluarga_kerentanan (dalam transaksi yang sama)."""
+    cursor.execute("SELECT desa, kategori_kerentanan, skor_akhir FROM keluarga_kerentanan")
+    df = pd.DataFrame(cursor.fetchall(), columns=["desa", "kategori_kerentanan", "skor_akhir"])
+    rows = rekap_rows_from_frame(df)
+    write_rekap(cursor, rows, generation)
+    return rows
+
+def read_rekap(conn):
+    """Baca rekap_desa; None jika tabel belum ada atau masih kosong."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(SELECT_REKAP_SQL)
+        rows = cursor.fetchall()
+    except mysql.connector.Error as e:
+        # Hanya "tabel belum ada" yang berarti belum pernah training;
+        # error lain (koneksi, hak akses) diteruskan ke pemanggil
+        if e.errno == errorcode.ER_NO_SUCH_TABLE:
+            return None
+        raise
+    finally:
+        cursor.close()
+    return rows or None
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
+from cache import AGGREGATE_CACHE
 from database import get_db
+from pagination import decode_cursor, encode_cursor
 
 router = APIRouter()
 
@@ -7,53 +9,83 @@ router = APIRouter()
 def get_keluarga(
     desa: str = Query(None),
     page: int = 1,
-    limit: int = 10
+    limit: int = 10,
+    cursor: str = Query(None),  # token next_cursor: keyset pada id_keluarga, tanpa OFFSET
+    total: str = Query("cached", pattern="^(exact|cached|none)$")  # sama seperti /kerentanan
 ):
+    filters = {"desa": desa}
+    try:
+        seek_id = decode_cursor(cursor, filters)[0] if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     db = get_db()
-    cursor = db.cursor(dictionary=True)
-
-    offset = (page - 1) * limit
-
-    base_query = """
-        SELECT 
-            k.id_keluarga,
-            k.no_kk,
-            k.nama_kepala_keluarga,
-            k.alamat,
-            kel.nama_kelurahan AS desa
-        FROM keluarga k
-        JOIN kelurahan kel 
-          ON k.no_kel = kel.no_kel
-         AND k.no_kec = kel.no_kec
-         AND k.no_kab = kel.no_kab
-         AND k.no_prop = kel.no_prop
-    """
-
-    params = []
-
-    if desa:
-        base_query += " WHERE kel.nama_kelurahan = %s"
-        params.append(desa)
-
-    # hitung total data sebelum pagination
-    count_query = f"SELECT COUNT(*) AS total FROM ({base_query}) AS tbl"
-    cursor.execute(count_query, tuple(params))
-    total_data = cursor.fetchone()["total"]
-
-    # tambahkan pagination
-    base_query += " LIMIT %s OFFSET %s"
-    params.extend([limit, offset])
-
-    cursor.execute(base_query, tuple(params))
-    result = cursor.fetchall()
-
-    cursor.close()
-    db.close()
+    try:
+        cur = db.cursor(dictionary=True)
+
+        offset = (page - 1) * limit
+
+        base_query = """
+            SELECT 
+                k.id_keluarga,
+                k.no_kk,
+                k.nama_kepala_keluarga,
+                k.alamat,
+                kel.nama_kelurahan AS desa
+            FROM keluarga k
+            JOIN kelurahan kel 
+              ON k.no_kel = kel.no_kel
+             AND k.no_kec = kel.no_kec
+             AND k.no_kab = kel.no_kab
+             AND k.no_prop = kel.no_prop
+        """
+
+        params = []
+
+        if desa:
+            base_query += " WHERE kel.nama_kelurahan = %s"
+            params.append(desa)
+
+        # hitung total data (perkiraan: disimpan per generation + TTL cache,
+        # agar tidak COUNT di setiap halaman)
+        def hitung_total():
+            count_query = f"SELECT COUNT(*) AS total FROM ({base_query}) AS tbl"
+            cur.execute(count_query, tuple(params))
+            return cur.fetchone()["total"]
+
+        if total == "none":
+            total_data = None
+        elif total == "exact":
+            total_data = hitung_total()
+        else:
+            total_data = AGGREGATE_CACHE.get_or_compute(("keluarga_count", desa), hitung_total)
+
+        # tambahkan pagination (urut id_keluarga agar keyset stabil)
+        if seek_id is not None:
+            base_query += (" AND" if desa else " WHERE") + " k.id_keluarga > %s"
+            params.append(seek_id)
+            base_query += " ORDER BY k.id_keluarga LIMIT %s"
+            params.append(limit)
+        else:
+            base_query += " ORDER BY k.id_keluarga LIMIT %s OFFSET %s"
+            params.extend([limit, offset])
+
+        cur.execute(base_query, tuple(params))
+        result = cur.fetchall()
+
+        cur.close()
+    finally:
+        db.close()
+
+    next_cursor = None
+    if len(result) == limit:
+        next_cursor = encode_cursor([result[-1]["id_keluarga"]], filters)
 
     return {
         "data": result,
         "total": total_data,
         "page": page,
         "limit": limit,
-        "total_pages": (total_data + limit - 1) // limit
+        "total_pages": (total_data + limit - 1) // limit if total_data is not None else None,
+        "next_cursor": next_cursor
     }
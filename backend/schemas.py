@@ -0,0 +1,23 @@
+# schemas.py
+# Model body request (pydantic) untuk endpoint POST.
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+class KeluargaInput(BaseModel):
+    id_keluarga: Optional[str] = None
+    desa: Optional[str] = None
+    rata_rata_desil: float = 0
+    peringkat_nasional: float = 0
+    jumlah_tanggungan: float = 0
+    aset_tinggi: float = 0
+    aset_menengah: float = 0
+    aset_bawah: float = 0
+    periode_terakhir_bpnt: Optional[str] = None
+    periode_terakhir_pkh: Optional[str] = None
+    status_nonaktif: int = 0
+
+class ScoreBatchInput(BaseModel):
+    keluarga: List[KeluargaInput] = Field(default_factory=list)
+    # id_keluarga yang fiturnya diambil dari database
+    ids: List[str] = Field(default_factory=list)
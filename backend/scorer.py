@@ -0,0 +1,148 @@
+# scorer.py
+# Skoring online memakai artifacts training tersimpan, tanpa retrain.
+# Artifacts versi current registry dimuat sekali (saat startup, mmap) dan
+# dimuat ulang otomatis bila pointer current berubah (training baru/rollback). Jalur cepat memakai numpy langsung: skala MinMax
+# = X * scale_ + min_, cluster = pusat terdekat, penalti = scoring.penalty_vec.
+import threading
+
+import numpy as np
+import pandas as pd
+
+from feature_store import fetch_features
+from features import KOLOM_FITUR
+from kmeans import FITUR_KERENTANAN, typecast_features
+from registry import current_version, load_model
+from scoring import SKOR_MAP, months_since_vec, parse_periods, penalty_vec
+from utils import months_since, parse_period, penalty_from_months
+
+# Batas jumlah keluarga per request batch
+MAX_BATCH = 10_000
+# id per query saat mengambil fitur dari database
+ID_BATCH = 1000
+
+class ModelTidakAda(Exception):
+    pass
+
+class Scorer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.artifacts = None
+
+    def load(self):
+        """Muat artifacts jika versi current berubah sejak pemuatan terakhir."""
+        version = current_version()
+        if version is None:
+            raise ModelTidakAda("Model belum ada. Jalankan training terlebih dahulu.")
+        with self._lock:
+            if version != self.version:
+                artifacts = load_model(version)
+                scaler = artifacts["scaler_kerentanan"]
+                self._scale = np.asarray(scaler.scale_, dtype=np.float64)
+                self._min = np.asarray(scaler.min_, dtype=np.float64)
+                self._centers = np.asarray(artifacts["kmeans_kerentanan"].cluster_centers_, dtype=np.float64)
+                self._labels = np.array(
+                    [artifacts["cluster_to_label"].get(c, "Tidak Rentan") for c in range(len(self._centers))],
+                    dtype=object,
+                )
+                self.artifacts = artifacts
+                self.version = version
+            return self.artifacts
+
+    def _clusters(self, df, conn=None):
+        """(cluster, kategori) untuk df yang sudah di-typecast."""
+        artifacts = self.load()
+        if artifacts.get("per_grup"):
+            # Model per wilayah: pakai jalur predict_frame (kunci grup hanya untuk id di df)
+            from incremental import predict_frame
+            hasil, _ = predict_frame(df.copy(), artifacts, conn)
+            return hasil["cluster_kerentanan"].to_numpy(), hasil["kategori_kerentanan"].to_numpy()
+
+        fitur = artifacts.get("fitur_kerentanan", FITUR_KERENTANAN)
+        X = df[fitur].to_numpy(dtype=np.float64) * self._scale + self._min
+        # Jarak kuadrat ke tiap pusat cluster (sama dengan KMeans.predict)
+        jarak = (X * X).sum(axis=1)[:, None] - 2 * X @ self._centers.T + (self._centers ** 2).sum(axis=1)
+        cluster = jarak.argmin(axis=1)
+        return cluster, self._labels[cluster]
+
+    def score_frame(self, df, now_year=None, now_month=None, conn=None):
+        """Skor DataFrame fitur (kolom KOLOM_FITUR). Kembalikan list dict per baris."""
+        df = typecast_features(df.copy())
+        cluster, kategori = self._clusters(df, conn)
+
+        bpnt_year, bpnt_month = parse_periods(df["periode_terakhir_bpnt"])
+        pkh_year, pkh_month = parse_periods(df["periode_terakhir_pkh"])
+        penalti_bpnt = penalty_vec(months_since_vec(bpnt_year, bpnt_month, now_year, now_month))
+        penalti_pkh = penalty_vec(months_since_vec(pkh_year, pkh_month, now_year, now_month))
+        skor = pd.Series(kategori).map(SKOR_MAP).fillna(30).to_numpy(dtype=np.int64)
+
+        # Aturan filter training: aktif, desil > 0, peringkat > 0
+        lolos = (
+            (df["status_nonaktif"].to_numpy() == 0)
+            & (df["rata_rata_desil"].to_numpy() > 0)
+            & (df["peringkat_nasional"].to_numpy() > 0)
+        )
+        hasil = pd.DataFrame({
+            "id_keluarga": df["id_keluarga"].to_numpy(),
+            "cluster_kerentanan": cluster.astype(np.int64),
+            "kategori_kerentanan": kategori,
+            "skor_kerentanan": skor,
+            "penalti_bpnt": penalti_bpnt,
+            "penalti_pkh": penalti_pkh,
+            "penalti_total": penalti_bpnt + penalti_pkh,
+            "skor_akhir": skor - penalti_bpnt - penalti_pkh,
+            "lolos_filter": lolos,
+        })
+        return hasil.astype(object).where(hasil.notna(), None).to_dict(orient="records")
+
+    def score_record(self, rec):
+        """Jalur cepat satu keluarga tanpa DataFrame (hasil sama dengan score_frame)."""
+        artifacts = self.load()
+        if artifacts.get("per_grup"):
+            return self.score_frame(pd.DataFrame([rec], columns=KOLOM_FITUR))[0]
+
+        fitur = artifacts.get("fitur_kerentanan", FITUR_KERENTANAN)
+        nilai = {c: float(rec.get(c) or 0) for c in fitur}
+        x = np.fromiter((nilai[c] for c in fitur), dtype=np.float64, count=len(fitur)) * self._scale + self._min
+        cluster = int(((self._centers - x) ** 2).sum(axis=1).argmin())
+        kategori = self._labels[cluster]
+
+        penalti = []
+        for col in ("periode_terakhir_bpnt", "periode_terakhir_pkh"):
+            teks = rec.get(col)
+            year, month = parse_period(teks) if teks is not None else (0, 0)
+            penalti.append(penalty_from_months(months_since(year, month)))
+        skor = SKOR_MAP.get(kategori, 30)
+        status = float(rec.get("status_nonaktif") or 0)
+        return {
+            "id_keluarga": rec.get("id_keluarga"),
+            "cluster_kerentanan": cluster,
+            "kategori_kerentanan": kategori,
+            "skor_kerentanan": skor,
+            "penalti_bpnt": penalti[0],
+            "penalti_pkh": penalti[1],
+            "penalti_total": penalti[0] + penalti[1],
+            "skor_akhir": skor - penalti[0] - penalti[1],
+            "lolos_filter": bool(status == 0 and nilai.get("rata_rata_desil", 0) > 0
+                                 and float(rec.get("peringkat_nasional") or 0) > 0),
+        }
+
+    def score_inputs(self, keluarga):
+        if len(keluarga) == 1:
+            return [self.score_record(keluarga[0].model_dump())]
+        df = pd.DataFrame([k.model_dump() for k in keluarga], columns=KOLOM_FITUR)
+        return self.score_frame(df)
+
+    def score_ids(self, ids, conn):
+        """Ambil fitur keluarga dari feature store lalu skor. id yang tidak ada tidak dikembalikan."""
+        if not ids:
+            return []
+        ids = list(dict.fromkeys(ids))
+        rows = []
+        for i in range(0, len(ids), ID_BATCH):
+            rows.extend(fetch_features(conn, ids[i : i + ID_BATCH]))
+        if not rows:
+            return []
+        return self.score_frame(pd.DataFrame(rows, columns=KOLOM_FITUR), conn=conn)
+
+SCORER = Scorer()
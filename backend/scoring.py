@@ -0,0 +1,56 @@
+# scoring.py
+# Versi vektor dari parse_period / months_since / penalty_from_months (utils.py).
+# Hasilnya identik dengan fungsi per-baris, tetapi tanpa df.apply.
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utils import parse_period
+
+SKOR_MAP = {"Sangat Rentan": 90, "Rentan": 60, "Tidak Rentan": 30}
+
+def parse_periods(series):
+    """Kembalikan (years, months) sebagai array int64 untuk satu kolom periode."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+
+    parsed = np.zeros((len(uniques) + 1, 2), dtype=np.int64)  # baris terakhir = NaN -> (0, 0)
+    for i, text in enumerate(uniques):
+        parsed[i] = parse_period(text)
+
+    # code -1 (NaN) menunjuk ke baris terakhir
+    table = parsed[codes]
+    return table[:, 0], table[:, 1]
+
+def months_since_vec(years, months, now_year=None, now_month=None):
+    if now_year is None: now_year = date.today().year
+    if now_month is None: now_month = date.today().month
+
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    delta = np.maximum((now_year - years) * 12 + (now_month - months), 0)
+    return np.where((years == 0) | (months == 0), 9999, delta)
+
+def penalty_vec(months_ago):
+    m = np.asarray(months_ago, dtype=np.int64)
+    # Urutan kondisi sama dengan penalty_from_months
+    return np.select(
+        [m >= 120, m < 6, m < 12, m < 24],
+        [0, 40, 20, 10],
+        default=0,
+    ).astype(np.int64)
+
+def apply_scoring(df, now_year=None, now_month=None):
+    """Hitung penalti BPNT/PKH dan skor akhir dari kategori_kerentanan."""
+    df["bpnt_year"], df["bpnt_month"] = parse_periods(df["periode_terakhir_bpnt"])
+    df["pkh_year"],  df["pkh_month"]  = parse_periods(df["periode_terakhir_pkh"])
+
+    df["bpnt_months_ago"] = months_since_vec(df["bpnt_year"], df["bpnt_month"], now_year, now_month)
+    df["pkh_months_ago"]  = months_since_vec(df["pkh_year"], df["pkh_month"], now_year, now_month)
+    df["penalti_bpnt"] = penalty_vec(df["bpnt_months_ago"])
+    df["penalti_pkh"]  = penalty_vec(df["pkh_months_ago"])
+    df["penalti_total"] = df["penalti_bpnt"] + df["penalti_pkh"]
+
+    df["skor_kerentanan"] = df["kategori_kerentanan"].map(SKOR_MAP).fillna(30)
+    df["skor_akhir"] = df["skor_kerentanan"] - df["penalti_total"]
+    return df
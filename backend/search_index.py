@@ -0,0 +1,259 @@
+# search_index.py
+# Indeks pencarian keluarga di memori, dibangun ulang setiap generation
+# training. Nama kepala keluarga diindeks dengan trigram (toleran typo,
+# hasil berperingkat); nomor KK dan id_keluarga memakai pencarian prefix di
+# array terurut; nama desa (sedikit jumlahnya) dicocokkan langsung.
+import re
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from cache import current_generation
+from database import get_db
+
+# Maksimal kandidat yang dikirim ke SQL sebagai "id_keluarga IN (...)"
+MAX_IN_IDS = 5000
+
+INDEX_SQL = """
+    SELECT kk.id_keluarga, k.no_kk, k.nama_kepala_keluarga, kk.desa, kk.skor_akhir
+    FROM keluarga_kerentanan kk
+    LEFT JOIN keluarga k ON kk.id_keluarga = k.id_keluarga
+"""
+
+_HEX_RE = re.compile(r"[0-9a-f-]+")
+_DIGIT_RE = re.compile(r"\d+")
+
+def _normalize(text):
+    return " ".join(str(text).lower().split()) if text is not None and not pd.isna(text) else ""
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    def __init__(self, rows, generation="0"):
+        df = pd.DataFrame(rows, columns=["id_keluarga", "no_kk", "nama_kepala_keluarga", "desa", "skor_akhir"])
+        self.generation = generation
+        self.built_at = time.time()
+        self.ids = df["id_keluarga"].astype(str).to_numpy()
+        self.names = [_normalize(n) for n in df["nama_kepala_keluarga"]]
+        self.desa = df["desa"].to_numpy()
+        self.skor = pd.to_numeric(df["skor_akhir"], errors="coerce").fillna(0).to_numpy()
+        self._ids_lower = pd.Series(self.ids).str.lower()
+
+        # Trigram nama -> posting list (array int32 id dokumen)
+        postings = defaultdict(list)
+        self.n_grams = np.zeros(len(self.names), dtype=np.int32)
+        for doc, name in enumerate(self.names):
+            grams = trigrams(name) if name else set()
+            self.n_grams[doc] = len(grams)
+            for g in grams:
+                postings[g].append(doc)
+        self.postings = {g: np.asarray(docs, dtype=np.int32) for g, docs in postings.items()}
+
+        # Prefix: array terurut + posisi dokumen asal
+        self._kk = df["no_kk"].fillna("").astype(str).to_numpy()
+        self._kk_order = np.argsort(self._kk, kind="stable")
+        self._kk_sorted = self._kk[self._kk_order]
+        self._id_order = np.argsort(self._ids_lower.to_numpy(), kind="stable")
+        self._id_sorted = self._ids_lower.to_numpy()[self._id_order]
+
+        # Desa -> dokumen
+        self.desa_docs = {}
+        for nama_desa, docs in df.groupby("desa", dropna=True).indices.items():
+            self.desa_docs[nama_desa] = np.asarray(docs, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # -------------------------
+    # Bantuan
+    # -------------------------
+    def _prefix_docs(self, sorted_arr, order, prefix):
+        lo = np.searchsorted(sorted_arr, prefix, side="left")
+        hi = np.searchsorted(sorted_arr, prefix + "\uffff", side="left")
+        return order[lo:hi]
+
+    def _name_candidates(self, q):
+        """Dokumen yang namanya mengandung semua trigram q (belum diverifikasi)."""
+        grams = {q[i : i + 3] for i in range(len(q) - 2)}
+        lists = [self.postings.get(g) for g in grams]
+        if any(p is None for p in lists):
+            return np.empty(0, dtype=np.int32)
+        lists.sort(key=len)
+        docs = lists[0]
+        for p in lists[1:]:
+            docs = np.intersect1d(docs, p, assume_unique=True)
+            if len(docs) == 0:
+                break
+        return docs
+
+    # -------------------------
+    # Cocok substring (semantik LIKE '%q%')
+    # -------------------------
+    def substring_ids(self, query):
+        """id_keluarga yang id/nama/desa-nya mengandung query (tanpa beda huruf besar)."""
+        q = _normalize(query)
+        if not q:
+            return list(self.ids)
+        found = []
+
+        if len(q) >= 3:
+            docs = self._name_candidates(q)
+            found.append(np.asarray([d for d in docs if q in self.names[d]], dtype=np.int64))
+        else:
+            found.append(np.flatnonzero([q in n for n in self.names]))
+
+        for nama_desa, docs in self.desa_docs.items():
+            if q in _normalize(nama_desa):
+                found.append(docs)
+
+        # id_keluarga hanya bisa cocok jika query berupa karakter hex/'-'
+        if _HEX_RE.fullmatch(q):
+            found.append(np.flatnonzero(self._ids_lower.str.contains(q, regex=False).to_numpy()))
+
+        docs = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+        return self.ids[docs].tolist()
+
+    # -------------------------
+    # Pencarian berperingkat (toleran typo)
+    # -------------------------
+    def search(self, query, limit=20, desa=None):
+        q = _normalize(query)
+        if not q or len(self) == 0:
+            return []
+
+        scores = np.zeros(len(self), dtype=np.float64)
+
+        # 1. Kemiripan trigram nama (Jaccard)
+        q_grams = trigrams(q)
+        hits = [self.postings[g] for g in q_grams if g in self.postings]
+        if hits:
+            overlap = np.bincount(np.concatenate(hits), minlength=len(self)).astype(np.float64)
+            union = len(q_grams) + self.n_grams - overlap
+            scores = np.where(overlap > 0, overlap / np.maximum(union, 1), 0.0)
+
+        # 2. Bonus substring / awalan nama
+        if len(q) >= 3:
+            for d in self._name_candidates(q):
+                name = self.names[d]
+                if name.startswith(q):
+                    scores[d] += 1.0
+                elif q in name:
+                    scores[d] += 0.5
+
+        # 3. Awalan nomor KK / id_keluarga (cocok persis, peringkat tertinggi)
+        if _DIGIT_RE.fullmatch(q):
+            scores[self._prefix_docs(self._kk_sorted, self._kk_order, q)] += 2.0
+        if _HEX_RE.fullmatch(q) and len(q) >= 4:
+            scores[self._prefix_docs(self._id_sorted, self._id_order, q)] += 2.0
+
+        # 4. Nama desa
+        for nama_desa, docs in self.desa_docs.items():
+            if q in _normalize(nama_desa):
+                scores[docs] += 0.25
+
+        if desa and desa != "SEMUA":
+            mask = np.zeros(len(self), dtype=bool)
+            mask[self.desa_docs.get(desa, [])] = True
+            scores[~mask] = 0.0
+
+        # Ambang minimal supaya trigram kebetulan tidak ikut
+        kandidat = np.flatnonzero(scores >= 0.2)
+        if len(kandidat) == 0:
+            return []
+        # Urut skor pencarian DESC, lalu skor_akhir DESC
+        order = np.lexsort((-self.skor[kandidat], -scores[kandidat]))[:limit]
+        top = kandidat[order]
+        return [
+            {"id_keluarga": self.ids[d], "skor_pencarian": round(float(scores[d]), 4)}
+            for d in top
+        ]
+
+# =========================
+# INDEKS GLOBAL PER GENERATION
+# =========================
+# Batas tunggu build pertama (belum ada indeks sama sekali) untuk pemanggil wait=True
+INDEX_WAIT_TIMEOUT = 30.0
+
+_lock = threading.Lock()
+_index = None
+_building = {}  # generation -> threading.Event (build yang sedang berjalan)
+
+def build_index(conn=None, generation=None):
+    """Bangun indeks dari keluarga_kerentanan dan jadikan indeks aktif."""
+    global _index
+    own_conn = conn is None
+    conn = conn or get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(INDEX_SQL)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+    index = SearchIndex(rows, generation or current_generation())
+    sekarang = current_generation()
+    with _lock:
+        # Build background yang selesai terlambat tidak menimpa indeks generation terbaru
+        if _index is None or index.generation == sekarang or _index.generation != sekarang:
+            _index = index
+    return index
+
+def _build_in_background(generation):
+    """Mulai build untuk generation (sekali per generation); kembalikan Event selesai."""
+    with _lock:
+        event = _building.get(generation)
+        if event is not None:
+            return event
+        event = _building[generation] = threading.Event()
+
+    def run():
+        try:
+            build_index(generation=generation)
+        except Exception as e:
+            print("Gagal membangun indeks pencarian:", e)
+        finally:
+            with _lock:
+                _building.pop(generation, None)
+            event.set()
+
+    threading.Thread(target=run, name="search-index", daemon=True).start()
+    return event
+
+def get_index(wait=False, timeout=INDEX_WAIT_TIMEOUT):
+    """Indeks aktif. Jika usang, indeks generation baru dibangun di background
+    (satu build per generation) dan indeks lama tetap dipakai sampai selesai.
+
+    None jika belum ada indeks sama sekali; dengan wait=True tunggu build itu.
+    """
+    generation = current_generation()
+    with _lock:
+        index = _index
+    if index is not None and index.generation == generation:
+        return index
+    event = _build_in_background(generation)
+    if index is None and wait:
+        event.wait(timeout)
+        with _lock:
+            index = _index
+    return index
+
+def index_stats():
+    with _lock:
+        index = _index
+        building = list(_building)
+    if index is None:
+        return {"built": False, "building": building}
+    return {
+        "built": True,
+        "building": building,
+        "generation": index.generation,
+        "documents": len(index),
+        "trigrams": len(index.postings),
+        "built_at": index.built_at,
+    }
@@ -0,0 +1,216 @@
+# streaming.py
+# Training K-Means dengan memori terbatas (mode=streaming).
+# Fitur dibaca per chunk dari cursor server-side dengan tipe ringkas
+# (desa categorical, fitur float32, status int8), disimpan sementara ke disk,
+# lalu diproses beberapa kali tanpa pernah memuat semua keluarga sekaligus:
+#   pass 1: baca DB -> spill chunk + MinMaxScaler.partial_fit (fit dua tahap)
+#   pass 2: engine "minibatch" (partial_fit per minibatch, beberapa epoch)
+#           atau "sampled" (KMeans penuh atas sampel acak lintas chunk), lihat engines.py
+#   pass 3: predict -> rata-rata desil per cluster (mapping label)
+#   pass 4: predict + skor -> tulis staging per chunk + rekap bertahap
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from cache import make_generation_id, new_generation
+from database import get_db
+from engines import (
+    INIT_SAMPLE_SIZE, MINIBATCH_SIZE, SAMPLE_SIZE, fit_minibatch, fit_sampled, inertia,
+    sampled_silhouette,
+)
+from features import CHUNK_SIZE, iter_features
+from getdata import precompute_dashboard
+from kmeans import FITUR_KERENTANAN, filter_valid, map_cluster_labels, no_progress, no_valid_data
+from periode import PERIOD_PARSER, PERIODE_CACHE_PATH
+from registry import current_version, discard_version, prune, save_model, set_current
+from rekap import RekapAccumulator
+from scoring import apply_scoring
+from search_index import build_index
+from utils import peak_rss_mb
+from writer import StagingWriter
+
+# Engine yang bisa berjalan tanpa memuat semua baris
+STREAM_ENGINES = ("minibatch", "sampled")
+
+def _read_valid(path):
+    _, df_valid = filter_valid(pd.read_pickle(path))
+    return df_valid.reset_index(drop=True)
+
+def _minibatches(paths, scaler, size=MINIBATCH_SIZE):
+    """Fitur ter-skala dalam potongan berukuran tetap, lintas batas chunk."""
+    buffer, n = [], 0
+    for path in paths:
+        df_valid = _read_valid(path)
+        if len(df_valid) == 0:
+            continue
+        buffer.append(scaler.transform(df_valid[FITUR_KERENTANAN]))
+        n += len(df_valid)
+        while n >= size:
+            X = np.concatenate(buffer)
+            yield X[:size]
+            buffer, n = [X[size:]], n - size
+    if n:
+        yield np.concatenate(buffer)
+
+def _random_sample(paths, scaler, size, total_valid, random_state=42):
+    """Sampel acak seragam dari semua baris valid, diambil chunk demi chunk.
+
+    total_valid sudah diketahui dari pass 1, jadi indeks sampel bisa diundi
+    di depan; urutan baris di tabel sumber tidak ikut menentukan sampel.
+    """
+    size = min(size, total_valid)
+    rng = np.random.default_rng(random_state)
+    pilihan = np.sort(rng.choice(total_valid, size=size, replace=False))
+    bagian, offset = [], 0
+    for path in paths:
+        df_valid = _read_valid(path)
+        if len(df_valid) == 0:
+            continue
+        lo, hi = np.searchsorted(pilihan, [offset, offset + len(df_valid)])
+        if hi > lo:
+            X = scaler.transform(df_valid[FITUR_KERENTANAN])
+            bagian.append(X[pilihan[lo:hi] - offset])
+        offset += len(df_valid)
+    return np.concatenate(bagian)
+
+def train_kmeans_streaming(progress=None, chunksize=CHUNK_SIZE, engine=None):
+    progress = progress or no_progress
+    # KMeans penuh butuh semua baris di memori; pakai minibatch sebagai gantinya
+    engine = engine if engine in STREAM_ENGINES else "minibatch"
+    conn = get_db()
+    tmpdir = tempfile.mkdtemp(prefix="bansos_stream_")
+    writer = None
+    generation = None
+    try:
+        # 1. LOAD PER CHUNK + FIT SCALER (pass 1)
+        progress("loading")
+        scaler = MinMaxScaler()
+        paths = []
+        total_awal = total_aktif = total_valid = 0
+        chunk_mb_max = 0.0
+        for i, chunk in enumerate(iter_features(chunksize)):
+            total_awal += len(chunk)
+            chunk_mb_max = max(chunk_mb_max, chunk.memory_usage(deep=True).sum() / 2**20)
+            path = os.path.join(tmpdir, f"chunk_{i:05d}.pkl")
+            chunk.to_pickle(path)
+            paths.append(path)
+
+            df_aktif, df_valid = filter_valid(chunk)
+            total_aktif += len(df_aktif)
+            total_valid += len(df_valid)
+            if len(df_valid):
+                scaler.partial_fit(df_valid[FITUR_KERENTANAN])
+            progress("loading", total_awal=total_awal)
+
+        if total_valid == 0:
+            return no_valid_data(total_awal, total_aktif)
+
+        # 2. CLUSTERING (pass 2)
+        progress("clustering", total_awal=total_awal, total_valid=total_valid)
+        n_clusters = 3 if total_valid >= 3 else 1
+        if engine == "sampled":
+            sampel = _random_sample(paths, scaler, SAMPLE_SIZE, total_valid)
+            kmeans_A = fit_sampled(sampel, n_clusters)
+        else:
+            sampel = _random_sample(paths, scaler, INIT_SAMPLE_SIZE, total_valid)
+            kmeans_A = fit_minibatch(lambda: _minibatches(paths, scaler), sampel, n_clusters)
+
+        # 3. MAPPING LABEL dari rata-rata desil per cluster (pass 3)
+        sums = np.zeros(n_clusters)
+        counts = np.zeros(n_clusters)
+        sse = 0.0
+        for path in paths:
+            df_valid = _read_valid(path)
+            if len(df_valid) == 0:
+                continue
+            X = scaler.transform(df_valid[FITUR_KERENTANAN])
+            labels = kmeans_A.predict(X)
+            sse += inertia(kmeans_A, X)
+            sums += np.bincount(labels, weights=df_valid["rata_rata_desil"], minlength=n_clusters)
+            counts += np.bincount(labels, minlength=n_clusters)
+        ada = counts > 0
+        cluster_means = pd.Series(sums[ada] / counts[ada], index=np.flatnonzero(ada))
+        cluster_to_label = map_cluster_labels(cluster_means)
+
+        artifacts = {
+            "scaler_kerentanan": scaler,
+            "kmeans_kerentanan": kmeans_A,
+            "cluster_to_label": cluster_to_label,
+            "fitur_kerentanan": FITUR_KERENTANAN,
+        }
+
+        # 4. SKOR + TULIS PER CHUNK KE STAGING (pass 4), lalu swap atomik
+        progress("writing", total_valid=total_valid, rows_written=0)
+        generation = make_generation_id()
+        save_model(artifacts, generation, {
+            "rows": total_valid,
+            "mode": "streaming",
+            "engine": engine,
+            "sse": sse,
+            "silhouette": sampled_silhouette(sampel, kmeans_A.predict(sampel)),
+        })
+        rekap = RekapAccumulator()
+        writer = StagingWriter(progress).open()
+        for path in paths:
+            df = _read_valid(path)
+            if len(df) == 0:
+                continue
+            df["cluster_kerentanan"] = kmeans_A.predict(scaler.transform(df[FITUR_KERENTANAN]))
+            df["kategori_kerentanan"] = df["cluster_kerentanan"].map(cluster_to_label)
+            df = apply_scoring(df)
+            writer.write(df)
+            rekap.add(df)
+        rekap_rows = rekap.rows()
+        tulis = writer.swap(rekap_rows, generation, archive_as=current_version())
+        writer.close()
+        writer = None
+        set_current(generation)
+        prune(conn)
+        PERIOD_PARSER.save(PERIODE_CACHE_PATH)
+
+        # Hash fitur semua keluarga (termasuk yang tidak valid) per chunk
+        from incremental import record_refit_hashes
+        for i, path in enumerate(paths):
+            record_refit_hashes(conn, pd.read_pickle(path), reset=(i == 0))
+
+        new_generation(generation)
+        precompute_dashboard(rekap_rows, generation)
+        build_index(conn, generation)
+
+        total_inserted = tulis["rows"]
+        return {
+            "status": "success",
+            "mode": "streaming",
+            "engine": engine,
+            "model_version": generation,
+            "rows_processed": total_inserted,
+            "info": f"Sukses. {total_inserted} data disimpan (Data Desil/Peringkat 0 dibuang).",
+            "diagnostik": {
+                "total_awal": total_awal,
+                "total_valid_disimpan": total_inserted,
+                "penulisan": tulis,
+                "periode": PERIOD_PARSER.stats(),
+                "memori": {
+                    "peak_rss_mb": peak_rss_mb(),
+                    "chunk_mb_max": round(float(chunk_mb_max), 2),
+                    "chunk_size": chunksize,
+                    "chunks": len(paths),
+                },
+            }
+        }
+
+    except Exception as e:
+        print("ERROR:", str(e))
+        if writer is not None:
+            writer.close(error=True)
+        if generation is not None:
+            # Versi yang belum sempat di-swap tidak punya tabel skor
+            discard_version(generation)
+        return {"status": "error", "message": str(e)}
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        if conn: conn.close()
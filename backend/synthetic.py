@@ -0,0 +1,266 @@
+# synthetic.py
+# Generator data sintetis (seeded) untuk benchmark, memakai SQLite in-memory
+# sebagai pengganti MySQL. Skema hanya berisi kolom yang dipakai backend.
+# load_mysql memuat data yang sama ke database MySQL/MariaDB khusus benchmark.
+import re
+import sqlite3
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# =========================
+# DAFTAR PERIODE CONTOH
+# =========================
+PERIODE_BANSOS = [
+    f"TAHAP {tahap} {bulan} {tahun}"
+    for tahun in (2019, 2020, 2021, 2022, 2023, 2024, 2025)
+    for tahap, bulan in (
+        (1, "JAN-FEB-MAR"), (2, "APR-MEI-JUN"),
+        (3, "JUL-AGS-SEP"), (4, "OKT-NOV-DES"),
+    )
+]
+
+SCHEMA = """
+    CREATE TABLE kelurahan (
+        no_prop INTEGER, no_kab INTEGER, no_kec INTEGER, no_kel INTEGER,
+        nama_kelurahan TEXT
+    );
+    CREATE TABLE keluarga (
+        id_keluarga TEXT PRIMARY KEY, no_kk TEXT, nama_kepala_keluarga TEXT,
+        alamat TEXT, no_prop INTEGER, no_kab INTEGER, no_kec INTEGER,
+        no_kel INTEGER, peringkat_nasional TEXT, status_nonaktif INTEGER
+    );
+    CREATE TABLE anggota_keluarga (id INTEGER PRIMARY KEY, id_keluarga TEXT);
+    CREATE TABLE aset_keluarga (
+        id INTEGER PRIMARY KEY, id_keluarga TEXT, id_jenis_aset INTEGER,
+        jumlah INTEGER
+    );
+    CREATE TABLE riwayat_desil (id INTEGER PRIMARY KEY, id_keluarga TEXT, desil TEXT);
+    CREATE TABLE riwayat_bpnt (id INTEGER PRIMARY KEY, id_keluarga TEXT, nama_periode TEXT);
+    CREATE TABLE riwayat_pkh (id INTEGER PRIMARY KEY, id_keluarga TEXT, nama_periode TEXT);
+    CREATE INDEX ix_anggota ON anggota_keluarga (id_keluarga);
+    CREATE INDEX ix_aset ON aset_keluarga (id_keluarga, id_jenis_aset);
+    CREATE INDEX ix_desil ON riwayat_desil (id_keluarga);
+    CREATE INDEX ix_bpnt ON riwayat_bpnt (id_keluarga, id);
+    CREATE INDEX ix_pkh ON riwayat_pkh (id_keluarga, id);
+"""
+
+# Ukuran standar benchmark (jumlah keluarga)
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Tabel hasil training (kolom = writer.KOLOM_KERENTANAN + id) dan rekap_desa,
+# untuk menjalankan endpoint baca di atas SQLite
+SCHEMA_HASIL = """
+    CREATE TABLE IF NOT EXISTS keluarga_kerentanan (
+        id INTEGER PRIMARY KEY, id_keluarga TEXT, cluster_kerentanan INTEGER,
+        kategori_kerentanan TEXT, skor_kerentanan INTEGER, skor_akhir INTEGER,
+        desa TEXT, rata_rata_desil REAL, peringkat_nasional INTEGER,
+        jumlah_tanggungan INTEGER, aset_tinggi REAL, aset_menengah REAL,
+        aset_bawah REAL, periode_terakhir_bpnt TEXT, periode_terakhir_pkh TEXT,
+        penalti_total INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS ix_kk_desa_skor ON keluarga_kerentanan (desa, skor_akhir, id_keluarga);
+    CREATE INDEX IF NOT EXISTS ix_kk_skor ON keluarga_kerentanan (skor_akhir, id_keluarga);
+    CREATE TABLE IF NOT EXISTS rekap_desa (
+        desa TEXT UNIQUE, sangat_rentan INTEGER, rentan INTEGER, tidak_rentan INTEGER,
+        total_kk INTEGER, indeks_desa REAL, rata_rata_skor REAL, histogram_skor TEXT,
+        generation TEXT, updated_at TEXT
+    );
+"""
+
+# Skema MySQL/MariaDB untuk database benchmark (tipe mengikuti produksi)
+SCHEMA_MYSQL = [
+    """CREATE TABLE kelurahan (
+        no_prop INT, no_kab INT, no_kec INT, no_kel INT, nama_kelurahan VARCHAR(255)
+    )""",
+    """CREATE TABLE keluarga (
+        id_keluarga VARCHAR(64) NOT NULL PRIMARY KEY, no_kk VARCHAR(32),
+        nama_kepala_keluarga VARCHAR(255), alamat VARCHAR(255), no_prop INT, no_kab INT,
+        no_kec INT, no_kel INT, peringkat_nasional VARCHAR(32), status_nonaktif INT
+    )""",
+    "CREATE TABLE anggota_keluarga (id BIGINT PRIMARY KEY, id_keluarga VARCHAR(64))",
+    """CREATE TABLE aset_keluarga (
+        id BIGINT PRIMARY KEY, id_keluarga VARCHAR(64), id_jenis_aset INT, jumlah INT
+    )""",
+    "CREATE TABLE riwayat_desil (id BIGINT PRIMARY KEY, id_keluarga VARCHAR(64), desil VARCHAR(8))",
+    "CREATE TABLE riwayat_bpnt (id BIGINT PRIMARY KEY, id_keluarga VARCHAR(64), nama_periode VARCHAR(255))",
+    "CREATE TABLE riwayat_pkh (id BIGINT PRIMARY KEY, id_keluarga VARCHAR(64), nama_periode VARCHAR(255))",
+    """CREATE TABLE keluarga_kerentanan (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY, id_keluarga VARCHAR(64), cluster_kerentanan INT,
+        kategori_kerentanan VARCHAR(32), skor_kerentanan INT, skor_akhir INT, desa VARCHAR(255),
+        rata_rata_desil DECIMAL(10,2), peringkat_nasional BIGINT, jumlah_tanggungan INT,
+        aset_tinggi DECIMAL(12,2), aset_menengah DECIMAL(12,2), aset_bawah DECIMAL(12,2),
+        periode_terakhir_bpnt VARCHAR(255), periode_terakhir_pkh VARCHAR(255), penalti_total INT,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+]
+
+def _child_rows(rng, ids, max_per_family):
+    """Ulangi id keluarga 0..max_per_family kali (jumlah acak per keluarga)."""
+    counts = rng.integers(0, max_per_family + 1, size=len(ids))
+    return np.repeat(ids, counts)
+
+def generate_tables(n_keluarga=10_000, n_desa=40, seed=42):
+    """Bangkitkan semua tabel sumber sebagai dict nama_tabel -> DataFrame."""
+    rng = np.random.default_rng(seed)
+    rnd = np.random.RandomState(seed)
+
+    kelurahan = pd.DataFrame({
+        "no_prop": 32, "no_kab": 5,
+        "no_kec": np.arange(n_desa) // 10 + 1,
+        "no_kel": np.arange(n_desa) % 10 + 1,
+        "nama_kelurahan": [f"DESA {i:03d}" for i in range(n_desa)],
+    })
+
+    ids = np.array([str(uuid.UUID(int=int(rnd.randint(0, 2**62)) << 64 | i))
+                    for i in range(n_keluarga)])
+    desa_idx = rng.integers(0, n_desa, size=n_keluarga)
+    peringkat = rng.integers(0, 500_000, size=n_keluarga).astype(str)
+    keluarga = pd.DataFrame({
+        "id_keluarga": ids,
+        "no_kk": [f"3205{i:012d}" for i in range(n_keluarga)],
+        "nama_kepala_keluarga": [f"KEPALA {i}" for i in range(n_keluarga)],
+        "alamat": "-",
+        "no_prop": 32, "no_kab": 5,
+        "no_kec": kelurahan["no_kec"].to_numpy()[desa_idx],
+        "no_kel": kelurahan["no_kel"].to_numpy()[desa_idx],
+        "peringkat_nasional": peringkat,
+        "status_nonaktif": (rng.random(n_keluarga) < 0.05).astype(int),
+    })
+
+    anggota = _child_rows(rng, ids, 7)
+    anggota_keluarga = pd.DataFrame({"id_keluarga": anggota})
+
+    aset = _child_rows(rng, ids, 6)
+    aset_keluarga = pd.DataFrame({
+        "id_keluarga": aset,
+        "id_jenis_aset": rng.integers(1, 15, size=len(aset)),
+        "jumlah": rng.integers(1, 4, size=len(aset)),
+    })
+
+    desil = _child_rows(rng, ids, 3)
+    riwayat_desil = pd.DataFrame({
+        "id_keluarga": desil,
+        "desil": rng.integers(1, 11, size=len(desil)).astype(str),
+    })
+
+    tables = {
+        "kelurahan": kelurahan,
+        "keluarga": keluarga,
+        "anggota_keluarga": anggota_keluarga,
+        "aset_keluarga": aset_keluarga,
+        "riwayat_desil": riwayat_desil,
+    }
+    for nama in ("riwayat_bpnt", "riwayat_pkh"):
+        fam = _child_rows(rng, ids, 4)
+        periode = rng.integers(0, len(PERIODE_BANSOS), size=len(fam))
+        tables[nama] = pd.DataFrame({
+            "id_keluarga": fam,
+            "nama_periode": np.array(PERIODE_BANSOS)[periode],
+        }).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    # Kolom id auto-increment untuk tabel anak
+    for nama in ("anggota_keluarga", "aset_keluarga", "riwayat_desil",
+                 "riwayat_bpnt", "riwayat_pkh"):
+        tables[nama].insert(0, "id", np.arange(1, len(tables[nama]) + 1))
+    return tables
+
+def load_sqlite(tables, path=":memory:"):
+    """Muat tabel sintetis ke SQLite dan kembalikan koneksinya."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.executescript(SCHEMA)
+    for nama, df in tables.items():
+        df.to_sql(nama, conn, if_exists="append", index=False)
+    conn.commit()
+    return conn
+
+def load_mysql(tables, conn, batch_size=5000):
+    """Ganti tabel sumber di database MySQL benchmark dengan data sintetis."""
+    cursor = conn.cursor()
+    try:
+        nama_tabel = [re.search(r"CREATE TABLE (\w+)", ddl).group(1) for ddl in SCHEMA_MYSQL]
+        cursor.execute("DROP TABLE IF EXISTS " + ", ".join(nama_tabel))
+        for ddl in SCHEMA_MYSQL:
+            cursor.execute(ddl)
+        for nama, df in tables.items():
+            kolom = list(df.columns)
+            sql = f"INSERT INTO {nama} ({', '.join(kolom)}) VALUES ({', '.join(['%s'] * len(kolom))})"
+            rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+            buf = []
+            for row in rows:
+                buf.append(tuple(v.item() if hasattr(v, "item") else v for v in row))
+                if len(buf) == batch_size:
+                    cursor.executemany(sql, buf)
+                    buf = []
+            if buf:
+                cursor.executemany(sql, buf)
+            conn.commit()
+    finally:
+        cursor.close()
+
+# =========================
+# ADAPTER SQLITE (PENGGANTI get_db)
+# =========================
+class SqliteCursor:
+    """Cursor ala mysql.connector: placeholder %s, opsi dictionary=True."""
+
+    def __init__(self, conn, dictionary=False):
+        self._cur = conn.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, operation, params=None):
+        self._cur.execute(operation.replace("%s", "?"), tuple(params or ()))
+
+    def executemany(self, operation, seq_params):
+        self._cur.executemany(operation.replace("%s", "?"), [tuple(p) for p in seq_params])
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cur.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cur.fetchall()]
+
+    def close(self):
+        self._cur.close()
+
+class SqliteConnection:
+    """Koneksi SQLite per pemanggilan get_db (aman dipakai banyak thread)."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SqliteCursor(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        return self._conn is not None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
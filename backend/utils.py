@@ -1,30 +1,17 @@
 # utils.py
-import re
-import pandas as pd
+import sys
 from datetime import date
 
-# Konstanta Peta Bulan
-BULAN_MAP = {
-    "JAN":1, "FEB":2, "MAR":3, "APR":4, "MEI":5, "MAY":5, "JUN":6, 
-    "JUL":7, "AGS":8, "AGT":8, "AGU":8, "AUG":8, "SEP":9, "OKT":10, 
-    "OCT":10, "NOV":11, "DES":12, "DEC":12,
-}
+try:
+    import resource  # tidak tersedia di Windows
+except ImportError:
+    resource = None
 
-def parse_period(text):
-    """Ambil bulan TERAKHIR dan tahun dari teks."""
-    try:
-        if pd.isna(text): return (0, 0)
-        t = str(text).upper()
-        bulan_tokens = re.findall(r"(JAN|FEB|MAR|APR|MEI|MAY|JUN|JUL|AGS|AGT|AGU|AUG|SEP|OKT|OCT|NOV|DES|DEC)", t)
-        tahun_match = re.search(r"(20\d{2})", t)
-
-        if not tahun_match or not bulan_tokens: return (0, 0)
+from periode import BULAN_MAP, PERIOD_PARSER
 
-        year = int(tahun_match.group(1))
-        month = BULAN_MAP.get(bulan_tokens[-1], 0)
-        return (year, month)
-    except:
-        return (0, 0)
+def parse_period(text):
+    """Ambil bulan TERAKHIR dan tahun dari teks (memakai cache PERIOD_PARSER)."""
+    return PERIOD_PARSER.parse(text)
 
 def months_since(year, month, now_year=None, now_month=None):
     """Hitung selisih bulan dari sekarang."""
@@ -42,4 +29,12 @@ def penalty_from_months(months: int) -> int:
     if months < 6: return 40
     elif months < 12: return 20
     elif months < 24: return 10
-    else: return 0
\ No newline at end of file
+    else: return 0
+
+def peak_rss_mb():
+    """Puncak memori (RSS) proses ini dalam MB (None jika tidak didukung OS)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux melaporkan KB, macOS melaporkan byte
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
@@ -0,0 +1,194 @@
+# writer.py
+# Penulis massal hasil training ke keluarga_kerentanan.
+# Data ditulis ke tabel staging (multi-row VALUES atau LOAD DATA LOCAL INFILE),
+# lalu ditukar secara atomik dengan RENAME TABLE, sehingga pembaca dashboard
+# tidak pernah melihat tabel setengah terisi.
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from database import get_direct_db
+from registry import archive_tables
+from rekap import ensure_rekap_table, write_rekap
+
+KOLOM_KERENTANAN = [
+    "id_keluarga", "cluster_kerentanan", "kategori_kerentanan", "skor_kerentanan",
+    "skor_akhir", "desa", "rata_rata_desil", "peringkat_nasional", "jumlah_tanggungan",
+    "aset_tinggi", "aset_menengah", "aset_bawah", "periode_terakhir_bpnt",
+    "periode_terakhir_pkh", "penalti_total",
+]
+
+INSERT_SQL = f"""
+    INSERT INTO keluarga_kerentanan
+    ({", ".join(KOLOM_KERENTANAN)})
+    VALUES ({", ".join(["%s"] * len(KOLOM_KERENTANAN))})
+"""
+
+# Baris per statement INSERT multi-row
+ROWS_PER_STATEMENT = int(os.getenv("BULK_ROWS_PER_STATEMENT", "2000"))
+# "values" (default) atau "load_data" (butuh local_infile aktif di server)
+BULK_LOAD_MODE = os.getenv("BULK_LOAD_MODE", "values")
+
+STAGING = "keluarga_kerentanan_staging"
+OLD = "keluarga_kerentanan_old"
+REKAP_STAGING = "rekap_desa_staging"
+REKAP_OLD = "rekap_desa_old"
+
+def _nullable_str(series):
+    """str, tetapi None/NaN/string kosong menjadi NULL."""
+    s = series.astype(object)
+    kosong = s.isna() | (s == "")
+    return s.where(~kosong, None).map(lambda v: v if v is None else str(v))
+
+def build_frame(df):
+    """DataFrame dengan kolom & tipe persis seperti yang disimpan."""
+    return pd.DataFrame({
+        "id_keluarga": df["id_keluarga"].astype(str),  # FIX: UUID string
+        "cluster_kerentanan": df["cluster_kerentanan"].astype("int64"),
+        "kategori_kerentanan": df["kategori_kerentanan"].astype(str),
+        "skor_kerentanan": df["skor_kerentanan"].astype("int64"),
+        "skor_akhir": df["skor_akhir"].astype("int64"),
+        "desa": _nullable_str(df["desa"]),
+        "rata_rata_desil": df["rata_rata_desil"].astype("float64"),
+        "peringkat_nasional": df["peringkat_nasional"].astype("int64"),
+        "jumlah_tanggungan": df["jumlah_tanggungan"].astype("int64"),
+        "aset_tinggi": df["aset_tinggi"].astype("float64"),
+        "aset_menengah": df["aset_menengah"].astype("float64"),
+        "aset_bawah": df["aset_bawah"].astype("float64"),
+        "periode_terakhir_bpnt": _nullable_str(df["periode_terakhir_bpnt"]),
+        "periode_terakhir_pkh": _nullable_str(df["periode_terakhir_pkh"]),
+        "penalti_total": df["penalti_total"].astype("int64"),
+    }, index=df.index)
+
+def build_rows(df):
+    """List tuple siap insert (tipe Python asli, bukan numpy)."""
+    frame = build_frame(df).astype(object)
+    frame = frame.where(frame.notna(), None)
+    return list(frame.itertuples(index=False, name=None))
+
+# =========================
+# CARA MENULIS KE STAGING
+# =========================
+def _insert_values(cursor, table, rows, progress):
+    placeholders = "(" + ", ".join(["%s"] * len(KOLOM_KERENTANAN)) + ")"
+    prefix = f"INSERT INTO {table} ({', '.join(KOLOM_KERENTANAN)}) VALUES "
+    written = 0
+    for i in range(0, len(rows), ROWS_PER_STATEMENT):
+        batch = rows[i : i + ROWS_PER_STATEMENT]
+        sql = prefix + ", ".join([placeholders] * len(batch))
+        cursor.execute(sql, [v for row in batch for v in row])
+        written += len(batch)
+        progress("writing", rows_written=written)
+    return written
+
+def _tsv_field(value):
+    if value is None:
+        return "\\N"  # NULL untuk LOAD DATA
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def _load_data(cursor, table, rows, progress):
+    fd, path = tempfile.mkstemp(suffix=".tsv")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for row in rows:
+                f.write("\t".join(_tsv_field(v) for v in row) + "\n")
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+            "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+            f"({', '.join(KOLOM_KERENTANAN)})",
+            (path,),
+        )
+    finally:
+        os.remove(path)
+    progress("writing", rows_written=len(rows))
+    return len(rows)
+
+# =========================
+# TULIS + SWAP ATOMIK
+# =========================
+class StagingWriter:
+    """Tulis hasil ke staging per potongan (chunk), lalu swap() sekali di akhir."""
+
+    def __init__(self, progress=None, mode=None):
+        self.progress = progress or (lambda phase, **counts: None)
+        self.mode = mode or BULK_LOAD_MODE
+        self.written = 0
+        self.conn = None
+        self.cursor = None
+
+    def open(self):
+        self._start = time.perf_counter()
+        self.conn = get_direct_db(allow_local_infile=(self.mode == "load_data"))
+        self.cursor = self.conn.cursor()
+        ensure_rekap_table(self.conn)
+        # DDL (implicit commit) hanya menyentuh tabel staging
+        for table, source in ((STAGING, "keluarga_kerentanan"), (REKAP_STAGING, "rekap_desa")):
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            self.cursor.execute(f"CREATE TABLE {table} LIKE {source}")
+        return self
+
+    def write(self, df):
+        rows = build_rows(df)
+        written_before = self.written
+        report = lambda phase, rows_written: self.progress(phase, rows_written=written_before + rows_written)
+        if self.mode == "load_data":
+            self.written += _load_data(self.cursor, STAGING, rows, report)
+        else:
+            self.written += _insert_values(self.cursor, STAGING, rows, report)
+
+    def swap(self, rekap_rows=None, generation=None, archive_as=None):
+        """Tukar staging masuk. archive_as: versi model yang tabelnya diarsip, bukan dibuang."""
+        if rekap_rows is not None:
+            write_rekap(self.cursor, rekap_rows, generation, table=REKAP_STAGING)
+        self.conn.commit()
+        elapsed_write = time.perf_counter() - self._start
+
+        # Tabel lama diarsip per versi model (untuk rollback) atau dibuang
+        old, rekap_old = archive_tables(archive_as) if archive_as else (OLD, REKAP_OLD)
+
+        # Satu RENAME TABLE = satu operasi atomik untuk semua pasangan tabel
+        renames = [f"keluarga_kerentanan TO {old}", f"{STAGING} TO keluarga_kerentanan"]
+        if rekap_rows is not None:
+            renames += [f"rekap_desa TO {rekap_old}", f"{REKAP_STAGING} TO rekap_desa"]
+        self.cursor.execute(f"DROP TABLE IF EXISTS {old}, {rekap_old}")
+        self.cursor.execute("RENAME TABLE " + ", ".join(renames))
+        if archive_as:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {REKAP_STAGING}")
+        else:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {OLD}, {REKAP_OLD}, {REKAP_STAGING}")
+
+        elapsed = time.perf_counter() - self._start
+        return {
+            "mode": self.mode,
+            "rows": self.written,
+            "seconds": round(elapsed, 3),
+            "rows_per_s": round(self.written / elapsed_write, 1) if elapsed_write > 0 else None,
+        }
+
+    def close(self, error=False):
+        if self.conn is None:
+            return
+        try:
+            if error:
+                self.conn.rollback()
+            self.cursor.close()
+        finally:
+            self.conn.close()
+            self.conn = None
+
+def write_results(df, rekap_rows=None, generation=None, progress=None, mode=None, archive_as=None):
+    """Tulis df ke staging lalu tukar dengan keluarga_kerentanan (dan rekap_desa).
+
+    Kembalikan statistik throughput.
+    """
+    writer = StagingWriter(progress, mode).open()
+    try:
+        writer.write(df)
+        stats = writer.swap(rekap_rows, generation, archive_as)
+    except Exception:
+        writer.close(error=True)
+        raise
+    writer.close()
+    return stats
@@ -30,8 +30,24 @@ export async function get_stats_semua_desa() {
   return fetch(url).then((res) => res.json());
 }
 
-export async function trainKmeans() {
-  return fetch(`${API}/train-kmeans`, {
+export async function getTrainingJob(jobId) {
+  return fetch(`${API}/train-kmeans/${jobId}`).then((res) => res.json());
+}
+
+// Training berjalan di background: kirim job lalu polling sampai selesai
+export async function trainKmeans(intervalMs = 2000) {
+  const job = await fetch(`${API}/train-kmeans`, {
     method: "POST",
   }).then((res) => res.json());
+
+  while (true) {
+    const status = await getTrainingJob(job.job_id);
+    if (status.phase === "done") {
+      return { ...status, message: status.result?.info ?? job.message };
+    }
+    if (status.phase === "error") {
+      throw new Error(status.result?.message ?? "Training gagal");
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
 }